@@ -0,0 +1,294 @@
+"""
+Local stand-in for the Google APIs the backend calls.
+
+Implements the REST endpoints behind genai's generate_content and
+embed_content (single and batch), Custom Search and Books, with per-endpoint
+latency distributions, error rates, 429 injection and an optional
+requests-per-second quota, so the backend can be exercised end to end
+without network access or API spend. Embeddings are deterministic bag of
+words vectors, so KB queries return sensible neighbours.
+
+Usage (from python_backend/):
+    python benchmarks/fake_upstream.py --port 8765 \\
+        --latency generate=lognormal:800:0.6 --latency embed=uniform:40:120 \\
+        --rate-limit-rate generate=0.02 --error-rate 0.005
+
+    DEEP_SCRIBE_GEMINI_ENDPOINT=http://127.0.0.1:8765 \\
+    DEEP_SCRIBE_GOOGLE_API_BASE=http://127.0.0.1:8765 python main.py --port 8000
+
+Latency specs (milliseconds): fixed:MS, uniform:LOW:HIGH,
+lognormal:MEDIAN:SIGMA, exponential:MEAN. Settings given without an
+endpoint name apply to all of generate, embed, search and books. Faults can
+be changed at runtime with POST /_fake/config and counters read from
+GET /_fake/stats.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ENDPOINTS = ("generate", "embed", "search", "books")
+EMBEDDING_DIMS = 768
+
+STATUS_NAMES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}
+STATUS_MESSAGES = {
+    429: "Resource has been exhausted (e.g. check quota).",
+    500: "An internal error has occurred.",
+    503: "The service is currently unavailable.",
+}
+
+
+def parse_latency(spec: str):
+    """Turn a latency spec (milliseconds) into a sampler returning seconds"""
+    kind, *params = spec.split(":")
+    try:
+        params = [float(p) for p in params]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    if kind == "fixed" and len(params) == 1:
+        return lambda rng: params[0] / 1000
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1]) / 1000
+    if kind == "lognormal" and len(params) == 2:
+        return lambda rng: params[0] * math.exp(rng.gauss(0, params[1])) / 1000
+    if kind == "exponential" and len(params) == 1:
+        return lambda rng: rng.expovariate(1000 / params[0]) if params[0] > 0 else 0.0
+    raise ValueError(f"Invalid latency spec: {spec}")
+
+
+class FaultProfile:
+    """Latency, failure and quota behaviour of one fake endpoint"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        quota_rps: Optional[float] = None
+    ):
+        self.update(latency=latency, error_rate=error_rate, rate_limit_rate=rate_limit_rate, quota_rps=quota_rps)
+
+    def update(self, **settings):
+        if "latency" in settings:
+            self._sample = parse_latency(settings["latency"])
+            self.latency = settings["latency"]
+        if "error_rate" in settings:
+            self.error_rate = float(settings["error_rate"])
+        if "rate_limit_rate" in settings:
+            self.rate_limit_rate = float(settings["rate_limit_rate"])
+        if "quota_rps" in settings:
+            self.quota_rps = settings["quota_rps"]
+            self._tokens = float(self.quota_rps or 0)
+            self._refilled = time.monotonic()
+
+    def _over_quota(self) -> bool:
+        if not self.quota_rps:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.quota_rps, self._tokens + (now - self._refilled) * self.quota_rps)
+        self._refilled = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    def outcome(self, rng: random.Random):
+        """(delay in seconds, injected HTTP status or None)"""
+        delay = max(0.0, self._sample(rng))
+        if self._over_quota() or rng.random() < self.rate_limit_rate:
+            # Quota rejections come back quickly, like the real APIs
+            return min(delay, 0.05), 429
+        if rng.random() < self.error_rate:
+            return delay, rng.choice((500, 503))
+        return delay, None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+            "quota_rps": self.quota_rps,
+        }
+
+
+def fake_embedding(text: str, dims: int = EMBEDDING_DIMS) -> List[float]:
+    vector = [0.0] * dims
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dims] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _text(content: Dict[str, Any]) -> str:
+    return " ".join(part.get("text", "") for part in (content or {}).get("parts", []))
+
+
+def create_app(profiles: Optional[Dict[str, FaultProfile]] = None, seed: Optional[int] = None) -> FastAPI:
+    """
+    Build the fake upstream app
+
+    Args:
+        profiles: FaultProfile per endpoint name (missing ones never fail or wait)
+        seed: Seed for latency and fault sampling
+    """
+    app = FastAPI(title="Deep Scribe fake upstream")
+    app.state.profiles = {name: FaultProfile() for name in ENDPOINTS}
+    app.state.profiles.update(profiles or {})
+    app.state.stats = Counter()
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    async def inject(endpoint: str) -> Optional[JSONResponse]:
+        with lock:
+            delay, status = app.state.profiles[endpoint].outcome(rng)
+            app.state.stats[f"{endpoint}.requests"] += 1
+            if status is not None:
+                app.state.stats[f"{endpoint}.{status}"] += 1
+        await asyncio.sleep(delay)
+        if status is None:
+            return None
+        return JSONResponse(
+            {"error": {"code": status, "message": STATUS_MESSAGES[status], "status": STATUS_NAMES[status]}},
+            status_code=status,
+            headers={"Retry-After": "1"} if status == 429 else None
+        )
+
+    @app.post("/v1beta/models/{name}")
+    async def model_method(name: str, request: Request):
+        model, _, method = name.partition(":")
+        body = await request.json()
+        api_key = request.headers.get("x-goog-api-key") or request.query_params.get("key")
+        with lock:
+            app.state.stats[f"key.{api_key}"] += 1
+
+        if method == "generateContent":
+            if (error := await inject("generate")) is not None:
+                return error
+            prompt = " ".join(_text(c) for c in body.get("contents", []))
+            words = prompt.split()
+            text = f"[{model}] Fake response to a {len(words)} word prompt: {' '.join(words[:40])}"
+            return {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": len(words), "candidatesTokenCount": len(text.split()),
+                                  "totalTokenCount": len(words) + len(text.split())},
+                "modelVersion": model,
+            }
+
+        if method == "embedContent":
+            if (error := await inject("embed")) is not None:
+                return error
+            return {"embedding": {"values": fake_embedding(_text(body.get("content")))}}
+
+        if method == "batchEmbedContents":
+            if (error := await inject("embed")) is not None:
+                return error
+            return {"embeddings": [{"values": fake_embedding(_text(r.get("content")))} for r in body.get("requests", [])]}
+
+        return JSONResponse({"error": {"code": 404, "message": f"Unknown method {method}", "status": "NOT_FOUND"}},
+                            status_code=404)
+
+    @app.get("/customsearch/v1")
+    async def custom_search(q: str = "", num: int = 10):
+        if (error := await inject("search")) is not None:
+            return error
+        items = [
+            {
+                "title": f"{q.title()} - result {i + 1}",
+                "link": f"https://example.com/{hashlib.md5(f'{q}{i}'.encode()).hexdigest()[:12]}",
+                "snippet": f"Snippet {i + 1} about {q}.",
+                "displayLink": "example.com",
+            }
+            for i in range(min(num, 10))
+        ]
+        return {"items": items, "searchInformation": {"searchTime": 0.1, "totalResults": str(len(items) * 1000)}}
+
+    @app.get("/books/v1/volumes")
+    async def books(q: str = "", maxResults: int = 10):
+        if (error := await inject("books")) is not None:
+            return error
+        items = [
+            {
+                "volumeInfo": {
+                    "title": f"{q.title()}, Volume {i + 1}",
+                    "authors": [f"Author {i + 1}"],
+                    "publishedDate": str(2000 + i),
+                    "description": f"A book about {q}.",
+                    "infoLink": f"https://books.example.com/{i}",
+                }
+            }
+            for i in range(min(maxResults, 10))
+        ]
+        return {"totalItems": len(items), "items": items}
+
+    @app.get("/_fake/stats")
+    async def fake_stats():
+        with lock:
+            return {"counters": dict(app.state.stats),
+                    "profiles": {name: p.to_dict() for name, p in app.state.profiles.items()}}
+
+    @app.post("/_fake/config")
+    async def fake_config(settings: Dict[str, Dict[str, Any]]):
+        """Update fault profiles, e.g. {"generate": {"rate_limit_rate": 0.5}}"""
+        try:
+            with lock:
+                for name, values in settings.items():
+                    app.state.profiles[name].update(**values)
+        except (KeyError, ValueError) as e:
+            return JSONResponse({"success": False, "error": f"Invalid setting: {e}"}, status_code=400)
+        return {"success": True}
+
+    return app
+
+
+def _per_endpoint(values: List[str], cast) -> Dict[str, Any]:
+    """Parse repeated NAME=VALUE / VALUE options into a per-endpoint dict"""
+    settings = {}
+    for value in values or []:
+        name, sep, setting = value.partition("=")
+        if not sep:
+            settings.update({endpoint: cast(value) for endpoint in ENDPOINTS})
+        elif name in ENDPOINTS:
+            settings[name] = cast(setting)
+        else:
+            raise SystemExit(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", help="[ENDPOINT=]SPEC, e.g. generate=lognormal:800:0.6")
+    parser.add_argument("--error-rate", action="append", help="[ENDPOINT=]FRACTION of 500/503 responses")
+    parser.add_argument("--rate-limit-rate", action="append", help="[ENDPOINT=]FRACTION of injected 429s")
+    parser.add_argument("--quota-rps", action="append", help="[ENDPOINT=]RPS above which requests get 429")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    options = {
+        "latency": _per_endpoint(args.latency, str),
+        "error_rate": _per_endpoint(args.error_rate, float),
+        "rate_limit_rate": _per_endpoint(args.rate_limit_rate, float),
+        "quota_rps": _per_endpoint(args.quota_rps, float),
+    }
+    profiles = {
+        endpoint: FaultProfile(**{key: values[endpoint] for key, values in options.items() if endpoint in values})
+        for endpoint in ENDPOINTS
+    }
+    for endpoint, profile in profiles.items():
+        print(f"{endpoint:<9} {profile.to_dict()}")
+    uvicorn.run(create_app(profiles, seed=args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
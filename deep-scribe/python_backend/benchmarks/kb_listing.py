@@ -0,0 +1,102 @@
+"""
+Benchmark for the KB listing endpoint's response layer.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json, no
+compression) with orjson, MessagePack and gzip/brotli on a synthetic
+knowledge base, then measures the real /api/kb/documents endpoint.
+
+Usage (from python_backend/):
+    python benchmarks/kb_listing.py [--documents 2000] [--repeat 20]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from knowledge_base import KnowledgeBaseService  # noqa: E402
+from utils.responses import brotli, dumps_json, msgpack  # noqa: E402
+
+
+def build_kb(directory: str, documents: int) -> KnowledgeBaseService:
+    kb = KnowledgeBaseService(persist_directory=directory)
+    kb._generate_embeddings = lambda texts, api_key: [[float(i % 7)] * 8 for i, _ in enumerate(texts)]
+    paragraph = "Solar capacity grew quickly while storage costs kept falling. " * 20
+    for start in range(0, documents, 500):
+        kb.add_documents([
+            {
+                "content": f"Note {i}. {paragraph}",
+                "source": f"research:{i % 13}",
+                "title": f"Finding {i}",
+                "doc_type": "research_finding",
+                "metadata": {"main_topic": "Energy", "research_id": f"r{i % 13}"}
+            }
+            for i in range(start, min(start + 500, documents))
+        ])
+    return kb
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        kb = build_kb(directory, args.documents)
+        payload = kb.get_all_documents(limit=args.documents)
+
+        rows = []
+        ms, body = timed(lambda: JSONResponse(jsonable_encoder(payload)).body, args.repeat)
+        rows.append(("before: jsonable_encoder + json", ms, len(body)))
+        ms, body = timed(lambda: dumps_json(payload), args.repeat)
+        rows.append(("after: orjson", ms, len(body)))
+        json_body = body
+        if msgpack is not None:
+            ms, body = timed(lambda: msgpack.packb(payload, use_bin_type=True), args.repeat)
+            rows.append(("after: msgpack", ms, len(body)))
+        ms, body = timed(lambda: gzip.compress(json_body, compresslevel=6), args.repeat)
+        rows.append(("  + gzip level 6 (compress only)", ms, len(body)))
+        if brotli is not None:
+            ms, body = timed(lambda: brotli.compress(json_body, quality=4), args.repeat)
+            rows.append(("  + brotli quality 4 (compress only)", ms, len(body)))
+
+        print(f"Encoding {payload['count']} documents (best of {args.repeat})")
+        for label, ms, size in rows:
+            print(f"  {label:<38} {ms:8.2f} ms  {size / 1024:9.1f} KiB")
+
+        import main as backend
+        backend.kb_service = kb
+        client = TestClient(backend.app)
+        url = f"/api/kb/documents?limit={args.documents}"
+        print(f"End to end GET {url}")
+        for label, headers in (
+            ("json, identity", {"Accept-Encoding": "identity"}),
+            ("json, gzip", {"Accept-Encoding": "gzip"}),
+            ("json, br", {"Accept-Encoding": "br"}),
+            ("msgpack, br", {"Accept-Encoding": "br", "Accept": "application/msgpack"}),
+        ):
+            ms, response = timed(lambda: client.get(url, headers=headers), args.repeat)
+            wire = int(response.headers.get("content-length", len(response.content)))
+            print(f"  {label:<38} {ms:8.2f} ms  {wire / 1024:9.1f} KiB on the wire")
+
+
+if __name__ == "__main__":
+    main()
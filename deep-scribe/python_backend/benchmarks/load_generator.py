@@ -0,0 +1,285 @@
+"""
+End-to-end load generator for the Deep Scribe backend.
+
+Drives a weighted mix of /api/generate, /api/kb/* and /api/tools/* requests
+from a fixed number of concurrent clients (closed loop) and reports
+throughput, error counts and latency percentiles per endpoint.
+
+Usage (from python_backend/):
+    # Against a running backend (point it at benchmarks/fake_upstream.py)
+    python benchmarks/load_generator.py --url http://127.0.0.1:8000 --concurrency 32 --duration 30
+
+    # Hermetic: spawn the fake upstream and a backend with a throwaway HOME
+    python benchmarks/load_generator.py --spawn --concurrency 64 --duration 20 \\
+        --upstream-args "--latency generate=lognormal:600:0.5 --rate-limit-rate generate=0.02"
+
+Mix weights are NAME=WEIGHT pairs; see SCENARIOS for the names.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+DEFAULT_MIX = "generate=2,kb_add=1,kb_query=4,kb_chat=2,kb_documents=1,kb_related=2,kb_topics=1,tools_search=1,tools_books=1"
+
+TOPICS = ["solar storage", "battery chemistry", "grid inertia", "heat pumps", "offshore wind",
+          "carbon pricing", "hydrogen electrolysis", "demand response", "nuclear smr", "geothermal"]
+
+
+class LoadState:
+    """Shared state between clients: known document IDs and latency samples"""
+
+    def __init__(self, api_key: str, search_engine_id: str, model: str):
+        self.api_key = api_key
+        self.search_engine_id = search_engine_id
+        self.model = model
+        self.doc_ids: List[str] = []
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.sequence = 0
+
+    def next_id(self) -> int:
+        self.sequence += 1
+        return self.sequence
+
+
+def _note(state: LoadState, rng: random.Random) -> str:
+    topic = rng.choice(TOPICS)
+    return f"Note {state.next_id()} on {topic}. " + " ".join(rng.choices(topic.split() + TOPICS, k=60))
+
+
+# Each scenario returns (method, path, json body or None)
+SCENARIOS = {
+    "generate": lambda s, rng: ("POST", "/api/generate", {
+        "model": s.model, "prompt": f"Summarise the state of {rng.choice(TOPICS)}.", "api_key": s.api_key}),
+    "kb_add": lambda s, rng: ("POST", "/api/kb/add", {
+        "content": _note(s, rng), "source": "load-generator", "title": f"Load note {s.sequence}",
+        "doc_type": "note", "api_key": s.api_key}),
+    "kb_query": lambda s, rng: ("POST", "/api/kb/query", {
+        "query": rng.choice(TOPICS), "n_results": 5, "api_key": s.api_key}),
+    "kb_chat": lambda s, rng: ("POST", "/api/kb/chat", {
+        "message": f"What do my notes say about {rng.choice(TOPICS)}?", "api_key": s.api_key}),
+    "kb_documents": lambda s, rng: ("GET", "/api/kb/documents?limit=50", None),
+    "kb_related": lambda s, rng: (
+        ("GET", f"/api/kb/document/{rng.choice(s.doc_ids)}/related", None) if s.doc_ids
+        else ("GET", "/api/kb/stats", None)),
+    "kb_topics": lambda s, rng: ("GET", "/api/kb/topics", None),
+    "tools_search": lambda s, rng: ("POST", "/api/tools/search", {
+        "query": rng.choice(TOPICS), "api_key": s.api_key, "search_engine_id": s.search_engine_id}),
+    "tools_books": lambda s, rng: ("POST", "/api/tools/books", {
+        "query": rng.choice(TOPICS), "api_key": s.api_key}),
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+async def request_once(client: httpx.AsyncClient, state: LoadState, name: str, rng: random.Random):
+    method, path, body = SCENARIOS[name](state, rng)
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, json=body)
+        elapsed = time.perf_counter() - start
+        payload = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+        if response.status_code != 200:
+            state.errors[name][f"http {response.status_code}"] += 1
+        elif isinstance(payload, dict) and payload.get("success") is False:
+            state.errors[name][str(payload.get("error", "error"))[:60]] += 1
+        elif name == "kb_add" and payload.get("id"):
+            state.doc_ids.append(payload["id"])
+    except httpx.HTTPError as e:
+        elapsed = time.perf_counter() - start
+        state.errors[name][type(e).__name__] += 1
+    state.latencies[name].append(elapsed)
+
+
+async def client_loop(client, state, weights, rng, deadline: float, budget: List[int]):
+    names, shares = list(weights), list(weights.values())
+    while time.monotonic() < deadline and budget[0] != 0:
+        budget[0] -= 1
+        await request_once(client, state, rng.choices(names, shares)[0], rng)
+
+
+async def run_load(
+    url: str,
+    concurrency: int,
+    duration: float,
+    requests: Optional[int],
+    weights: Dict[str, float],
+    seed_documents: int,
+    api_key: str,
+    search_engine_id: str,
+    model: str,
+    timeout: float,
+    seed: int
+) -> Dict[str, Any]:
+    state = LoadState(api_key, search_engine_id, model)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        rng = random.Random(seed)
+        for _ in range(seed_documents):
+            await request_once(client, state, "kb_add", rng)
+        state.latencies.clear()
+        state.errors.clear()
+
+        budget = [requests if requests else -1]
+        start = time.monotonic()
+        await asyncio.gather(*(
+            client_loop(client, state, weights, random.Random(seed + i + 1), start + duration, budget)
+            for i in range(concurrency)
+        ))
+        elapsed = time.monotonic() - start
+
+    report = {"url": url, "concurrency": concurrency, "elapsed_s": round(elapsed, 2), "endpoints": {}}
+    everything = []
+    for name in sorted(state.latencies):
+        samples = sorted(state.latencies[name])
+        everything.extend(samples)
+        report["endpoints"][name] = _summary(samples, elapsed, sum(state.errors[name].values()))
+        report["endpoints"][name]["error_kinds"] = dict(state.errors[name])
+    everything.sort()
+    report["total"] = _summary(everything, elapsed, sum(sum(e.values()) for e in state.errors.values()))
+    return report
+
+
+def _summary(samples: List[float], elapsed: float, errors: int) -> Dict[str, Any]:
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 1),
+        "p90_ms": round(percentile(samples, 0.90) * 1000, 1),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1) if samples else 0.0,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['url']}  concurrency={report['concurrency']}  elapsed={report['elapsed_s']}s")
+    print(f"  {'endpoint':<14}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    rows = list(report["endpoints"].items()) + [("total", report["total"])]
+    for name, row in rows:
+        print(f"  {name:<14}{row['requests']:>9}{row['errors']:>8}{row['throughput_rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p90_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}")
+    for name, row in report["endpoints"].items():
+        for kind, count in row["error_kinds"].items():
+            print(f"  ! {name}: {count} x {kind}")
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if process.poll() is not None:
+            raise SystemExit(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn_stack(upstream_args: str, home: str, workers: int = 1) -> tuple:
+    """Start the fake upstream and a backend pointed at it; returns (backend URL, processes)"""
+    upstream_port, backend_port = _free_port(), _free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, "fake_upstream.py"), "--port", str(upstream_port),
+         *shlex.split(upstream_args)]
+    )
+    _wait_until_up(f"{upstream_url}/_fake/stats", upstream)
+
+    env = {
+        **os.environ,
+        "HOME": home,
+        "DEEP_SCRIBE_GEMINI_ENDPOINT": upstream_url,
+        "DEEP_SCRIBE_GOOGLE_API_BASE": upstream_url,
+    }
+    backend_url = f"http://127.0.0.1:{backend_port}"
+    backend = subprocess.Popen(
+        [sys.executable, "main.py", "--port", str(backend_port), "--workers", str(workers)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _wait_until_up(backend_url, backend)
+    return backend_url, [backend, upstream]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend base URL")
+    parser.add_argument("--spawn", action="store_true", help="Start a fake upstream and backend to test against")
+    parser.add_argument("--workers", type=int, default=1, help="Backend HTTP workers (with --spawn)")
+    parser.add_argument("--upstream-args", default="", help="Extra fake_upstream.py options (with --spawn)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests instead")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed-documents", type=int, default=20, help="Notes added before measuring")
+    parser.add_argument("--api-key", default="load-test-key")
+    parser.add_argument("--search-engine-id", default="load-test-cx")
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request client timeout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    duration = float("inf") if args.requests else args.duration
+    processes = []
+    with tempfile.TemporaryDirectory() as home:
+        url = args.url
+        try:
+            if args.spawn:
+                url, processes = spawn_stack(args.upstream_args, home, args.workers)
+            report = asyncio.run(run_load(
+                url, args.concurrency, duration, args.requests,
+                parse_mix(args.mix), args.seed_documents, args.api_key, args.search_engine_id,
+                args.model, args.timeout, args.seed
+            ))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait(timeout=10)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ Knowledge Base Service for Deep Scribe
 Uses ChromaDB for vector storage and Gemini Embeddings for semantic search
 """
 
+import contextlib
+import contextvars
 import os
 import chromadb
 from chromadb.config import Settings
@@ -10,6 +12,31 @@ import google.generativeai as genai
 from typing import List, Dict, Any, Optional
 import hashlib
 import json
+import time
+import numpy as np
+from services.metadata_index import MetadataIndex
+from services.related_notes import RelatedNotesGraph
+from services.scheduler import scheduler
+from services.topic_clusters import TopicClusterer
+from utils.upstream import generative_client
+
+_precomputed_embeddings = contextvars.ContextVar("precomputed_embeddings", default=None)
+
+
+@contextlib.contextmanager
+def embedding_scope(embeddings: Dict[str, List[float]]):
+    """
+    Serve document embeddings from a text -> embedding map inside the block
+
+    Writes made in the block only call Gemini for texts missing from the map,
+    so a caller can embed ahead of time (see prepare_documents and
+    prepare_upsert) and keep the write itself to storage work.
+    """
+    token = _precomputed_embeddings.set(embeddings)
+    try:
+        yield
+    finally:
+        _precomputed_embeddings.reset(token)
 
 
 class KnowledgeBaseService:
@@ -17,6 +44,16 @@ class KnowledgeBaseService:
 
     COLLECTION_NAME = "deep_scribe_research"
     EMBEDDING_MODEL = "models/text-embedding-004"
+    INDEX_FILENAME = "metadata_index.sqlite3"
+    # Filters matching at most this many documents are scored exactly against
+    # the candidate set instead of running a filtered ANN search
+    PREFILTER_MAX_CANDIDATES = 2000
+    # Chunking for upserted documents: one chunk per paragraph, short
+    # paragraphs (headings) join the next one, long ones are split
+    CHUNK_MIN_CHARS = 200
+    CHUNK_MAX_CHARS = 2000
+    # Roughly one short paragraph in CHUNK_BOUNDARY_ODDS ends a chunk
+    CHUNK_BOUNDARY_ODDS = 4
 
     def __init__(self, persist_directory: str = None):
         """Initialize ChromaDB client with persistence"""
@@ -40,36 +77,100 @@ class KnowledgeBaseService:
             metadata={"description": "Deep Scribe research notes and findings"}
         )
 
-        self._api_key = None
-
-    def set_api_key(self, api_key: str):
-        """Set the Gemini API key for embeddings"""
-        self._api_key = api_key
-        genai.configure(api_key=api_key)
-
-    def _generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for a text using Gemini"""
-        if not self._api_key:
+        self.index = MetadataIndex(os.path.join(persist_directory, self.INDEX_FILENAME))
+        if self.index.count() != self.collection.count():
+            self._rebuild_index()
+
+        self.topics = TopicClusterer(persist_directory, record_source=self.iter_records)
+        if self.topics.get_snapshot()["documents"] != self.collection.count():
+            self.topics.maybe_rebuild(force=True)
+
+        self.related = RelatedNotesGraph(persist_directory, record_source=self.iter_records)
+        if self.related.count() != self.collection.count():
+            self.related.maybe_rebuild()
+
+    def _rebuild_index(self, batch_size: int = 500):
+        """Rebuild the metadata index from the collection (e.g. for KBs created before it existed)"""
+        self.index.clear()
+        offset = 0
+        while True:
+            batch = self.collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+            if not batch['ids']:
+                break
+            self.index.upsert(zip(batch['ids'], batch['metadatas']))
+            offset += len(batch['ids'])
+
+    def _embed(self, api_key: Optional[str], content, task_type: str):
+        """One embed_content call, charged to and authenticated with api_key"""
+        if not api_key:
             raise ValueError("Gemini API key not set")
 
-        result = genai.embed_content(
+        result = scheduler.run(
+            "gemini.embed", api_key, genai.embed_content,
             model=self.EMBEDDING_MODEL,
-            content=text,
-            task_type="retrieval_document"
+            content=content,
+            task_type=task_type,
+            client=generative_client(api_key)
         )
         return result['embedding']
 
-    def _generate_query_embedding(self, query: str) -> List[float]:
+    def _generate_embedding(self, text: str, api_key: Optional[str]) -> List[float]:
+        """Generate embedding for a text using Gemini"""
+        return self._embed(api_key, text, "retrieval_document")
+
+    def _generate_embeddings(self, texts: List[str], api_key: Optional[str]) -> List[List[float]]:
+        """Generate embeddings for several texts in a single Gemini call"""
+        if not texts:
+            return []
+        return self._embed(api_key, texts, "retrieval_document")
+
+    def _generate_query_embedding(self, query: str, api_key: Optional[str]) -> List[float]:
         """Generate embedding for a query (uses different task type)"""
-        if not self._api_key:
-            raise ValueError("Gemini API key not set")
+        return self._embed(api_key, query, "retrieval_query")
+
+    def embed_query(self, query_text: str, api_key: Optional[str]) -> List[float]:
+        """Public query embedding, so callers can reuse it across several queries"""
+        return self._generate_query_embedding(query_text, api_key)
+
+    def _document_embedding(self, text: str, api_key: Optional[str]) -> List[float]:
+        """Embedding of a text about to be stored, precomputed (see embedding_scope) or generated"""
+        precomputed = _precomputed_embeddings.get() or {}
+        if text in precomputed:
+            return precomputed[text]
+        return self._generate_embedding(text, api_key)
+
+    def _document_embeddings(self, texts: List[str], api_key: Optional[str]) -> List[List[float]]:
+        """Embeddings of texts about to be stored; only those not precomputed are generated, in one call"""
+        precomputed = _precomputed_embeddings.get() or {}
+        missing = [text for text in texts if text not in precomputed]
+        generated = dict(zip(missing, self._generate_embeddings(missing, api_key))) if missing else {}
+        return [precomputed[text] if text in precomputed else generated[text] for text in texts]
+
+    def prepare_documents(self, records: List[Dict[str, Any]], api_key: Optional[str] = None) -> Dict[str, List[float]]:
+        """
+        Embed what add_documents (or add_document) would embed, without writing
 
-        result = genai.embed_content(
-            model=self.EMBEDDING_MODEL,
-            content=query,
-            task_type="retrieval_query"
-        )
-        return result['embedding']
+        Returns:
+            Map of content -> embedding for records not stored yet, to pass
+            to embedding_scope around the write
+        """
+        ids = [self._generate_id(r["content"], r["source"]) for r in records]
+        existing = set(self.collection.get(ids=list(dict.fromkeys(ids)), include=[])['ids']) if ids else set()
+        texts = list(dict.fromkeys(r["content"] for doc_id, r in zip(ids, records) if doc_id not in existing))
+        return dict(zip(texts, self._generate_embeddings(texts, api_key))) if texts else {}
+
+    def prepare_upsert(self, doc_id: str, content: str, api_key: Optional[str] = None) -> Dict[str, List[float]]:
+        """
+        Embed the new or changed chunks upsert_document would embed, without writing
+
+        Returns:
+            Map of chunk text -> embedding, to pass to embedding_scope around the write
+        """
+        chunks = self._chunk_text(content)
+        chunk_ids = self._chunk_ids(doc_id, chunks)
+        existing = set(self.collection.get(ids=list(dict.fromkeys(chunk_ids)), include=[])['ids'])
+        texts = list(dict.fromkeys(chunk for chunk_id, chunk in zip(chunk_ids, chunks) if chunk_id not in existing))
+        return dict(zip(texts, self._generate_embeddings(texts, api_key))) if texts else {}
 
     def _generate_id(self, content: str, source: str) -> str:
         """Generate a unique ID for a document"""
@@ -82,7 +183,8 @@ class KnowledgeBaseService:
         source: str,
         title: str,
         doc_type: str = "research",
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        api_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Add a document to the knowledge base
@@ -93,6 +195,7 @@ class KnowledgeBaseService:
             title: Human-readable title
             doc_type: Type of document (research, draft, note)
             metadata: Additional metadata
+            api_key: Gemini API key for the embedding call
 
         Returns:
             Dict with success status and document ID
@@ -111,7 +214,7 @@ class KnowledgeBaseService:
                 }
 
             # Generate embedding
-            embedding = self._generate_embedding(content)
+            embedding = self._document_embedding(content, api_key)
 
             # Prepare metadata
             doc_metadata = {
@@ -119,6 +222,7 @@ class KnowledgeBaseService:
                 "title": title,
                 "doc_type": doc_type,
                 "content_length": len(content),
+                "ingested_at": time.time(),
                 **(metadata or {})
             }
 
@@ -129,6 +233,9 @@ class KnowledgeBaseService:
                 documents=[content],
                 metadatas=[doc_metadata]
             )
+            self.index.upsert([(doc_id, doc_metadata)])
+            self.topics.add([doc_id], [embedding], [content])
+            self.related.add([doc_id], [embedding])
 
             return {
                 "success": True,
@@ -143,12 +250,220 @@ class KnowledgeBaseService:
                 "error": str(e)
             }
 
+    def add_documents(self, records: List[Dict[str, Any]], api_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Add several documents with a single batched embedding call
+
+        Args:
+            records: Dicts with the add_document arguments
+                (content, source, title, doc_type, metadata)
+            api_key: Gemini API key for the embedding call
+
+        Returns:
+            Dict with success status, all document IDs and the newly added ones
+        """
+        try:
+            ids = [self._generate_id(r["content"], r["source"]) for r in records]
+            existing = set(self.collection.get(ids=list(dict.fromkeys(ids)))['ids']) if ids else set()
+
+            new_ids, new_records, seen = [], [], set(existing)
+            for doc_id, record in zip(ids, records):
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    new_ids.append(doc_id)
+                    new_records.append(record)
+
+            if new_records:
+                embeddings = self._document_embeddings([r["content"] for r in new_records], api_key)
+                now = time.time()
+                metadatas = [
+                    {
+                        "source": r["source"],
+                        "title": r["title"],
+                        "doc_type": r.get("doc_type", "research"),
+                        "content_length": len(r["content"]),
+                        "ingested_at": now,
+                        **(r.get("metadata") or {})
+                    }
+                    for r in new_records
+                ]
+                self.collection.add(
+                    ids=new_ids,
+                    embeddings=embeddings,
+                    documents=[r["content"] for r in new_records],
+                    metadatas=metadatas
+                )
+                self.index.upsert(zip(new_ids, metadatas))
+                self.topics.add(new_ids, embeddings, [r["content"] for r in new_records])
+                self.related.add(new_ids, embeddings)
+
+            return {
+                "success": True,
+                "ids": ids,
+                "added": new_ids,
+                "message": f"Added {len(new_ids)} of {len(ids)} documents"
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def _chunk_text(self, content: str) -> List[str]:
+        """
+        Split content into content-defined chunks
+
+        A chunk ends after a paragraph that is long on its own or whose hash
+        marks a boundary, so a boundary depends only on that paragraph's text:
+        inserting or editing a paragraph changes the chunk containing it and
+        leaves every other chunk byte-for-byte identical.
+        """
+        pieces = []
+        for paragraph in content.split("\n\n"):
+            paragraph = paragraph.strip()
+            while len(paragraph) > self.CHUNK_MAX_CHARS:
+                cut = paragraph.rfind(". ", 0, self.CHUNK_MAX_CHARS)
+                cut = cut + 1 if cut > 0 else self.CHUNK_MAX_CHARS
+                pieces.append(paragraph[:cut].strip())
+                paragraph = paragraph[cut:].strip()
+            if paragraph:
+                pieces.append(paragraph)
+
+        chunks, pending = [], ""
+        for piece in pieces:
+            if pending and len(pending) + len(piece) + 2 > self.CHUNK_MAX_CHARS:
+                chunks.append(pending)
+                pending = ""
+            pending = f"{pending}\n\n{piece}" if pending else piece
+            if len(piece) >= self.CHUNK_MIN_CHARS or self._is_chunk_boundary(piece):
+                chunks.append(pending)
+                pending = ""
+        if pending:
+            chunks.append(pending)
+        return chunks
+
+    def _is_chunk_boundary(self, piece: str) -> bool:
+        digest = hashlib.sha256(piece.encode()).digest()
+        return int.from_bytes(digest[:4], "big") % self.CHUNK_BOUNDARY_ODDS == 0
+
+    def _chunk_ids(self, doc_id: str, chunks: List[str]) -> List[str]:
+        """Stable chunk IDs derived from the logical document ID and chunk content"""
+        ids, seen = [], {}
+        for chunk in chunks:
+            chunk_hash = hashlib.sha256(chunk.encode()).hexdigest()[:16]
+            occurrence = seen.get(chunk_hash, 0)
+            seen[chunk_hash] = occurrence + 1
+            ids.append(f"{doc_id}#{chunk_hash}" + (f"-{occurrence}" if occurrence else ""))
+        return ids
+
+    def upsert_document(
+        self,
+        doc_id: str,
+        content: str,
+        source: str,
+        title: str,
+        doc_type: str = "draft",
+        metadata: Optional[Dict[str, Any]] = None,
+        api_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Insert or update a document under a stable logical ID
+
+        The document is stored as content-hashed chunks. On update only new or
+        changed chunks are embedded, stale chunks are deleted and unchanged
+        chunks get their metadata refreshed in place.
+
+        Args:
+            doc_id: Stable logical document ID (e.g. draft ID)
+            content: The full current text of the document
+            source: Source identifier
+            title: Human-readable title
+            doc_type: Type of document (research, draft, note)
+            metadata: Additional metadata
+            api_key: Gemini API key for embedding new or changed chunks
+
+        Returns:
+            Dict with success status and per-chunk change counts
+        """
+        try:
+            chunks = self._chunk_text(content)
+            chunk_ids = self._chunk_ids(doc_id, chunks)
+
+            existing = self.collection.get(where={"doc_id": doc_id}, include=["metadatas"])
+            existing_ids = set(existing['ids'])
+            ingested_at = min(
+                (m.get("ingested_at", time.time()) for m in existing['metadatas'] or []),
+                default=time.time()
+            )
+
+            now = time.time()
+            chunk_metadatas = [
+                {
+                    "source": source,
+                    "title": title,
+                    "doc_type": doc_type,
+                    "content_length": len(content),
+                    **(metadata or {}),
+                    "doc_id": doc_id,
+                    "chunk_index": i,
+                    "chunk_count": len(chunks),
+                    "ingested_at": ingested_at,
+                    "updated_at": now,
+                }
+                for i in range(len(chunks))
+            ]
+
+            new = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in existing_ids]
+            kept = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id in existing_ids]
+            stale = list(existing_ids - set(chunk_ids))
+
+            if new:
+                embeddings = self._document_embeddings([chunks[i] for i in new], api_key)
+                self.collection.add(
+                    ids=[chunk_ids[i] for i in new],
+                    embeddings=embeddings,
+                    documents=[chunks[i] for i in new],
+                    metadatas=[chunk_metadatas[i] for i in new]
+                )
+                self.topics.add([chunk_ids[i] for i in new], embeddings, [chunks[i] for i in new])
+                self.related.add([chunk_ids[i] for i in new], embeddings, parents=[doc_id] * len(new))
+            if kept:
+                self.collection.update(
+                    ids=[chunk_ids[i] for i in kept],
+                    metadatas=[chunk_metadatas[i] for i in kept]
+                )
+            if stale:
+                self.collection.delete(ids=stale)
+                self.index.delete(stale)
+                self.topics.remove(stale)
+                self.related.remove(stale)
+            self.index.upsert(zip(chunk_ids, chunk_metadatas))
+
+            return {
+                "success": True,
+                "id": doc_id,
+                "chunks": len(chunks),
+                "embedded": len(new),
+                "unchanged": len(kept),
+                "deleted": len(stale),
+                "updated": bool(new or stale),
+                "message": "Document created" if not existing_ids else "Document updated"
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
     def add_research_findings(
         self,
         topic: str,
         subtopic: str,
         findings: str,
-        research_id: str
+        research_id: str,
+        api_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Add research findings to the knowledge base"""
         return self.add_document(
@@ -160,14 +475,16 @@ class KnowledgeBaseService:
                 "main_topic": topic,
                 "subtopic": subtopic,
                 "research_id": research_id
-            }
+            },
+            api_key=api_key
         )
 
     def add_research_report(
         self,
         topic: str,
         report: str,
-        research_id: str
+        research_id: str,
+        api_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Add a complete research report to the knowledge base"""
         return self.add_document(
@@ -178,42 +495,119 @@ class KnowledgeBaseService:
             metadata={
                 "main_topic": topic,
                 "research_id": research_id
-            }
+            },
+            api_key=api_key
+        )
+
+    @staticmethod
+    def _build_where(
+        where: Optional[Dict[str, Any]] = None,
+        doc_type: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Combine an explicit filter with the legacy doc_type shorthand"""
+        clauses = [clause for clause in (where, {"doc_type": doc_type} if doc_type else None) if clause]
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    def _distance_space(self) -> str:
+        """Distance function used by the collection's HNSW index"""
+        configuration = getattr(self.collection, "configuration", None) or {}
+        hnsw = configuration.get("hnsw") or {}
+        return hnsw.get("space") or (self.collection.metadata or {}).get("hnsw:space", "l2")
+
+    def _score_candidates(
+        self,
+        query_embedding: List[float],
+        candidate_ids: List[str],
+        n_results: int
+    ) -> Dict[str, Any]:
+        """
+        Exact nearest-neighbour search restricted to a candidate ID set
+
+        Produces the same result layout and distance values as collection.query
+        """
+        candidates = self.collection.get(
+            ids=candidate_ids,
+            include=["embeddings", "documents", "metadatas"]
         )
+        if not candidates['ids']:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+
+        matrix = np.asarray(candidates['embeddings'], dtype=np.float32)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        space = self._distance_space()
+        if space == "cosine":
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+            distances = 1 - (matrix @ query) / np.where(norms == 0, 1, norms)
+        elif space == "ip":
+            distances = 1 - matrix @ query
+        else:
+            distances = np.sum((matrix - query) ** 2, axis=1)
+
+        k = min(n_results, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+
+        return {
+            "ids": [[candidates['ids'][i] for i in top]],
+            "documents": [[candidates['documents'][i] for i in top]],
+            "metadatas": [[candidates['metadatas'][i] for i in top]],
+            "distances": [[float(distances[i]) for i in top]],
+        }
 
     def query(
         self,
         query_text: str,
         n_results: int = 5,
-        doc_type: Optional[str] = None
+        doc_type: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None,
+        api_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Query the knowledge base for similar documents
 
+        Selective filters over indexed fields are resolved to a candidate ID set
+        through the metadata index and scored exactly; broad or non-indexed
+        filters fall back to Chroma's filtered ANN search.
+
         Args:
             query_text: The search query
             n_results: Number of results to return
             doc_type: Filter by document type (optional)
+            where: Chroma-style metadata filter, supports $and/$or/$in/$nin and ranges (optional)
+            query_embedding: Precomputed query embedding, skips the embedding call (optional)
+            api_key: Gemini API key for the query embedding
 
         Returns:
             Dict with matching documents and their metadata
         """
         try:
+            where = self._build_where(where, doc_type)
+
+            candidate_ids = None
+            if where and self.index.can_resolve(where):
+                if self.index.count_matching(where) <= self.PREFILTER_MAX_CANDIDATES:
+                    candidate_ids = self.index.resolve(where)
+                    if not candidate_ids:
+                        return {"success": True, "results": [], "query": query_text, "count": 0}
+
             # Generate query embedding
-            query_embedding = self._generate_query_embedding(query_text)
-
-            # Prepare where clause for filtering
-            where = None
-            if doc_type:
-                where = {"doc_type": doc_type}
-
-            # Query the collection
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=where,
-                include=["documents", "metadatas", "distances"]
-            )
+            if query_embedding is None:
+                query_embedding = self._generate_query_embedding(query_text, api_key)
+
+            if candidate_ids is not None:
+                results = self._score_candidates(query_embedding, candidate_ids, n_results)
+            else:
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_results,
+                    where=where,
+                    include=["documents", "metadatas", "distances"]
+                )
 
             # Format results
             documents = []
@@ -241,13 +635,27 @@ class KnowledgeBaseService:
                 "results": []
             }
 
-    def get_all_documents(self, limit: int = 100) -> Dict[str, Any]:
-        """Get all documents in the knowledge base"""
+    def get_all_documents(
+        self,
+        limit: int = 100,
+        doc_type: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Get all documents in the knowledge base, optionally filtered by metadata"""
         try:
-            results = self.collection.get(
-                limit=limit,
-                include=["documents", "metadatas"]
-            )
+            where = self._build_where(where, doc_type)
+            if where and self.index.can_resolve(where):
+                ids = self.index.resolve(where, limit=limit)
+                results = self.collection.get(
+                    ids=ids,
+                    include=["documents", "metadatas"]
+                ) if ids else {"ids": [], "documents": [], "metadatas": []}
+            else:
+                results = self.collection.get(
+                    limit=limit,
+                    where=where or None,
+                    include=["documents", "metadatas"]
+                )
 
             documents = []
             if results['ids']:
@@ -272,9 +680,13 @@ class KnowledgeBaseService:
             }
 
     def delete_document(self, doc_id: str) -> Dict[str, Any]:
-        """Delete a document from the knowledge base"""
+        """Delete a document, or every chunk of an upserted document, from the knowledge base"""
         try:
-            self.collection.delete(ids=[doc_id])
+            ids = [doc_id, *self.index.resolve({"doc_id": doc_id})]
+            self.collection.delete(ids=ids)
+            self.index.delete(ids)
+            self.topics.remove(ids)
+            self.related.remove(ids)
             return {"success": True, "id": doc_id}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -288,10 +700,109 @@ class KnowledgeBaseService:
                 name=self.COLLECTION_NAME,
                 metadata={"description": "Deep Scribe research notes and findings"}
             )
+            self.index.clear()
+            self.topics.reset()
+            self.related.reset()
             return {"success": True, "message": "Knowledge base cleared"}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def iter_records(self, batch_size: int = 500):
+        """Yield the raw collection contents, embeddings included, in bounded batches"""
+        offset = 0
+        while True:
+            batch = self.collection.get(
+                limit=batch_size,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"]
+            )
+            if not batch['ids']:
+                break
+            yield batch
+            offset += len(batch['ids'])
+
+    def restore_records(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """Write pre-embedded records straight into the collection (used by bundle import)"""
+        if not ids:
+            return
+        self.collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
+        )
+        self.index.upsert(zip(ids, metadatas))
+        self.topics.add(ids, embeddings, documents)
+        self.related.add(ids, embeddings, parents=[(m or {}).get("doc_id", i) for i, m in zip(ids, metadatas)])
+
+    def get_related(self, doc_id: str, n_results: int = 5) -> Dict[str, Any]:
+        """
+        Documents most similar to a stored document, read from the kNN graph
+
+        Args:
+            doc_id: Document ID, chunk ID, or logical ID of an upserted document
+            n_results: Number of related documents to return, at most RelatedNotesGraph.NEIGHBORS
+
+        Returns:
+            Dict with success status and related documents (best matching
+            chunk content, metadata and cosine similarity)
+        """
+        try:
+            neighbors = self.related.related(doc_id, n_results)
+            if neighbors is None:
+                return {"success": False, "error": f"Document not found: {doc_id}", "results": []}
+
+            record_ids = [record_id for _, record_id, _ in neighbors]
+            records = self.collection.get(ids=record_ids, include=["documents", "metadatas"]) if record_ids else {"ids": []}
+            by_id = {
+                record_id: (records['documents'][i], records['metadatas'][i])
+                for i, record_id in enumerate(records['ids'])
+            }
+
+            documents = []
+            for parent, record_id, similarity in neighbors:
+                if record_id not in by_id:
+                    continue
+                content, metadata = by_id[record_id]
+                documents.append({
+                    "id": parent,
+                    "record_id": record_id,
+                    "content": content,
+                    "metadata": metadata,
+                    "similarity": similarity
+                })
+
+            return {
+                "success": True,
+                "id": doc_id,
+                "results": documents,
+                "count": len(documents)
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "results": []
+            }
+
+    def get_topics(self) -> Dict[str, Any]:
+        """Precomputed topic graph (nodes, edges, sizes) over the stored embeddings"""
+        try:
+            return {"success": True, **self.topics.get_snapshot()}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def rebuild_topics(self) -> bool:
+        """Start a full background rebuild of the topic clusters; returns whether one started"""
+        return self.topics.maybe_rebuild(force=True)
+
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the knowledge base"""
         try:
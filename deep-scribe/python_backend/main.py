@@ -1,26 +1,44 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import socket
 from dotenv import load_dotenv
 import os
 import argparse
+import json
+import tempfile
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from router import GeminiRouter
 from knowledge_base import KnowledgeBaseService
 from services.google_search import GoogleSearchService
 from services.google_books import GoogleBooksService
+from services.kb_bundle import export_bundle, import_bundle
+from services.related_notes import RelatedNotesGraph
+from services.research_pipeline import ResearchPipeline
+from services.chat_sessions import ChatSessionStore
+from services.scheduler import scheduler, priority_scope, BACKGROUND
+from services.kb_ipc import (
+    KnowledgeBaseServer, RemoteKnowledgeBase, RemoteChatSessionStore, RemoteError, RemoteScheduler,
+    KB_ADDRESS_ENV, KB_TOKEN_ENV
+)
 import uvicorn
 from utils.logger import logger
+from utils.responses import FastJSONResponse, CompressionMiddleware, encode_response
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Initialize Services
-kb_service = KnowledgeBaseService()
-search_service = GoogleSearchService()
-books_service = GoogleBooksService()
+if os.getenv(KB_ADDRESS_ENV):
+    # Worker in multi-worker mode (--workers): the parent process owns Chroma
+    kb_service = RemoteKnowledgeBase.from_env()
+    # Upstream quota is admitted centrally by the parent, across all workers
+    scheduler.delegate_to(RemoteScheduler(kb_service.client))
+else:
+    kb_service = KnowledgeBaseService()
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +47,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
 def find_free_port():
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -47,19 +66,67 @@ class GenerateRequest(BaseModel):
     model: str
     prompt: str
     api_key: str
+    deadline: Optional[float] = None
+    hedge: Optional[bool] = None
+    fallback: Optional[bool] = None
 
+# Endpoints that call upstream APIs are plain `def` so FastAPI runs them in its
+# threadpool: they may wait in the upstream scheduler without blocking the loop.
 @app.post("/api/generate")
-async def generate_content(request: GenerateRequest):
+def generate_content(request: GenerateRequest):
     logger.info(f"Generating content with model: {request.model}")
     result = router.generate(
         model=request.model,
         prompt=request.prompt,
-        api_key=request.api_key
+        api_key=request.api_key,
+        deadline=request.deadline,
+        hedge=request.hedge,
+        fallback=request.fallback
     )
     if not result.get("success"):
         logger.error(f"Generation failed: {result.get('error')}")
     return result
 
+@app.get("/api/router/stats")
+async def router_stats():
+    """Per-model latency EWMA, p95 and error rate used for routing"""
+    return {"success": True, "models": router.get_stats()}
+
+@app.get("/api/scheduler/metrics")
+async def scheduler_metrics():
+    """Upstream scheduler queue depth, wait times and token buckets"""
+    return {"success": True, **scheduler.get_metrics()}
+
+
+# --- RESEARCH PIPELINE ---
+
+class ResearchRunRequest(BaseModel):
+    topic: str
+    api_key: str
+    run_id: Optional[str] = None
+    model: str = "gemini-2.5-flash"
+    max_hypotheses: int = 5
+    max_concurrency: int = 4
+    search_api_key: Optional[str] = None
+    search_engine_id: Optional[str] = None
+    num_results: int = 5
+    ingest: bool = True
+
+@app.post("/api/research/run")
+async def research_run(request: ResearchRunRequest):
+    """
+    Run the full research pipeline server-side.
+    Streams newline-delimited JSON progress events; pass a previous run_id to resume.
+    """
+    logger.info(f"Research run for topic: {request.topic} (run_id={request.run_id})")
+    pipeline = ResearchPipeline(router, kb_service)
+
+    async def events():
+        async for event in pipeline.run(**request.model_dump()):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 
 # --- TOOLS ENDPOINTS ---
 
@@ -70,11 +137,12 @@ class SearchRequest(BaseModel):
     search_engine_id: str
 
 @app.post("/api/tools/search")
-async def google_search(request: SearchRequest):
+def google_search(request: SearchRequest):
     """
     Perform a Google Custom Search to ground the research.
     """
-    # Configure on the fly with user provided keys (stateless)
+    # Configure on the fly with user provided keys (stateless, one instance per request)
+    search_service = GoogleSearchService()
     search_service.configure(request.api_key, request.search_engine_id)
     return search_service.search(request.query, request.num_results)
 
@@ -84,10 +152,11 @@ class BooksRequest(BaseModel):
     api_key: str
 
 @app.post("/api/tools/books")
-async def google_books(request: BooksRequest):
+def google_books(request: BooksRequest):
     """
     Search Google Books for authoritative sources.
     """
+    books_service = GoogleBooksService()
     books_service.configure(request.api_key)
     return books_service.search(request.query, request.max_results)
 
@@ -102,6 +171,15 @@ class KBAddDocumentRequest(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
     api_key: str
 
+class KBUpsertDocumentRequest(BaseModel):
+    doc_id: str
+    content: str
+    source: str
+    title: str
+    doc_type: str = "draft"
+    metadata: Optional[Dict[str, Any]] = None
+    api_key: str
+
 class KBAddResearchRequest(BaseModel):
     topic: str
     subtopic: str
@@ -119,6 +197,7 @@ class KBQueryRequest(BaseModel):
     query: str
     n_results: int = 5
     doc_type: Optional[str] = None
+    where: Optional[Dict[str, Any]] = None
     api_key: str
 
 class KBDeleteRequest(BaseModel):
@@ -127,91 +206,219 @@ class KBDeleteRequest(BaseModel):
 class KBChatRequest(BaseModel):
     message: str
     n_context: int = 3
+    where: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = None
     api_key: str
 
 
 @app.post("/api/kb/add")
-async def kb_add_document(request: KBAddDocumentRequest):
+def kb_add_document(request: KBAddDocumentRequest):
     """Add a document to the knowledge base"""
     logger.info(f"Adding document: {request.title}")
-    kb_service.set_api_key(request.api_key)
-    return kb_service.add_document(
-        content=request.content,
-        source=request.source,
-        title=request.title,
-        doc_type=request.doc_type,
-        metadata=request.metadata
-    )
+    with priority_scope(BACKGROUND):
+        return kb_service.add_document(
+            content=request.content,
+            source=request.source,
+            title=request.title,
+            doc_type=request.doc_type,
+            metadata=request.metadata,
+            api_key=request.api_key
+        )
+
+@app.post("/api/kb/upsert")
+def kb_upsert_document(request: KBUpsertDocumentRequest):
+    """Create or update a document by its stable ID, re-embedding only changed chunks"""
+    logger.info(f"Upserting document: {request.doc_id}")
+    with priority_scope(BACKGROUND):
+        return kb_service.upsert_document(
+            doc_id=request.doc_id,
+            content=request.content,
+            source=request.source,
+            title=request.title,
+            doc_type=request.doc_type,
+            metadata=request.metadata,
+            api_key=request.api_key
+        )
 
 @app.post("/api/kb/add-research")
-async def kb_add_research(request: KBAddResearchRequest):
+def kb_add_research(request: KBAddResearchRequest):
     """Add research findings to the knowledge base"""
     logger.info(f"Adding research: {request.topic} - {request.subtopic}")
-    kb_service.set_api_key(request.api_key)
-    return kb_service.add_research_findings(
-        topic=request.topic,
-        subtopic=request.subtopic,
-        findings=request.findings,
-        research_id=request.research_id
-    )
+    with priority_scope(BACKGROUND):
+        return kb_service.add_research_findings(
+            topic=request.topic,
+            subtopic=request.subtopic,
+            findings=request.findings,
+            research_id=request.research_id,
+            api_key=request.api_key
+        )
 
 @app.post("/api/kb/add-report")
-async def kb_add_report(request: KBAddReportRequest):
+def kb_add_report(request: KBAddReportRequest):
     """Add a research report to the knowledge base"""
     logger.info(f"Adding report: {request.topic}")
-    kb_service.set_api_key(request.api_key)
-    return kb_service.add_research_report(
-        topic=request.topic,
-        report=request.report,
-        research_id=request.research_id
-    )
+    with priority_scope(BACKGROUND):
+        return kb_service.add_research_report(
+            topic=request.topic,
+            report=request.report,
+            research_id=request.research_id,
+            api_key=request.api_key
+        )
 
 @app.post("/api/kb/query")
-async def kb_query(request: KBQueryRequest):
-    """Query the knowledge base for similar documents"""
+def kb_query(request: KBQueryRequest, http_request: Request):
+    """Query the knowledge base for similar documents (JSON, or MessagePack via Accept)"""
     logger.info(f"Querying KB: {request.query}")
-    kb_service.set_api_key(request.api_key)
-    return kb_service.query(
+    return encode_response(http_request, kb_service.query(
         query_text=request.query,
         n_results=request.n_results,
-        doc_type=request.doc_type
-    )
+        doc_type=request.doc_type,
+        where=request.where,
+        api_key=request.api_key
+    ))
 
 @app.get("/api/kb/documents")
-async def kb_get_documents(limit: int = 100):
-    """Get all documents in the knowledge base"""
-    return kb_service.get_all_documents(limit=limit)
+def kb_get_documents(
+    http_request: Request,
+    limit: int = 100,
+    doc_type: Optional[str] = None,
+    where: Optional[str] = None
+):
+    """
+    Get all documents in the knowledge base (JSON, or MessagePack via Accept)
+
+    `where` is a JSON-encoded metadata filter, e.g.
+    {"$and": [{"research_id": "abc"}, {"ingested_at": {"$gte": 1735689600}}]}
+    """
+    try:
+        where_filter = json.loads(where) if where else None
+    except json.JSONDecodeError as e:
+        return {"success": False, "error": f"Invalid where filter: {e}", "documents": []}
+    return encode_response(http_request, kb_service.get_all_documents(
+        limit=limit,
+        doc_type=doc_type,
+        where=where_filter
+    ))
+
+@app.get("/api/kb/document/{doc_id}/related")
+def kb_related(doc_id: str, n_results: int = Query(5, ge=1, le=RelatedNotesGraph.NEIGHBORS)):
+    """
+    Notes related to a stored document, from the precomputed kNN graph (no embedding call)
+
+    The graph keeps RelatedNotesGraph.NEIGHBORS neighbours per note, so at
+    most that many related notes can be requested.
+    """
+    return kb_service.get_related(doc_id, n_results=n_results)
 
 @app.delete("/api/kb/document/{doc_id}")
-async def kb_delete_document(doc_id: str):
+def kb_delete_document(doc_id: str):
     """Delete a document from the knowledge base"""
     logger.info(f"Deleting document: {doc_id}")
     return kb_service.delete_document(doc_id)
 
 @app.delete("/api/kb/clear")
-async def kb_clear():
+def kb_clear():
     """Clear all documents from the knowledge base"""
     logger.warning("Clearing entire Knowledge Base")
     return kb_service.clear_all()
 
+@app.get("/api/kb/export")
+def kb_export(batch_size: int = 500):
+    """Stream the knowledge base, vectors included, as a portable tar bundle"""
+    logger.info("Exporting Knowledge Base")
+    return StreamingResponse(
+        export_bundle(kb_service, batch_size=batch_size),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": 'attachment; filename="deep-scribe-kb.tar"'}
+    )
+
+@app.post("/api/kb/import")
+async def kb_import(request: Request, replace: bool = False):
+    """
+    Restore a bundle produced by /api/kb/export (raw tar request body).
+    No embedding calls are made; vectors are written straight into Chroma.
+    """
+    logger.info(f"Importing Knowledge Base bundle (replace={replace})")
+    # Spool the upload so only small pieces are ever held in memory
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        # The bundle is validated before replace clears anything
+        return await run_in_threadpool(import_bundle, kb_service, spool, replace)
+
+@app.get("/api/kb/topics")
+def kb_topics():
+    """Topic graph for the TopicGraph view, served from a precomputed snapshot"""
+    return kb_service.get_topics()
+
+@app.post("/api/kb/topics/rebuild")
+def kb_topics_rebuild():
+    """Start a full background rebuild of the topic clusters"""
+    started = kb_service.rebuild_topics()
+    return {"success": True, "started": started}
+
 @app.get("/api/kb/stats")
-async def kb_stats():
+def kb_stats():
     """Get knowledge base statistics"""
     return kb_service.get_stats()
 
+if isinstance(kb_service, RemoteKnowledgeBase):
+    chat_sessions = RemoteChatSessionStore(kb_service.client)
+else:
+    chat_sessions = ChatSessionStore(router)
+
+@app.post("/api/kb/chat/session")
+def kb_chat_create_session():
+    """Start a server-side chat session; pass its session_id to /api/kb/chat"""
+    session = chat_sessions.create()
+    return {"success": True, "expires_in": chat_sessions.ttl, **session.to_dict()}
+
+@app.delete("/api/kb/chat/session/{session_id}")
+def kb_chat_delete_session(session_id: str):
+    """End a chat session"""
+    return {"success": chat_sessions.delete(session_id), "session_id": session_id}
+
 @app.post("/api/kb/chat")
-async def kb_chat(request: KBChatRequest):
+def kb_chat(request: KBChatRequest):
     """
     Chat with your notes - RAG-powered conversation
+
+    With a session_id, recent turns are kept server-side (older ones are
+    summarized) and retrieval context is reused for same-topic follow-ups.
     """
     logger.info(f"Chat request: {request.message[:50]}...")
-    kb_service.set_api_key(request.api_key)
 
-    # First, query for relevant context
-    context_results = kb_service.query(
-        query_text=request.message,
-        n_results=request.n_context
-    )
+    session = None
+    if request.session_id:
+        try:
+            session = chat_sessions.get(request.session_id)
+        except (RemoteError, OSError) as e:
+            return {"success": False, "error": f"Chat session unavailable: {e}"}
+        if session is None:
+            return {"success": False, "error": "Chat session not found or expired"}
+
+    # First, query for relevant context (reusing the session's when on topic)
+    context_results = None
+    query_embedding = None
+    if session is not None:
+        try:
+            query_embedding = kb_service.embed_query(request.message, request.api_key)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        context_results = session.reusable_context(
+            query_embedding, request.where, chat_sessions.CONTEXT_REUSE_THRESHOLD
+        )
+
+    context_reused = context_results is not None
+    if context_results is None:
+        context_results = kb_service.query(
+            query_text=request.message,
+            n_results=request.n_context,
+            where=request.where,
+            query_embedding=query_embedding,
+            api_key=request.api_key
+        )
 
     if not context_results.get("success"):
         logger.error(f"KB Query failed: {context_results.get('error')}")
@@ -220,6 +427,13 @@ async def kb_chat(request: KBChatRequest):
             "error": context_results.get("error", "Failed to query knowledge base")
         }
 
+    if session is not None and not context_reused:
+        try:
+            session.remember_context(query_embedding, request.where, context_results)
+        except (RemoteError, OSError) as e:
+            # Only costs the next follow-up a retrieval
+            logger.warning(f"Could not store chat context: {e}")
+
     # Build context from results
     context_parts = []
     for doc in context_results.get("results", []):
@@ -229,12 +443,18 @@ async def kb_chat(request: KBChatRequest):
 
     context_text = "\n\n---\n\n".join(context_parts) if context_parts else "No relevant notes found."
 
+    history_text = session.history_text(chat_sessions.MAX_TURN_CHARS) if session is not None else ""
+    history_section = f"""
+## Conversation So Far:
+{history_text}
+""" if history_text else ""
+
     # Generate response using Gemini
     prompt = f"""You are a helpful research assistant. Answer the user's question based on the following notes from their knowledge base. If the notes don't contain relevant information, say so and provide what help you can.
 
 ## User's Notes (from Knowledge Base):
 {context_text}
-
+{history_section}
 ## User's Question:
 {request.message}
 
@@ -251,10 +471,20 @@ async def kb_chat(request: KBChatRequest):
         api_key=request.api_key
     )
 
+    if session is not None and result.get("success"):
+        try:
+            session.add_exchange(request.message, result.get("content", ""))
+            chat_sessions.schedule_summary(session, request.api_key)
+        except (RemoteError, OSError) as e:
+            # The answer is still good; only the session history misses this turn
+            logger.warning(f"Could not record chat exchange: {e}")
+
     return {
         "success": result.get("success", False),
         "response": result.get("content", ""),
+        "session_id": session.id if session is not None else None,
         "context_used": len(context_results.get("results", [])),
+        "context_reused": context_reused,
         "sources": [
             {
                 "id": doc.get("id"),
@@ -276,6 +506,8 @@ def get_config():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Deep Scribe Gemini Backend")
     parser.add_argument("--port", type=int, help="Port to run the server on")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="HTTP worker processes; above 1 this process only serves the knowledge base to them")
     args = parser.parse_args()
 
     port = args.port
@@ -284,4 +516,13 @@ if __name__ == "__main__":
         logger.info(f"No port provided, found free port: {port}")
     
     logger.info(f"Starting Deep Scribe Gemini backend on port {port}")
-    uvicorn.run(app, host="127.0.0.1", port=int(port))
\ No newline at end of file
+    if args.workers > 1:
+        kb_server = KnowledgeBaseServer(kb_service, chat_sessions)
+        os.environ[KB_ADDRESS_ENV] = kb_server.start()
+        os.environ[KB_TOKEN_ENV] = kb_server.token
+        try:
+            uvicorn.run("main:app", host="127.0.0.1", port=int(port), workers=args.workers)
+        finally:
+            kb_server.close()
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=int(port))
\ No newline at end of file
@@ -1,4 +1,13 @@
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional
+from utils.logger import logger
+from services.scheduler import scheduler as default_scheduler, current_priority, SchedulerBusy
+from utils.upstream import generative_client
 
 QUILL_PRICING = {
     "gemini-2.0-flash": 1,
@@ -8,16 +17,226 @@ QUILL_PRICING = {
     "gemini-3.0-pro-preview": 15,
 }
 
+# Where to go when a model times out or is rate limited: cheaper/faster next
+FALLBACK_MODELS = {
+    "gemini-3.0-pro-preview": "gemini-2.5-pro",
+    "gemini-2.5-pro": "gemini-2.5-flash",
+    "gemini-2.5-flash": "gemini-2.5-flash-lite",
+    "gemini-2.0-flash": "gemini-2.5-flash-lite",
+}
+
+# Upstream status codes worth retrying on another model
+RETRYABLE_CODES = (429, 500, 503, 504)
+
+
+class ModelStats:
+    """Rolling latency and error statistics for one model
+
+    Latency samples only come from successful calls: a timeout says the call
+    took at least the timeout, and a fast 429 says nothing about latency, so
+    both only count towards the error rate.
+    """
+
+    ALPHA = 0.2
+    WINDOW = 100
+    # Seconds for the latency estimate of an idle model to halve, so a model
+    # skipped after one slow spike is eventually tried (and sampled) again
+    LATENCY_HALF_LIFE = 60.0
+
+    def __init__(self):
+        self.latency_ewma: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.timeouts = 0
+        self.cooldown_until = 0.0
+        self.sampled_at = 0.0
+        self._samples = deque(maxlen=self.WINDOW)
+
+    def record(self, latency: float):
+        """Record a successful call"""
+        self.requests += 1
+        self._samples.append(latency)
+        self.sampled_at = time.monotonic()
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma = self.ALPHA * latency + (1 - self.ALPHA) * self.latency_ewma
+        self.error_rate = (1 - self.ALPHA) * self.error_rate
+
+    def record_failure(self, timed_out: bool = False):
+        """Record a failed call without a latency sample"""
+        self.requests += 1
+        self.timeouts += timed_out
+        self.error_rate = self.ALPHA + (1 - self.ALPHA) * self.error_rate
+
+    def expected_latency(self) -> Optional[float]:
+        """Latency EWMA, decayed by the time since the last sample"""
+        if self.latency_ewma is None:
+            return None
+        age = time.monotonic() - self.sampled_at
+        return self.latency_ewma * 0.5 ** (age / self.LATENCY_HALF_LIFE)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "latency_ewma_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "latency_p95_ms": round(self.percentile(0.95) * 1000) if self._samples else None,
+            "error_rate": round(self.error_rate, 3),
+            "timeouts": self.timeouts,
+            "cooling_down": self.cooldown_until > time.monotonic(),
+        }
+
+
 class GeminiRouter:
-    """Gemini-exclusive AI router for Deep Scribe."""
+    """Gemini-exclusive AI router for Deep Scribe.
+
+    Routing policy: every request gets a deadline. A model that times out,
+    returns 429/5xx, is cooling down after a 429, or whose latency EWMA
+    (decayed while the model goes unsampled) alone would blow the deadline
+    is skipped in favour of the next model in FALLBACK_MODELS. With hedging
+    enabled, a duplicate request is sent once the primary has been
+    outstanding for longer than the model's p95.
+    """
+
+    DEFAULT_MODEL = "gemini-2.5-flash"
+    DEFAULT_DEADLINE = 60.0
+    # Time kept in reserve for a fallback when its latency is not known yet
+    FALLBACK_RESERVE = 10.0
+    RATE_LIMIT_COOLDOWN = 30.0
+    # Samples needed before p95 is trusted for hedging
+    HEDGE_MIN_SAMPLES = 20
+
+    def __init__(
+        self,
+        deadline: float = DEFAULT_DEADLINE,
+        hedge: bool = False,
+        fallback: bool = True,
+        scheduler=None
+    ):
+        self.scheduler = scheduler or default_scheduler
+        self.deadline = deadline
+        self.hedge = hedge
+        self.fallback = fallback
+        self.stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini")
+
+    def _stats(self, model: str) -> ModelStats:
+        with self._lock:
+            return self.stats.setdefault(model, ModelStats())
+
+    def _call(self, model: str, prompt: str, api_key: str, timeout: float) -> str:
+        """Single upstream generate_content call"""
+        # Per-key client rather than the global genai.configure, which
+        # concurrent requests with different keys would race on
+        request = glm.GenerateContentRequest(
+            model=f"models/{model}",
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])]
+        )
+        response = generative_client(api_key).generate_content(request, timeout=timeout)
+        return genai.types.GenerateContentResponse.from_response(response).text
 
-    def generate(self, model: str, prompt: str, api_key: str):
+    def _scheduled_call(self, model: str, prompt: str, api_key: str, timeout: float, priority: int) -> str:
+        """Wait for quota in the upstream scheduler, then call the model"""
+        start = time.monotonic()
+        self.scheduler.acquire(f"gemini.generate:{model}", api_key, priority=priority, max_wait=timeout)
+        return self._call(model, prompt, api_key, max(timeout - (time.monotonic() - start), 0.1))
+
+    @staticmethod
+    def _status_code(error: Exception) -> Optional[int]:
+        """HTTP status of an upstream error (google.api_core exceptions carry it as .code)"""
+        code = getattr(error, "code", None)
+        if code is None:
+            code = getattr(error, "status_code", None)
+        if code is None:
+            code = getattr(getattr(error, "response", None), "status_code", None)
+        code = getattr(code, "value", code)
+        return code if isinstance(code, int) else None
+
+    @classmethod
+    def _is_retryable(cls, error: Exception) -> bool:
+        return isinstance(error, TimeoutError) or cls._status_code(error) in RETRYABLE_CODES
+
+    @classmethod
+    def _is_rate_limit(cls, error: Exception) -> bool:
+        return cls._status_code(error) == 429
+
+    def _fallback_chain(self, model: str) -> List[str]:
+        chain = [model]
+        while chain[-1] in FALLBACK_MODELS and FALLBACK_MODELS[chain[-1]] not in chain:
+            chain.append(FALLBACK_MODELS[chain[-1]])
+        return chain
+
+    def _attempt(self, model: str, prompt: str, api_key: str, timeout: float, hedge: bool, priority: int) -> Dict:
+        """Run one model with an optional hedged duplicate; returns the outcome dict"""
+        stats = self._stats(model)
+        start = time.monotonic()
+        futures = {self._executor.submit(self._scheduled_call, model, prompt, api_key, timeout, priority): start}
+        hedged = False
+
+        hedge_after = stats.percentile(0.95) if hedge and stats.requests >= self.HEDGE_MIN_SAMPLES else None
+        if hedge_after is not None and hedge_after < timeout:
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                hedged = True
+                futures[self._executor.submit(self._scheduled_call, model, prompt, api_key, timeout, priority)] = time.monotonic()
+
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                stats.record(time.monotonic() - futures[future])
+                return {"success": True, "content": content, "hedged": hedged}
+
+        if error is None or pending:
+            stats.record_failure(timed_out=True)
+            return {"success": False, "error": f"{model} timed out after {timeout:.1f}s",
+                    "retryable": True, "hedged": hedged}
+
+        if isinstance(error, SchedulerBusy):
+            # Local backpressure, not an upstream failure: try the next model
+            return {"success": False, "error": str(error), "retryable": True, "hedged": hedged}
+
+        stats.record_failure()
+        if self._is_rate_limit(error):
+            stats.cooldown_until = time.monotonic() + self.RATE_LIMIT_COOLDOWN
+        return {"success": False, "error": str(error), "retryable": self._is_retryable(error), "hedged": hedged}
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        api_key: str,
+        deadline: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        fallback: Optional[bool] = None,
+        priority: Optional[int] = None
+    ):
         """Generate content using Gemini API.
 
         Args:
             model: Gemini model name (e.g., 'gemini-2.5-flash')
             prompt: The text prompt to send
             api_key: Gemini API key
+            deadline: Overall time budget in seconds (defaults to the router's)
+            hedge: Send a hedged duplicate after the model's p95 latency
+            fallback: Fall back to cheaper/faster models on timeout or 429
+            priority: Upstream scheduler priority class (defaults to the caller's scope)
 
         Returns:
             Dict with success status, content, and metadata
@@ -26,21 +245,75 @@ class GeminiRouter:
             if not api_key:
                 raise ValueError("Gemini API Key missing")
 
-            genai.configure(api_key=api_key)
-            model_name = model if model else "gemini-2.5-flash"
-            model_instance = genai.GenerativeModel(model_name)
-            response = model_instance.generate_content(prompt)
+            requested = model if model else self.DEFAULT_MODEL
+            deadline = deadline or self.deadline
+            hedge = self.hedge if hedge is None else hedge
+            fallback = self.fallback if fallback is None else fallback
+            priority = current_priority() if priority is None else priority
+
+            request_start = time.monotonic()
+            end = request_start + deadline
+            chain = self._fallback_chain(requested) if fallback else [requested]
+            attempts = []
+
+            for position, model_name in enumerate(chain):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                is_last = position == len(chain) - 1
+                stats = self._stats(model_name)
+                if not is_last:
+                    # Latency-aware skipping: don't start a model that is
+                    # rate limited or too slow to finish within the deadline
+                    if stats.cooldown_until > time.monotonic():
+                        attempts.append({"model": model_name, "skipped": "rate limited"})
+                        continue
+                    expected = stats.expected_latency()
+                    if expected is not None and expected > remaining:
+                        attempts.append({"model": model_name, "skipped": "too slow for deadline"})
+                        continue
 
-            cost = QUILL_PRICING.get(model_name, 1)
+                    next_latency = self._stats(chain[position + 1]).expected_latency()
+                    reserve = 2 * next_latency if next_latency else self.FALLBACK_RESERVE
+                    timeout = max(remaining - reserve, remaining / 2)
+                else:
+                    timeout = remaining
 
+                outcome = self._attempt(model_name, prompt, api_key, timeout, hedge, priority)
+                attempts.append({"model": model_name, "success": outcome["success"],
+                                 "error": outcome.get("error"), "hedged": outcome["hedged"]})
+
+                if outcome["success"]:
+                    return {
+                        "success": True,
+                        "provider": "gemini",
+                        "model": model_name,
+                        "requested_model": requested,
+                        "content": outcome["content"],
+                        "quills_deducted": QUILL_PRICING.get(model_name, 1),
+                        "fallback_used": model_name != requested,
+                        "hedged": outcome["hedged"],
+                        "latency_ms": round((time.monotonic() - request_start) * 1000),
+                        "attempts": attempts
+                    }
+
+                logger.warning(f"Gemini model {model_name} failed: {outcome['error']}")
+                if not outcome["retryable"]:
+                    return {"success": False, "error": outcome["error"], "attempts": attempts}
+
+            errors = [a["error"] for a in attempts if a.get("error")]
             return {
-                "success": True,
-                "provider": "gemini",
-                "model": model_name,
-                "content": response.text,
-                "quills_deducted": cost
+                "success": False,
+                "error": errors[-1] if errors else f"Deadline of {deadline:.1f}s exceeded",
+                "attempts": attempts
             }
 
         except Exception as e:
-            print(f"Gemini Router Error: {e}")
+            logger.error(f"Gemini Router Error: {e}")
             return {"success": False, "error": str(e)}
+
+    def get_stats(self) -> Dict:
+        """Per-model latency and error statistics"""
+        with self._lock:
+            return {model: stats.to_dict() for model, stats in self.stats.items()}
@@ -0,0 +1,190 @@
+"""
+Chat Sessions for Deep Scribe
+Server-side conversation state for Chat With Notes
+
+A session keeps the last few turns verbatim and folds older turns into a
+running summary written by a cheap model in the background, so the prompt
+stays roughly the same size however long the conversation runs. Retrieval
+context is reused for follow-ups that stay on the same topic.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.scheduler import BACKGROUND, prioritized
+from utils.logger import logger
+
+
+class ChatSession:
+    """State of a single conversation"""
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.turns: List[Dict[str, str]] = []
+        self.summary = ""
+        self.summarizing = False
+        self.context: Optional[Dict[str, Any]] = None
+        self.context_embedding: Optional[np.ndarray] = None
+        self.context_where: Optional[Dict[str, Any]] = None
+        self.lock = threading.Lock()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def add_exchange(self, message: str, response: str):
+        with self.lock:
+            self.turns.append({"role": "user", "content": message})
+            self.turns.append({"role": "assistant", "content": response})
+
+    def reusable_context(self, embedding: List[float], where: Optional[Dict[str, Any]], threshold: float):
+        """Previous retrieval results if the new message is about the same topic"""
+        if self.context is None or self.context_embedding is None or where != self.context_where:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        denominator = np.linalg.norm(query) * np.linalg.norm(self.context_embedding)
+        if denominator == 0:
+            return None
+        similarity = float(query @ self.context_embedding / denominator)
+        return self.context if similarity >= threshold else None
+
+    def remember_context(self, embedding: List[float], where: Optional[Dict[str, Any]], context: Dict[str, Any]):
+        self.context = context
+        self.context_embedding = np.asarray(embedding, dtype=np.float32)
+        self.context_where = where
+
+    def history_text(self, max_turn_chars: int) -> str:
+        """Running summary plus the verbatim recent turns, formatted for a prompt"""
+        with self.lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Summary of earlier conversation: {self.summary}")
+            for turn in self.turns:
+                speaker = "User" if turn["role"] == "user" else "Assistant"
+                parts.append(f"{speaker}: {turn['content'][:max_turn_chars]}")
+            return "\n".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "created_at": self.created_at,
+            "turns": len(self.turns),
+            "has_summary": bool(self.summary)
+        }
+
+
+class ChatSessionStore:
+    """In-memory registry of chat sessions with idle expiry"""
+
+    SESSION_TTL = 30 * 60
+    MAX_SESSIONS = 200
+    # Recent turns kept verbatim (user + assistant messages)
+    MAX_VERBATIM_TURNS = 6
+    MAX_TURN_CHARS = 1500
+    MAX_SUMMARY_CHARS = 2000
+    SUMMARY_MODEL = "gemini-2.5-flash-lite"
+    # Cosine similarity above which a follow-up reuses the previous retrieval
+    CONTEXT_REUSE_THRESHOLD = 0.75
+
+    SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a research assistant.
+Keep names, facts, decisions and open questions. Write at most {max_chars} characters of plain prose.
+
+## Current Summary:
+{summary}
+
+## Turns to Fold In:
+{turns}
+
+Output ONLY the updated summary.
+"""
+
+    def __init__(self, router, ttl: float = SESSION_TTL):
+        self.router = router
+        self.ttl = ttl
+        self._sessions: Dict[str, ChatSession] = {}
+        self._lock = threading.Lock()
+        self._background = set()
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [s.id for s in self._sessions.values() if s.last_active < cutoff]:
+            del self._sessions[session_id]
+        while len(self._sessions) > self.MAX_SESSIONS:
+            oldest = min(self._sessions.values(), key=lambda s: s.last_active)
+            del self._sessions[oldest.id]
+
+    def create(self) -> ChatSession:
+        session = ChatSession(uuid.uuid4().hex)
+        with self._lock:
+            self._prune()
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            self._prune()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.touch()
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    # --- Summarization ---
+
+    def _summarize(self, session: ChatSession, api_key: str):
+        """Fold turns beyond the verbatim window into the running summary"""
+        with session.lock:
+            overflow = len(session.turns) - self.MAX_VERBATIM_TURNS
+            folded = session.turns[:overflow]
+            summary = session.summary
+
+        turns = "\n".join(
+            f"{'User' if t['role'] == 'user' else 'Assistant'}: {t['content'][:self.MAX_TURN_CHARS]}"
+            for t in folded
+        )
+        result = self.router.generate(
+            model=self.SUMMARY_MODEL,
+            prompt=self.SUMMARY_PROMPT.format(
+                max_chars=self.MAX_SUMMARY_CHARS,
+                summary=summary or "(none yet)",
+                turns=turns
+            ),
+            api_key=api_key
+        )
+
+        with session.lock:
+            if result.get("success"):
+                session.summary = result.get("content", "").strip()[:self.MAX_SUMMARY_CHARS]
+                # Only drop the turns that made it into the summary; new ones
+                # may have been appended while the model was working
+                session.turns = session.turns[len(folded):]
+            else:
+                logger.warning(f"Chat summary failed for session {session.id}: {result.get('error')}")
+            session.summarizing = False
+
+    def schedule_summary(self, session: ChatSession, api_key: str):
+        """Start a background summarization if the verbatim window has overflowed"""
+        with session.lock:
+            if session.summarizing or len(session.turns) <= self.MAX_VERBATIM_TURNS:
+                return
+            session.summarizing = True
+
+        summarize = prioritized(BACKGROUND, self._summarize)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a plain thread (the KB owner process in multi-worker mode)
+            threading.Thread(target=summarize, args=(session, api_key), name="chat-summary", daemon=True).start()
+            return
+        task = loop.create_task(asyncio.to_thread(summarize, session, api_key))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
@@ -1,12 +1,14 @@
 import requests
 from typing import Dict, Any, List
 from utils.logger import logger
+from services.scheduler import scheduler
+from utils.upstream import google_api_url
 
 class GoogleBooksService:
     """
     Service for interacting with the Google Books API.
     """
-    BASE_URL = "https://www.googleapis.com/books/v1/volumes"
+    PATH = "/books/v1/volumes"
 
     def __init__(self):
         self._api_key = None
@@ -27,7 +29,7 @@ class GoogleBooksService:
             }
             
             logger.info(f"Searching Google Books: {query}")
-            response = requests.get(self.BASE_URL, params=params, timeout=10)
+            response = scheduler.run("google.books", self._api_key, requests.get, google_api_url(self.PATH), params=params, timeout=10)
             
             if response.status_code != 200:
                 return {"success": False, "error": f"API Error: {response.status_code}"}
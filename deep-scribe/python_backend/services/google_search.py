@@ -2,6 +2,8 @@ import requests
 import os
 from typing import List, Dict, Any, Optional
 from utils.logger import logger
+from services.scheduler import scheduler
+from utils.upstream import google_api_url
 
 class GoogleSearchService:
     """
@@ -9,7 +11,7 @@ class GoogleSearchService:
     Provides "Grounded" research capabilities by fetching live web results.
     """
     
-    BASE_URL = "https://www.googleapis.com/customsearch/v1"
+    PATH = "/customsearch/v1"
 
     def __init__(self):
         self._api_key = None
@@ -48,7 +50,7 @@ class GoogleSearchService:
             params.update(kwargs)
 
             logger.info(f"Executing Google Search: {query}")
-            response = requests.get(self.BASE_URL, params=params, timeout=10)
+            response = scheduler.run("google.search", self._api_key, requests.get, google_api_url(self.PATH), params=params, timeout=10)
             
             if response.status_code != 200:
                 logger.error(f"Google Search API Error: {response.status_code} - {response.text}")
@@ -0,0 +1,221 @@
+"""
+Portable Knowledge Base bundles for Deep Scribe
+Streams the knowledge base to and from a tar archive without re-embedding
+
+Bundle layout (members are written in this order):
+
+    manifest.json           format version, embedding model, dimension, dtype
+    records-00000.jsonl     one {"id", "document", "metadata"} object per line
+    vectors-00000.f32       raw little-endian float32 matrix, one row per record
+    records-00001.jsonl
+    vectors-00001.f32
+    ...
+
+Every records/vectors pair holds one batch, so both export and import only
+ever keep a single batch in memory.
+"""
+
+import io
+import json
+import tarfile
+import time
+from typing import Any, BinaryIO, Dict, Iterator, Optional
+
+import numpy as np
+
+BUNDLE_FORMAT = "deep-scribe-kb"
+BUNDLE_VERSION = 1
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+class BundleError(ValueError):
+    """Raised when an import bundle is malformed"""
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only sink that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _add_member(archive: tarfile.TarFile, name: str, payload: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(payload)
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(payload))
+
+
+def export_bundle(kb_service, batch_size: int = 500) -> Iterator[bytes]:
+    """
+    Stream the knowledge base as a tar bundle
+
+    Args:
+        kb_service: The KnowledgeBaseService to export
+        batch_size: Number of records per records/vectors pair
+
+    Yields:
+        Chunks of the tar archive
+    """
+    sink = _StreamBuffer()
+    archive = tarfile.open(fileobj=sink, mode="w|")
+
+    batches = kb_service.iter_records(batch_size=batch_size)
+    first = next(batches, None)
+    dimension = len(first['embeddings'][0]) if first else 0
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "embedding_model": kb_service.EMBEDDING_MODEL,
+        "dimension": dimension,
+        "dtype": VECTOR_DTYPE.str,
+        "batch_size": batch_size,
+        "created_at": time.time(),
+    }
+    _add_member(archive, "manifest.json", json.dumps(manifest).encode())
+    yield sink.drain()
+
+    number = 0
+    batch = first
+    while batch is not None:
+        records = "".join(
+            json.dumps({"id": doc_id, "document": document, "metadata": metadata}) + "\n"
+            for doc_id, document, metadata in zip(batch['ids'], batch['documents'], batch['metadatas'])
+        )
+        vectors = np.asarray(batch['embeddings'], dtype=VECTOR_DTYPE)
+        _add_member(archive, f"records-{number:05d}.jsonl", records.encode())
+        _add_member(archive, f"vectors-{number:05d}.f32", vectors.tobytes())
+        yield sink.drain()
+
+        number += 1
+        batch = next(batches, None)
+
+    archive.close()
+    yield sink.drain()
+
+
+def _read_batches(kb_service, fileobj: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Parse and validate a bundle, yielding one restore_records batch at a time
+
+    Raises:
+        BundleError: if the manifest or any records/vectors pair is malformed
+        tarfile.TarError: if the archive itself is truncated or corrupt
+    """
+    manifest: Optional[Dict[str, Any]] = None
+    pending = None
+
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            payload = archive.extractfile(member).read()
+
+            if member.name == "manifest.json":
+                manifest = json.loads(payload)
+                if not isinstance(manifest, dict) or manifest.get("format") != BUNDLE_FORMAT:
+                    raise BundleError("Not a Deep Scribe knowledge base bundle")
+                if manifest.get("version", 0) > BUNDLE_VERSION:
+                    raise BundleError(f"Unsupported bundle version: {manifest.get('version')}")
+                if manifest.get("embedding_model") != kb_service.EMBEDDING_MODEL:
+                    raise BundleError(
+                        f"Bundle was embedded with {manifest.get('embedding_model')}, "
+                        f"expected {kb_service.EMBEDDING_MODEL}"
+                    )
+                if not isinstance(manifest.get("dimension"), int):
+                    raise BundleError("Bundle manifest has no embedding dimension")
+                continue
+
+            if manifest is None:
+                raise BundleError("Bundle is missing manifest.json")
+
+            if member.name.startswith("records-"):
+                pending = [json.loads(line) for line in payload.decode().splitlines() if line]
+                for record in pending:
+                    if not isinstance(record, dict) or not isinstance(record.get("id"), str) \
+                            or "document" not in record or not isinstance(record.get("metadata"), dict):
+                        raise BundleError(f"Malformed record in {member.name}")
+            elif member.name.startswith("vectors-"):
+                if pending is None:
+                    raise BundleError(f"{member.name} has no preceding records file")
+                vectors = np.frombuffer(payload, dtype=np.dtype(manifest.get("dtype", VECTOR_DTYPE.str)))
+                if vectors.size != len(pending) * manifest["dimension"]:
+                    raise BundleError(f"{member.name} does not match its records file")
+                yield {
+                    "ids": [record["id"] for record in pending],
+                    "embeddings": vectors.reshape(len(pending), manifest["dimension"]).tolist(),
+                    "documents": [record["document"] for record in pending],
+                    "metadatas": [record["metadata"] for record in pending],
+                }
+                pending = None
+
+    if manifest is None:
+        raise BundleError("Bundle is missing manifest.json")
+    if pending is not None:
+        raise BundleError("Bundle ended with records that have no vectors")
+
+
+def _stored_dimension(kb_service) -> Optional[int]:
+    """Embedding dimension of the records already in the knowledge base"""
+    first = next(kb_service.iter_records(batch_size=1), None)
+    return len(first['embeddings'][0]) if first else None
+
+
+def import_bundle(kb_service, fileobj: BinaryIO, replace: bool = False) -> Dict[str, Any]:
+    """
+    Restore a tar bundle into the knowledge base without any embedding calls
+
+    The whole bundle is read and validated before anything is written (or,
+    with replace, cleared), so a truncated or corrupt upload leaves the
+    knowledge base untouched.
+
+    Args:
+        kb_service: The KnowledgeBaseService to restore into
+        fileobj: Readable, seekable binary stream of the bundle
+        replace: Clear the knowledge base before restoring
+
+    Returns:
+        Dict with success status and number of imported records
+    """
+    imported = 0
+    batches = 0
+
+    try:
+        dimension = None if replace else _stored_dimension(kb_service)
+        for batch in _read_batches(kb_service, fileobj):
+            if dimension is not None and batch["embeddings"] and len(batch["embeddings"][0]) != dimension:
+                raise BundleError(
+                    f"Bundle vectors have {len(batch['embeddings'][0])} dimensions, "
+                    f"the knowledge base has {dimension}"
+                )
+        fileobj.seek(0)
+    except (tarfile.TarError, ValueError) as e:
+        return {"success": False, "error": str(e), "imported": 0}
+
+    try:
+        if replace:
+            cleared = kb_service.clear_all()
+            if not cleared.get("success"):
+                return {"success": False, "error": cleared.get("error", "Could not clear the knowledge base"),
+                        "imported": 0}
+        for batch in _read_batches(kb_service, fileobj):
+            kb_service.restore_records(**batch)
+            imported += len(batch["ids"])
+            batches += 1
+        return {"success": True, "imported": imported, "batches": batches}
+
+    except Exception as e:
+        return {"success": False, "error": str(e), "imported": imported}
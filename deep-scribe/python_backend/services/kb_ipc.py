@@ -0,0 +1,636 @@
+"""
+Knowledge Base IPC for Deep Scribe's multi-worker mode
+
+Chroma's PersistentClient must only be opened by one process. With
+`main.py --workers N` the parent process keeps the KnowledgeBaseService (and
+the chat sessions) and serves them over a local socket, while N uvicorn
+workers handle HTTP and talk to it through RemoteKnowledgeBase and
+RemoteChatSessionStore.
+
+Protocol: every frame is a 4-byte big-endian length followed by a MessagePack
+body; float32 arrays (embeddings) travel as raw little-endian bytes in an
+extension type. A connection starts with the shared token, then carries
+request frames [method, kwargs, api_key, priority] answered by [ok, result].
+
+Reads run concurrently on the per-connection server threads. Writes embed
+their new content on the connection thread too, then queue for a single
+writer thread that only does the storage work (Chroma, metadata index,
+topics, related notes) and folds queued add_document calls into one
+add_documents call.
+
+The owner process's UpstreamScheduler is the only one holding token
+buckets: workers delegate every acquire to it (RemoteScheduler), so quotas
+and priority classes hold across processes.
+"""
+
+import os
+import secrets
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import google.generativeai as genai
+import numpy as np
+
+from knowledge_base import KnowledgeBaseService, embedding_scope
+from services.chat_sessions import ChatSession, ChatSessionStore
+from services.scheduler import SchedulerBusy, current_priority, priority_scope, scheduler as default_scheduler
+from utils.logger import logger
+from utils.upstream import generative_client
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - required only for multi-worker mode
+    msgpack = None
+
+KB_ADDRESS_ENV = "DEEP_SCRIBE_KB_ADDRESS"
+KB_TOKEN_ENV = "DEEP_SCRIBE_KB_TOKEN"
+
+FLOAT32_ARRAY = 1
+_LENGTH = struct.Struct(">I")
+MAX_FRAME = 1 << 30
+
+KB_READS = ("query", "get_all_documents", "get_related", "get_topics", "get_stats", "records_page")
+KB_WRITES = (
+    "add_document", "add_documents", "upsert_document", "add_research_findings", "add_research_report",
+    "delete_document", "clear_all", "restore_records", "rebuild_topics",
+)
+# Methods that may embed, and so take the caller's API key
+KB_KEYED = ("query", "add_document", "add_documents", "upsert_document", "add_research_findings", "add_research_report")
+# Writes whose embeddings are computed before they are queued for the writer
+KB_PREPARED = ("add_document", "add_documents", "upsert_document")
+SCHEDULER_METHODS = ("scheduler.acquire", "scheduler.metrics")
+CHAT_METHODS = (
+    "chat.create", "chat.get", "chat.delete", "chat.remember_context", "chat.add_exchange", "chat.schedule_summary",
+)
+
+
+class RemoteError(RuntimeError):
+    """An exception raised by the KB owner process while handling a request"""
+
+
+# --- Framing ---
+
+def _default(value: Any):
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value, dtype="<f4")
+        header = struct.pack(f">B{array.ndim}I", array.ndim, *array.shape)
+        return msgpack.ExtType(FLOAT32_ARRAY, header + array.tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+
+def _ext_hook(code: int, data: bytes):
+    if code != FLOAT32_ARRAY:
+        return msgpack.ExtType(code, data)
+    ndim = data[0]
+    shape = struct.unpack_from(f">{ndim}I", data, 1)
+    return np.frombuffer(data, dtype="<f4", offset=1 + 4 * ndim).reshape(shape)
+
+
+def pack(message: Any) -> bytes:
+    body = msgpack.packb(message, default=_default, use_bin_type=True)
+    return _LENGTH.pack(len(body)) + body
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 1 << 20))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def recv_message(sock: socket.socket) -> Any:
+    """Read one frame; None when the peer closed the connection"""
+    header = _recv_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    (length,) = _LENGTH.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"Frame of {length} bytes exceeds the limit")
+    body = _recv_exact(sock, length)
+    if body is None:
+        return None
+    return msgpack.unpackb(body, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+def _connect(address: str) -> socket.socket:
+    kind, _, location = address.partition(":")
+    if kind == "unix":
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(location)
+    else:
+        host, _, port = location.rpartition(":")
+        sock = socket.create_connection((host, int(port)))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+# --- Owner process ---
+
+class _WriteOp:
+    def __init__(self, method: str, kwargs: Dict[str, Any], api_key: Optional[str], priority: int,
+                 embeddings: Dict[str, List[float]]):
+        self.method = method
+        self.kwargs = kwargs
+        self.api_key = api_key
+        self.priority = priority
+        # Content -> embedding computed before queueing (see embedding_scope)
+        self.embeddings = embeddings
+        self.future: Future = Future()
+
+
+class KnowledgeBaseServer:
+    """Serves a KnowledgeBaseService and ChatSessionStore to worker processes"""
+
+    # Most add_document calls folded into one add_documents call
+    MAX_WRITE_BATCH = 64
+
+    def __init__(self, kb_service, chat_sessions: Optional[ChatSessionStore] = None, address: Optional[str] = None,
+                 scheduler=None):
+        """
+        Args:
+            kb_service: The process's KnowledgeBaseService (owner of Chroma)
+            chat_sessions: Chat session store shared by all workers
+            address: "unix:PATH" or "tcp:HOST:PORT"; defaults to a private
+                Unix socket (TCP on loopback where Unix sockets are unavailable)
+            scheduler: UpstreamScheduler admitting the workers' upstream calls
+                (defaults to this process's global one)
+        """
+        if msgpack is None:
+            raise RuntimeError("Multi-worker mode requires the msgpack package")
+        self.kb_service = kb_service
+        self.chat_sessions = chat_sessions
+        self.scheduler = scheduler or default_scheduler
+        self.token = secrets.token_hex(16)
+        self._requested_address = address
+        self._server: Optional[socketserver.BaseServer] = None
+        self._socket_dir: Optional[str] = None
+        self._writes: deque = deque()
+        self._writes_ready = threading.Condition()
+        self._closed = False
+        self.address: Optional[str] = None
+
+    # --- Lifecycle ---
+
+    def start(self) -> str:
+        """Bind, start serving in background threads and return the address"""
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._serve_connection(self.request)
+
+        address = self._requested_address
+        if address is None:
+            if hasattr(socket, "AF_UNIX"):
+                self._socket_dir = tempfile.mkdtemp(prefix="deep-scribe-kb-")
+                address = f"unix:{os.path.join(self._socket_dir, 'kb.sock')}"
+            else:
+                address = "tcp:127.0.0.1:0"
+
+        kind, _, location = address.partition(":")
+        if kind == "unix":
+            self._server = socketserver.ThreadingUnixStreamServer(location, Handler)
+            os.chmod(location, 0o600)
+            self.address = address
+        else:
+            host, _, port = location.rpartition(":")
+            self._server = socketserver.ThreadingTCPServer((host, int(port)), Handler)
+            self.address = f"tcp:{host}:{self._server.server_address[1]}"
+        self._server.daemon_threads = True
+
+        threading.Thread(target=self._server.serve_forever, name="kb-server", daemon=True).start()
+        threading.Thread(target=self._write_loop, name="kb-writer", daemon=True).start()
+        logger.info(f"Knowledge base server listening on {self.address}")
+        return self.address
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        with self._writes_ready:
+            self._closed = True
+            self._writes_ready.notify_all()
+        if self._socket_dir is not None:
+            for name in os.listdir(self._socket_dir):
+                os.remove(os.path.join(self._socket_dir, name))
+            os.rmdir(self._socket_dir)
+        for derived in (getattr(self.kb_service, "topics", None), getattr(self.kb_service, "related", None)):
+            if derived is not None:
+                derived.flush()
+
+    # --- Connections ---
+
+    def _serve_connection(self, sock: socket.socket):
+        token = recv_message(sock)
+        if not isinstance(token, str) or not secrets.compare_digest(token, self.token):
+            logger.warning("Rejected knowledge base connection with a bad token")
+            return
+        sock.sendall(pack([True, None]))
+        while True:
+            request = recv_message(sock)
+            if request is None:
+                return
+            method, kwargs, api_key, priority = request
+            try:
+                result = self._dispatch(method, kwargs or {}, api_key, priority)
+                response = [True, result]
+            except Exception as e:
+                response = [False, f"{type(e).__name__}: {e}"]
+            sock.sendall(pack(response))
+
+    def _dispatch(self, method: str, kwargs: Dict[str, Any], api_key: Optional[str], priority: int) -> Any:
+        if method in KB_READS:
+            with priority_scope(priority):
+                if method == "records_page":
+                    return self._records_page(**kwargs)
+                if method in KB_KEYED:
+                    kwargs = {**kwargs, "api_key": api_key}
+                return getattr(self.kb_service, method)(**kwargs)
+        if method in KB_WRITES:
+            if method in KB_KEYED:
+                kwargs = {**kwargs, "api_key": api_key}
+            embeddings = {}
+            if method in KB_PREPARED:
+                try:
+                    with priority_scope(priority):
+                        embeddings = self._prepare_write(method, kwargs)
+                except Exception as e:
+                    return {"success": False, "error": str(e)}
+            op = _WriteOp(method, kwargs, api_key, priority, embeddings)
+            with self._writes_ready:
+                self._writes.append(op)
+                self._writes_ready.notify()
+            return op.future.result()
+        if method in SCHEDULER_METHODS:
+            if method == "scheduler.acquire":
+                kwargs = {**kwargs, "api_key": api_key}
+            return getattr(self, f"_{method.replace('.', '_')}")(**kwargs)
+        if method in CHAT_METHODS and self.chat_sessions is not None:
+            if method == "chat.schedule_summary":
+                kwargs = {**kwargs, "api_key": api_key}
+            return getattr(self, f"_{method.replace('.', '_')}")(**kwargs)
+        raise ValueError(f"Unknown method: {method}")
+
+    def _records_page(self, offset: int, limit: int) -> Dict[str, Any]:
+        batch = self.kb_service.collection.get(
+            limit=limit, offset=offset, include=["embeddings", "documents", "metadatas"]
+        )
+        return {
+            "ids": batch['ids'],
+            "embeddings": np.asarray(batch['embeddings'], dtype=np.float32),
+            "documents": batch['documents'],
+            "metadatas": batch['metadatas'],
+        }
+
+    # --- Writes ---
+
+    def _prepare_write(self, method: str, kwargs: Dict[str, Any]) -> Dict[str, List[float]]:
+        """Embed a write's new content on the calling connection's thread, before it is queued"""
+        if method == "upsert_document":
+            return self.kb_service.prepare_upsert(kwargs["doc_id"], kwargs["content"], api_key=kwargs["api_key"])
+        records = kwargs["records"] if method == "add_documents" else [kwargs]
+        return self.kb_service.prepare_documents(records, api_key=kwargs["api_key"])
+
+    def _write_loop(self):
+        while True:
+            with self._writes_ready:
+                while not self._writes and not self._closed:
+                    self._writes_ready.wait()
+                if self._closed:
+                    return
+                batch = [self._writes.popleft()]
+                if batch[0].method == "add_document":
+                    while (self._writes and len(batch) < self.MAX_WRITE_BATCH
+                           and self._writes[0].method == "add_document"
+                           and self._writes[0].api_key == batch[0].api_key
+                           and self._writes[0].priority == batch[0].priority):
+                        batch.append(self._writes.popleft())
+            embeddings = {}
+            for op in batch:
+                embeddings.update(op.embeddings)
+            try:
+                with priority_scope(batch[0].priority), embedding_scope(embeddings):
+                    if len(batch) > 1:
+                        self._add_batch(batch)
+                    else:
+                        batch[0].future.set_result(getattr(self.kb_service, batch[0].method)(**batch[0].kwargs))
+            except Exception as e:
+                for op in batch:
+                    if not op.future.done():
+                        op.future.set_exception(e)
+
+    def _add_batch(self, batch: List[_WriteOp]):
+        """Run several add_document calls as one add_documents call"""
+        result = self.kb_service.add_documents([
+            {
+                "content": op.kwargs["content"],
+                "source": op.kwargs["source"],
+                "title": op.kwargs["title"],
+                "doc_type": op.kwargs.get("doc_type", "research"),
+                "metadata": op.kwargs.get("metadata"),
+            }
+            for op in batch
+        ], api_key=batch[0].api_key)
+        if not result.get("success"):
+            for op in batch:
+                op.future.set_result(result)
+            return
+
+        added = set(result["added"])
+        for op, doc_id in zip(batch, result["ids"]):
+            updated = doc_id in added
+            added.discard(doc_id)
+            op.future.set_result({
+                "success": True,
+                "id": doc_id,
+                "message": "Document added successfully" if updated else "Document already exists",
+                "updated": updated
+            })
+
+    # --- Upstream admission ---
+
+    def _scheduler_acquire(self, endpoint: str, api_key: Optional[str], priority: int,
+                           max_wait: float) -> Optional[Dict[str, Any]]:
+        """Wait for quota on a worker's behalf; a rejection is returned rather than raised"""
+        try:
+            self.scheduler.acquire(endpoint, api_key, priority=priority, max_wait=max_wait)
+        except SchedulerBusy as e:
+            return {"busy": str(e), "retry_after": e.retry_after}
+        return None
+
+    def _scheduler_metrics(self) -> Dict[str, Any]:
+        return self.scheduler.get_metrics()
+
+    # --- Chat sessions ---
+
+    def _chat_create(self) -> Dict[str, Any]:
+        return self.chat_sessions.create().to_dict()
+
+    def _chat_get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.chat_sessions.get(session_id)
+        if session is None:
+            return None
+        with session.lock:
+            return {
+                **session.to_dict(),
+                "turns": list(session.turns),
+                "summary": session.summary,
+                "context": session.context,
+                "context_embedding": session.context_embedding,
+                "context_where": session.context_where,
+            }
+
+    def _chat_delete(self, session_id: str) -> bool:
+        return self.chat_sessions.delete(session_id)
+
+    def _chat_remember_context(self, session_id: str, embedding, where, context):
+        session = self.chat_sessions.get(session_id)
+        if session is not None:
+            session.remember_context(embedding, where, context)
+
+    def _chat_add_exchange(self, session_id: str, message: str, response: str):
+        session = self.chat_sessions.get(session_id)
+        if session is not None:
+            session.add_exchange(message, response)
+
+    def _chat_schedule_summary(self, session_id: str, api_key: str):
+        session = self.chat_sessions.get(session_id)
+        if session is not None:
+            self.chat_sessions.schedule_summary(session, api_key)
+
+
+# --- Worker processes ---
+
+class KnowledgeBaseClient:
+    """Thread-safe client: one connection per calling thread, opened lazily"""
+
+    def __init__(self, address: str, token: str):
+        if msgpack is None:
+            raise RuntimeError("Multi-worker mode requires the msgpack package")
+        self.address = address
+        self.token = token
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = _connect(self.address)
+            sock.sendall(pack(self.token))
+            if recv_message(sock) != [True, None]:
+                sock.close()
+                raise ConnectionError("Knowledge base server rejected the connection")
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def call(self, method: str, api_key: Optional[str] = None, **kwargs) -> Any:
+        request = pack([method, kwargs, api_key, current_priority()])
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                sock.sendall(request)
+                response = recv_message(sock)
+            except OSError:
+                response = None
+            if response is not None:
+                break
+            # The connection was closed (e.g. idle socket reset); reconnect once
+            self._drop_connection()
+            if attempt:
+                raise ConnectionError("Knowledge base server closed the connection")
+        ok, result = response
+        if not ok:
+            raise RemoteError(result)
+        return result
+
+
+class RemoteKnowledgeBase:
+    """
+    KnowledgeBaseService stand-in for uvicorn workers
+
+    Query embeddings are computed here, so the embedding round trips of
+    concurrent queries overlap across workers instead of queueing in the
+    owner process, which only runs the Chroma work.
+    """
+
+    EMBEDDING_MODEL = KnowledgeBaseService.EMBEDDING_MODEL
+
+    def __init__(self, address: str, token: str):
+        self.client = KnowledgeBaseClient(address, token)
+
+    @classmethod
+    def from_env(cls) -> "RemoteKnowledgeBase":
+        return cls(os.environ[KB_ADDRESS_ENV], os.environ[KB_TOKEN_ENV])
+
+    def embed_query(self, query_text: str, api_key: Optional[str]) -> List[float]:
+        if not api_key:
+            raise ValueError("Gemini API key not set")
+        result = default_scheduler.run(
+            "gemini.embed", api_key, genai.embed_content,
+            model=self.EMBEDDING_MODEL,
+            content=query_text,
+            task_type="retrieval_query",
+            client=generative_client(api_key)
+        )
+        return result['embedding']
+
+    def _call(self, method: str, error_extra: Optional[Dict[str, Any]] = None, api_key: Optional[str] = None,
+              **kwargs) -> Dict[str, Any]:
+        """Call a method returning a result dict, reporting IPC failures the same way"""
+        try:
+            return self.client.call(method, api_key=api_key, **kwargs)
+        except Exception as e:
+            return {"success": False, "error": str(e), **(error_extra or {})}
+
+    # --- Writes ---
+
+    def add_document(self, content: str, source: str, title: str, doc_type: str = "research",
+                     metadata: Optional[Dict[str, Any]] = None, api_key: Optional[str] = None) -> Dict[str, Any]:
+        return self._call("add_document", api_key=api_key, content=content, source=source, title=title,
+                          doc_type=doc_type, metadata=metadata)
+
+    def add_documents(self, records: List[Dict[str, Any]], api_key: Optional[str] = None) -> Dict[str, Any]:
+        return self._call("add_documents", api_key=api_key, records=records)
+
+    def upsert_document(self, doc_id: str, content: str, source: str, title: str, doc_type: str = "draft",
+                        metadata: Optional[Dict[str, Any]] = None, api_key: Optional[str] = None) -> Dict[str, Any]:
+        return self._call("upsert_document", api_key=api_key, doc_id=doc_id, content=content, source=source,
+                          title=title, doc_type=doc_type, metadata=metadata)
+
+    def add_research_findings(self, topic: str, subtopic: str, findings: str, research_id: str,
+                              api_key: Optional[str] = None) -> Dict[str, Any]:
+        return self._call("add_research_findings", api_key=api_key, topic=topic, subtopic=subtopic,
+                          findings=findings, research_id=research_id)
+
+    def add_research_report(self, topic: str, report: str, research_id: str,
+                            api_key: Optional[str] = None) -> Dict[str, Any]:
+        return self._call("add_research_report", api_key=api_key, topic=topic, report=report,
+                          research_id=research_id)
+
+    def delete_document(self, doc_id: str) -> Dict[str, Any]:
+        return self._call("delete_document", doc_id=doc_id)
+
+    def clear_all(self) -> Dict[str, Any]:
+        return self._call("clear_all")
+
+    def restore_records(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.client.call("restore_records", ids=ids, embeddings=np.asarray(embeddings, dtype=np.float32),
+                         documents=documents, metadatas=metadatas)
+
+    def rebuild_topics(self) -> bool:
+        return self.client.call("rebuild_topics")
+
+    # --- Reads ---
+
+    def query(self, query_text: str, n_results: int = 5, doc_type: Optional[str] = None,
+              where: Optional[Dict[str, Any]] = None, query_embedding: Optional[List[float]] = None,
+              api_key: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            if query_embedding is None:
+                query_embedding = self.embed_query(query_text, api_key)
+        except Exception as e:
+            return {"success": False, "error": str(e), "results": []}
+        return self._call("query", {"results": []}, query_text=query_text, n_results=n_results, doc_type=doc_type,
+                          where=where, query_embedding=np.asarray(query_embedding, dtype=np.float32))
+
+    def get_all_documents(self, limit: int = 100, doc_type: Optional[str] = None,
+                          where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return self._call("get_all_documents", {"documents": []}, limit=limit, doc_type=doc_type, where=where)
+
+    def get_related(self, doc_id: str, n_results: int = 5) -> Dict[str, Any]:
+        return self._call("get_related", {"results": []}, doc_id=doc_id, n_results=n_results)
+
+    def get_topics(self) -> Dict[str, Any]:
+        return self._call("get_topics")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._call("get_stats")
+
+    def iter_records(self, batch_size: int = 500):
+        """Yield the raw collection contents, embeddings included, in bounded batches"""
+        offset = 0
+        while True:
+            batch = self.client.call("records_page", offset=offset, limit=batch_size)
+            if not batch['ids']:
+                break
+            yield batch
+            offset += len(batch['ids'])
+
+
+class RemoteScheduler:
+    """Admits a worker's upstream calls through the owner process's scheduler (see UpstreamScheduler.delegate_to)"""
+
+    def __init__(self, client: KnowledgeBaseClient):
+        self.client = client
+
+    def acquire(self, endpoint: str, api_key: Optional[str], priority: int, max_wait: float):
+        busy = self.client.call("scheduler.acquire", api_key=api_key, endpoint=endpoint, priority=priority,
+                                max_wait=max_wait)
+        if busy is not None:
+            raise SchedulerBusy(busy["busy"], retry_after=busy["retry_after"])
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self.client.call("scheduler.metrics")
+
+
+class RemoteChatSession(ChatSession):
+    """Snapshot of a session held by the owner process; changes are forwarded to it"""
+
+    def __init__(self, client: KnowledgeBaseClient, snapshot: Dict[str, Any]):
+        super().__init__(snapshot["session_id"])
+        self._client = client
+        self.created_at = snapshot["created_at"]
+        self.turns = snapshot["turns"]
+        self.summary = snapshot["summary"]
+        self.context = snapshot["context"]
+        self.context_embedding = snapshot["context_embedding"]
+        self.context_where = snapshot["context_where"]
+
+    def remember_context(self, embedding: List[float], where: Optional[Dict[str, Any]], context: Dict[str, Any]):
+        super().remember_context(embedding, where, context)
+        self._client.call("chat.remember_context", session_id=self.id,
+                          embedding=np.asarray(embedding, dtype=np.float32), where=where, context=context)
+
+    def add_exchange(self, message: str, response: str):
+        super().add_exchange(message, response)
+        self._client.call("chat.add_exchange", session_id=self.id, message=message, response=response)
+
+
+class RemoteChatSessionStore(ChatSessionStore):
+    """ChatSessionStore stand-in for uvicorn workers; sessions live in the owner process"""
+
+    def __init__(self, client: KnowledgeBaseClient, ttl: float = ChatSessionStore.SESSION_TTL):
+        super().__init__(router=None, ttl=ttl)
+        self.client = client
+
+    def create(self) -> ChatSession:
+        snapshot = self.client.call("chat.create")
+        return RemoteChatSession(self.client, {**snapshot, "turns": [], "summary": "", "context": None,
+                                               "context_embedding": None, "context_where": None})
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        snapshot = self.client.call("chat.get", session_id=session_id)
+        return RemoteChatSession(self.client, snapshot) if snapshot is not None else None
+
+    def delete(self, session_id: str) -> bool:
+        return self.client.call("chat.delete", session_id=session_id)
+
+    def schedule_summary(self, session: ChatSession, api_key: str):
+        """Summaries run in the owner process, which holds the authoritative turns"""
+        self.client.call("chat.schedule_summary", session_id=session.id, api_key=api_key)
@@ -0,0 +1,207 @@
+"""
+Metadata Index for the Deep Scribe Knowledge Base
+SQLite side-table that resolves metadata filters to candidate document IDs
+"""
+
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class FilterError(ValueError):
+    """Raised when a metadata filter is malformed"""
+
+
+class MetadataIndex:
+    """
+    Lightweight secondary index over knowledge base metadata.
+
+    Filters use the same syntax as ChromaDB ``where`` clauses::
+
+        {"$and": [
+            {"research_id": {"$in": ["r1", "r2"]}},
+            {"ingested_at": {"$gte": 1735689600}}
+        ]}
+
+    so a filter can always be handed to Chroma unchanged when the index
+    cannot answer it (e.g. it references a field that is not indexed).
+    """
+
+    INDEXED_FIELDS = (
+        "doc_id", "doc_type", "source", "research_id", "main_topic", "title",
+        "ingested_at", "updated_at",
+    )
+    NUMERIC_FIELDS = ("ingested_at", "updated_at")
+    LOGICAL_OPERATORS = ("$and", "$or")
+    COMPARISON_OPERATORS = {
+        "$eq": "=",
+        "$ne": "!=",
+        "$gt": ">",
+        "$gte": ">=",
+        "$lt": "<",
+        "$lte": "<=",
+    }
+    SET_OPERATORS = {"$in": "IN", "$nin": "NOT IN"}
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        columns = ", ".join(
+            f"{field} REAL" if field in self.NUMERIC_FIELDS else f"{field} TEXT"
+            for field in self.INDEXED_FIELDS
+        )
+        with self._lock, self._conn:
+            existing = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+            if existing and existing != ["id", *self.INDEXED_FIELDS]:
+                # The index is derived data: drop it on schema change so the
+                # knowledge base rebuilds it from the collection
+                self._conn.execute("DROP TABLE documents")
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, {columns})")
+            for field in self.INDEXED_FIELDS:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_documents_{field} ON documents ({field})"
+                )
+
+    # --- Writes ---
+
+    def _row(self, doc_id: str, metadata: Dict[str, Any]) -> Tuple[Any, ...]:
+        return (doc_id, *(metadata.get(field) for field in self.INDEXED_FIELDS))
+
+    def upsert(self, entries: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Insert or replace the indexed metadata for (id, metadata) pairs"""
+        rows = [self._row(doc_id, metadata or {}) for doc_id, metadata in entries]
+        if not rows:
+            return
+        placeholders = ", ".join("?" for _ in range(len(self.INDEXED_FIELDS) + 1))
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT OR REPLACE INTO documents VALUES ({placeholders})", rows)
+
+    def delete(self, doc_ids: Iterable[str]):
+        """Remove documents from the index"""
+        rows = [(doc_id,) for doc_id in doc_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM documents WHERE id = ?", rows)
+
+    def clear(self):
+        """Remove every entry from the index"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    # --- Reads ---
+
+    def can_resolve(self, where: Optional[Dict[str, Any]]) -> bool:
+        """Whether every field referenced by ``where`` is indexed"""
+        if not where:
+            return True
+        return all(field in self.INDEXED_FIELDS for field in self.referenced_fields(where))
+
+    def referenced_fields(self, where: Dict[str, Any]) -> List[str]:
+        """List the metadata fields a filter refers to"""
+        fields = []
+        for key, value in where.items():
+            if key in self.LOGICAL_OPERATORS:
+                for clause in value:
+                    fields.extend(self.referenced_fields(clause))
+            else:
+                fields.append(key)
+        return fields
+
+    def count_matching(self, where: Optional[Dict[str, Any]]) -> int:
+        """Number of documents matching an indexable filter"""
+        clause, params = self.compile(where)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM documents WHERE {clause}", params
+            ).fetchone()[0]
+
+    def resolve(self, where: Optional[Dict[str, Any]], limit: Optional[int] = None) -> List[str]:
+        """
+        Resolve a filter to matching document IDs, newest first
+
+        Args:
+            where: Chroma-style filter over indexed fields
+            limit: Maximum number of IDs to return (optional)
+
+        Returns:
+            List of matching document IDs
+        """
+        clause, params = self.compile(where)
+        sql = f"SELECT id FROM documents WHERE {clause} ORDER BY ingested_at DESC, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = [*params, int(limit)]
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+    # --- Filter compilation ---
+
+    def compile(self, where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        """Compile a Chroma-style filter into a SQL WHERE clause and parameters"""
+        if not where:
+            return "1 = 1", []
+        if not isinstance(where, dict):
+            raise FilterError("Filter must be an object")
+        if len(where) != 1:
+            # Chroma only accepts one key per filter object; fields are combined with $and
+            raise FilterError(f"Filter must have exactly one key, got {len(where)}: use $and to combine fields")
+
+        clauses, params = [], []
+        for key, value in where.items():
+            if key in self.LOGICAL_OPERATORS:
+                if not isinstance(value, list) or not value:
+                    raise FilterError(f"{key} expects a non-empty list of filters")
+                parts = [self.compile(sub) for sub in value]
+                joiner = " AND " if key == "$and" else " OR "
+                clauses.append("(" + joiner.join(part for part, _ in parts) + ")")
+                for _, sub_params in parts:
+                    params.extend(sub_params)
+            elif key.startswith("$"):
+                raise FilterError(f"Unsupported operator at top level: {key}")
+            else:
+                clause, field_params = self._compile_field(key, value)
+                clauses.append(clause)
+                params.extend(field_params)
+
+        return " AND ".join(clauses), params
+
+    def _compile_field(self, field: str, condition: Any) -> Tuple[str, List[Any]]:
+        if field not in self.INDEXED_FIELDS:
+            raise FilterError(f"Field is not indexed: {field}")
+
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if len(condition) != 1:
+            # Same rule (and message) as Chroma; combine ranges with $and
+            raise FilterError(f"Expected operator expression to have exactly one operator, got {condition}")
+
+        clauses, params = [], []
+        for op, operand in condition.items():
+            if op in self.COMPARISON_OPERATORS:
+                if op == "$ne":
+                    # SQL's != never matches NULL, but a missing field is "not equal"
+                    clauses.append(f"({field} IS NULL OR {field} != ?)")
+                else:
+                    clauses.append(f"{field} {self.COMPARISON_OPERATORS[op]} ?")
+                params.append(operand)
+            elif op in self.SET_OPERATORS:
+                if not isinstance(operand, list) or not operand:
+                    raise FilterError(f"{op} expects a non-empty list")
+                marks = ", ".join("?" for _ in operand)
+                if op == "$nin":
+                    clauses.append(f"({field} IS NULL OR {field} NOT IN ({marks}))")
+                else:
+                    clauses.append(f"{field} IN ({marks})")
+                params.extend(operand)
+            else:
+                raise FilterError(f"Unsupported operator for {field}: {op}")
+
+        return "(" + " AND ".join(clauses) + ")", params
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,419 @@
+"""
+Related Notes for the Deep Scribe Knowledge Base
+Exact k-nearest-neighbour graph over stored embeddings
+
+Every record keeps its NEIGHBORS most similar records (cosine similarity),
+skipping chunks of its own document. Adding records scores them against the
+whole collection and merges them into existing neighbour lists; deleting
+records recomputes only the lists that pointed at them. All scoring runs as
+blocked matrix products, so "related notes" lookups are a row read and never
+need an embedding call.
+
+The graph keeps its own normalised float32 copy of every embedding (about
+3 KB per record at 768 dimensions) so merges never round-trip through
+Chroma; a full rebuild holds a second copy until it is swapped in.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import logger
+from utils.snapshots import SnapshotWriter
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class _Graph:
+    """
+    Arrays of one kNN graph
+
+    Rows are records; free rows (deleted records) are reused before the
+    arrays grow. RelatedNotesGraph guards an instance with its lock and
+    replaces it wholesale when a rebuild finishes.
+    """
+
+    def __init__(self, k: int, batch_rows: int, dims: int = 0, capacity: int = 0):
+        self.k = k
+        # Rows scored per matrix product; bounds memory at batch_rows x collection size
+        self.batch_rows = batch_rows
+        self.reset(dims, capacity)
+
+    def reset(self, dims: int = 0, capacity: int = 0):
+        self.vectors = np.zeros((capacity, dims), dtype=np.float32)
+        self.neighbors = np.full((capacity, self.k), -1, dtype=np.int64)
+        self.scores = np.full((capacity, self.k), -np.inf, dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.parent_codes = np.full(capacity, -1, dtype=np.int64)
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.parents: List[Optional[str]] = [None] * capacity
+        self.size = 0
+        self.free: List[int] = []
+        self.rows: Dict[str, int] = {}
+        self.rows_by_parent: Dict[str, set] = {}
+        self.parent_code_of: Dict[str, int] = {}
+
+    def register(self, row: int, doc_id: str, parent: str):
+        code = self.parent_code_of.setdefault(parent, len(self.parent_code_of))
+        self.ids[row] = doc_id
+        self.parents[row] = parent
+        self.parent_codes[row] = code
+        self.alive[row] = True
+        self.rows[doc_id] = row
+        self.rows_by_parent.setdefault(parent, set()).add(row)
+
+    def allocate(self, count: int) -> np.ndarray:
+        """Rows for new records: freed rows first, then the end (growing geometrically)"""
+        reused = [self.free.pop() for _ in range(min(count, len(self.free)))]
+        extra = count - len(reused)
+        if self.size + extra > len(self.alive):
+            capacity = max(self.size + extra, 2 * len(self.alive), 64)
+            grow = capacity - len(self.alive)
+            self.vectors = np.vstack([self.vectors, np.zeros((grow, self.vectors.shape[1]), np.float32)])
+            self.neighbors = np.vstack([self.neighbors, np.full((grow, self.k), -1, np.int64)])
+            self.scores = np.vstack([self.scores, np.full((grow, self.k), -np.inf, np.float32)])
+            self.alive = np.concatenate([self.alive, np.zeros(grow, bool)])
+            self.parent_codes = np.concatenate([self.parent_codes, np.full(grow, -1, np.int64)])
+            self.ids.extend([None] * grow)
+            self.parents.extend([None] * grow)
+        rows = reused + list(range(self.size, self.size + extra))
+        self.size += extra
+        return np.asarray(rows, dtype=np.int64)
+
+    def compacted(self) -> Dict[str, np.ndarray]:
+        """Copy of the live rows with neighbour indices remapped, as persisted"""
+        rows = np.flatnonzero(self.alive[:self.size])
+        remap = np.full(self.size + 1, -1, dtype=np.int64)
+        remap[rows] = np.arange(len(rows))
+        neighbors = self.neighbors[rows]
+        return {
+            "ids": np.asarray([self.ids[row] for row in rows], dtype=str),
+            "parents": np.asarray([self.parents[row] for row in rows], dtype=str),
+            "vectors": self.vectors[rows],
+            "neighbors": np.where(neighbors >= 0, remap[neighbors], -1),
+            "scores": self.scores[rows],
+        }
+
+    # --- Scoring ---
+
+    def _similarities(self, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        """Cosine similarity of rows x columns with same-document pairs masked out"""
+        similarity = self.vectors[rows] @ self.vectors[columns].T
+        same_document = self.parent_codes[rows][:, None] == self.parent_codes[columns][None, :]
+        similarity[same_document] = -np.inf
+        return similarity
+
+    def _top_k(self, indices: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Best k of each row of (indices, scores), sorted by score"""
+        k = min(self.k, scores.shape[1])
+        if k < scores.shape[1]:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            indices = np.take_along_axis(indices, part, axis=1)
+            scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        indices = np.take_along_axis(indices, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        indices = np.where(np.isfinite(scores), indices, -1)
+
+        top_indices = np.full((len(indices), self.k), -1, dtype=np.int64)
+        top_scores = np.full((len(indices), self.k), -np.inf, dtype=np.float32)
+        top_indices[:, :k] = indices
+        top_scores[:, :k] = scores
+        return top_indices, top_scores
+
+    def _recompute(self, rows: np.ndarray):
+        """Neighbour lists of rows from scratch against every live record"""
+        columns = np.flatnonzero(self.alive[:self.size])
+        for start in range(0, len(rows), self.batch_rows):
+            block = rows[start:start + self.batch_rows]
+            similarity = self._similarities(block, columns)
+            candidates = np.broadcast_to(columns, similarity.shape)
+            self.neighbors[block], self.scores[block] = self._top_k(candidates, similarity)
+
+    def _merge(self, rows: np.ndarray, new_rows: np.ndarray):
+        """Fold new_rows into the existing neighbour lists of rows"""
+        for start in range(0, len(rows), self.batch_rows):
+            block = rows[start:start + self.batch_rows]
+            similarity = self._similarities(block, new_rows)
+            candidates = np.hstack([self.neighbors[block], np.broadcast_to(new_rows, similarity.shape)])
+            scores = np.hstack([self.scores[block], similarity])
+            self.neighbors[block], self.scores[block] = self._top_k(candidates, scores)
+
+    # --- Updates ---
+
+    def add(self, ids: List[str], vectors: np.ndarray, parents: List[str], skip_existing: bool = False):
+        if self.vectors.shape[1] != vectors.shape[1]:
+            if self.rows:
+                logger.warning("Embedding dimensions changed; rebuilding related notes graph from new records")
+            self.reset(vectors.shape[1])
+
+        unique = {}
+        for position, doc_id in enumerate(ids):
+            unique[doc_id] = position
+        if skip_existing:
+            unique = {doc_id: p for doc_id, p in unique.items() if doc_id not in self.rows}
+        else:
+            replaced = [doc_id for doc_id in unique if doc_id in self.rows]
+            if replaced:
+                self.remove(replaced)
+        if not unique:
+            return
+
+        positions = list(unique.values())
+        existing = np.flatnonzero(self.alive[:self.size])
+        new_rows = self.allocate(len(positions))
+        self.vectors[new_rows] = vectors[positions]
+        for row, position in zip(new_rows, positions):
+            self.register(int(row), ids[position], parents[position])
+
+        self._merge(existing, new_rows)
+        self._recompute(new_rows)
+
+    def remove(self, ids: List[str]) -> int:
+        rows = np.asarray([self.rows.pop(doc_id) for doc_id in ids if doc_id in self.rows], dtype=np.int64)
+        if not len(rows):
+            return 0
+        for row in rows.tolist():
+            parent = self.parents[row]
+            self.rows_by_parent[parent].discard(row)
+            if not self.rows_by_parent[parent]:
+                del self.rows_by_parent[parent]
+            self.ids[row] = self.parents[row] = None
+            self.free.append(row)
+        self.alive[rows] = False
+        self.vectors[rows] = 0
+        self.neighbors[rows] = -1
+        self.scores[rows] = -np.inf
+        self.parent_codes[rows] = -1
+
+        live = np.flatnonzero(self.alive[:self.size])
+        affected = live[np.isin(self.neighbors[live], rows).any(axis=1)]
+        if len(affected):
+            self._recompute(affected)
+        return len(rows)
+
+
+class RelatedNotesGraph:
+    """kNN graph kept in sync with the knowledge base"""
+
+    GRAPH_FILENAME = "related_notes.npz"
+    # Neighbours kept per record, and so the most related notes a lookup returns
+    NEIGHBORS = 10
+    # Rows scored per matrix product; bounds memory at BATCH_ROWS x collection size
+    BATCH_ROWS = 1024
+    # Incremental state is written at most this often
+    SAVE_INTERVAL = 30.0
+
+    def __init__(self, persist_directory: str, record_source: Callable[..., Iterable[Dict[str, Any]]]):
+        """
+        Args:
+            persist_directory: Where the graph is stored
+            record_source: Callable yielding collection batches with ids,
+                embeddings and metadatas (KnowledgeBaseService.iter_records)
+        """
+        self.persist_directory = persist_directory
+        self.record_source = record_source
+        self._lock = threading.RLock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+        # Changes made while a rebuild is streaming the collection, replayed after it
+        self._rebuild_log: Optional[List[tuple]] = None
+        # Bumped by reset(), so a rebuild that started before it is discarded
+        self._generation = 0
+        self._last_save = 0.0
+        self._writer = SnapshotWriter(self._write_graph, name="related-save")
+        self._graph = self._new_graph()
+        self._load()
+
+    # --- State ---
+
+    def _new_graph(self, dims: int = 0, capacity: int = 0) -> _Graph:
+        return _Graph(self.NEIGHBORS, self.BATCH_ROWS, dims, capacity)
+
+    def _load(self):
+        path = os.path.join(self.persist_directory, self.GRAPH_FILENAME)
+        if not os.path.exists(path):
+            return
+        try:
+            with np.load(path) as data:
+                ids = data["ids"].tolist()
+                parents = data["parents"].tolist()
+                graph = self._new_graph(data["vectors"].shape[1], len(ids))
+                graph.vectors[:] = data["vectors"]
+                graph.neighbors[:] = data["neighbors"]
+                graph.scores[:] = data["scores"]
+            for row, (doc_id, parent) in enumerate(zip(ids, parents)):
+                graph.register(row, doc_id, parent)
+            graph.size = len(ids)
+            self._graph = graph
+        except Exception as e:
+            logger.warning(f"Discarding unreadable related notes graph: {e}")
+
+    def _take_graph(self):
+        """Copy a compacted graph (free rows dropped, indices remapped); call with the lock held"""
+        self._last_save = time.monotonic()
+        return self._writer.take(self._graph.compacted())
+
+    def _take_graph_if_due(self):
+        if time.monotonic() - self._last_save >= self.SAVE_INTERVAL:
+            return self._take_graph()
+        return None
+
+    def _write_graph(self, graph: Dict[str, np.ndarray]):
+        path = os.path.join(self.persist_directory, self.GRAPH_FILENAME)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, **graph)
+        os.replace(f"{path}.tmp", path)
+
+    def flush(self):
+        """Persist any unsaved incremental changes"""
+        with self._lock:
+            taken = self._take_graph()
+        self._writer.write(taken)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._graph.rows)
+
+    # --- Incremental updates ---
+
+    def add(self, ids: List[str], embeddings: Iterable[Iterable[float]], parents: Optional[List[str]] = None):
+        """
+        Insert records into the graph
+
+        Args:
+            ids: Record IDs (chunk IDs for upserted documents)
+            embeddings: Stored embeddings of the records
+            parents: Document each record belongs to; records of the same
+                document are never each other's neighbours
+        """
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        parents = list(parents) if parents is not None else list(ids)
+        with self._lock:
+            if self._rebuild_log is not None:
+                self._rebuild_log.append(("add", list(ids), vectors, parents))
+            self._graph.add(list(ids), vectors, parents)
+            taken = self._take_graph_if_due()
+        if taken is not None:
+            self._writer.write(taken, background=True)
+
+    def remove(self, ids: Iterable[str]):
+        """Drop records and repair the neighbour lists that pointed at them"""
+        ids = list(ids)
+        with self._lock:
+            if self._rebuild_log is not None:
+                self._rebuild_log.append(("remove", ids))
+            if not self._graph.remove(ids):
+                return
+            taken = self._take_graph_if_due()
+        if taken is not None:
+            self._writer.write(taken, background=True)
+
+    def reset(self):
+        """Forget the whole graph (the knowledge base was cleared)"""
+        with self._lock:
+            self._graph = self._new_graph()
+            self._generation += 1
+            taken = self._take_graph()
+        self._writer.write(taken)
+
+    # --- Full rebuild ---
+
+    def maybe_rebuild(self) -> bool:
+        """Start a background rebuild unless one is running; returns whether one started"""
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return False
+            self._rebuild_thread = threading.Thread(target=self.rebuild, name="related-rebuild", daemon=True)
+            self._rebuild_thread.start()
+            return True
+
+    def rebuild(self):
+        """
+        Recompute the graph by streaming the collection into a staging graph
+
+        The live graph keeps serving lookups meanwhile; changes made during
+        the rebuild are replayed onto the staging graph before it is swapped in.
+        """
+        try:
+            started = time.time()
+            with self._lock:
+                self._rebuild_log = []
+                generation = self._generation
+
+            staging = self._new_graph()
+            for batch in self.record_source():
+                vectors = _normalize(np.asarray(batch['embeddings'], dtype=np.float32))
+                parents = [(metadata or {}).get("doc_id", doc_id)
+                           for doc_id, metadata in zip(batch['ids'], batch['metadatas'])]
+                staging.add(list(batch['ids']), vectors, parents, skip_existing=True)
+
+            with self._lock:
+                log, self._rebuild_log = self._rebuild_log, None
+                if self._generation != generation:
+                    # The knowledge base was cleared while this rebuild was running
+                    logger.info("Discarded related notes rebuild superseded by a reset")
+                    return
+                for entry in log:
+                    if entry[0] == "add":
+                        staging.add(*entry[1:])
+                    else:
+                        staging.remove(entry[1])
+                self._graph = staging
+                taken = self._take_graph()
+            self._writer.write(taken)
+            logger.info(f"Rebuilt related notes graph over {self.count()} records in {time.time() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Related notes rebuild failed: {e}")
+            with self._lock:
+                self._rebuild_log = None
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None):
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # --- Lookups ---
+
+    def related(self, doc_id: str, n_results: int = 5) -> Optional[List[Tuple[str, str, float]]]:
+        """
+        Nearest other documents of a record or of every chunk of a document
+
+        Args:
+            doc_id: Record ID, or document ID of a chunked document
+            n_results: Number of documents to return, at most NEIGHBORS
+
+        Returns:
+            (document ID, best matching record ID, similarity) tuples, best
+            first, or None if the ID is not in the graph
+        """
+        n_results = min(n_results, self.NEIGHBORS)
+        with self._lock:
+            graph = self._graph
+            if doc_id in graph.rows:
+                rows = [graph.rows[doc_id]]
+                own = graph.parents[rows[0]]
+            elif doc_id in graph.rows_by_parent:
+                rows = list(graph.rows_by_parent[doc_id])
+                own = doc_id
+            else:
+                return None
+
+            best: Dict[str, Tuple[str, float]] = {}
+            for row in rows:
+                for neighbor, score in zip(graph.neighbors[row].tolist(), graph.scores[row].tolist()):
+                    if neighbor < 0:
+                        break
+                    parent = graph.parents[neighbor]
+                    if parent != own and (parent not in best or score > best[parent][1]):
+                        best[parent] = (graph.ids[neighbor], score)
+
+        ranked = sorted(best.items(), key=lambda item: -item[1][1])[:n_results]
+        return [(parent, record_id, score) for parent, (record_id, score) in ranked]
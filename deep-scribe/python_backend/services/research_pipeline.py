@@ -0,0 +1,322 @@
+"""
+Research Pipeline for Deep Scribe
+Runs the source survey -> grounded hypothesis research -> KB ingestion DAG server-side
+
+    survey ──┬── hypothesis 0: search ─> analysis ──┐
+             ├── hypothesis 1: search ─> analysis ──┼── ingest
+             └── hypothesis N: search ─> analysis ──┘
+
+Hypotheses are researched concurrently (bounded by a semaphore), progress is
+reported as a stream of events, and every stage's output is checkpointed to
+disk so a re-run with the same run_id resumes where the last one stopped.
+"""
+
+import asyncio
+import json
+import os
+import re
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services.google_search import GoogleSearchService
+from services.scheduler import RESEARCH, prioritized
+from utils.logger import logger
+
+
+class ResearchPipeline:
+    """Orchestrates a full research run against Gemini, Google Search and the KB"""
+
+    SURVEY_PROMPT = """You are a Senior Research Analyst.
+Topic: "{topic}"
+
+Goal: Conduct a preliminary survey of this topic and propose up to {max_hypotheses} distinct
+hypotheses or research questions worth investigating.
+
+Output ONLY valid JSON in this format:
+{{
+    "summary": "Two sentence overview of the topic",
+    "hypotheses": [
+        {{ "title": "Short title", "question": "The specific question to investigate" }}
+    ]
+}}
+"""
+
+    ANALYSIS_PROMPT = """You are a Senior Research Analyst investigating the topic "{topic}".
+
+## Hypothesis
+{title}: {question}
+
+## Web Sources
+{sources}
+
+## Instructions:
+- Assess the hypothesis using the sources above and your own knowledge
+- Cite sources by title when you rely on them
+- Finish with a one line verdict: Supported, Refuted or Inconclusive
+"""
+
+    def __init__(
+        self,
+        router,
+        kb_service,
+        runs_directory: Optional[str] = None,
+        search_service_factory=GoogleSearchService
+    ):
+        if runs_directory is None:
+            home = os.path.expanduser("~")
+            runs_directory = os.path.join(home, ".deep-scribe", "research_runs")
+        self.router = router
+        self.kb_service = kb_service
+        self.runs_directory = runs_directory
+        self.search_service_factory = search_service_factory
+
+    # --- Checkpoints ---
+
+    def _run_dir(self, run_id: str) -> str:
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", run_id):
+            raise ValueError(f"Invalid run_id: {run_id}")
+        path = os.path.join(self.runs_directory, run_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _load_stage(self, run_id: str, stage: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._run_dir(run_id), f"{stage}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_stage(self, run_id: str, stage: str, output: Dict[str, Any]):
+        path = os.path.join(self._run_dir(run_id), f"{stage}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(output, f)
+        os.replace(tmp_path, path)
+
+    # --- Stages ---
+
+    @staticmethod
+    def _parse_json(text: str) -> Dict[str, Any]:
+        """Parse a JSON object out of a model response, tolerating code fences"""
+        match = re.search(r"\{.*\}", text or "", re.DOTALL)
+        if not match:
+            raise ValueError("Model response did not contain JSON")
+        return json.loads(match.group(0))
+
+    async def _survey(self, topic: str, model: str, api_key: str, max_hypotheses: int) -> Dict[str, Any]:
+        result = await asyncio.to_thread(
+            prioritized(RESEARCH, self.router.generate),
+            model=model,
+            prompt=self.SURVEY_PROMPT.format(topic=topic, max_hypotheses=max_hypotheses),
+            api_key=api_key
+        )
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Survey generation failed"))
+
+        parsed = self._parse_json(result.get("content", ""))
+        hypotheses = [
+            {"title": h.get("title", f"Hypothesis {i + 1}"), "question": h.get("question", "")}
+            for i, h in enumerate(parsed.get("hypotheses", [])[:max_hypotheses])
+        ]
+        if not hypotheses:
+            raise ValueError("Survey produced no hypotheses")
+        return {"summary": parsed.get("summary", ""), "hypotheses": hypotheses}
+
+    async def _research_hypothesis(
+        self,
+        topic: str,
+        hypothesis: Dict[str, str],
+        model: str,
+        api_key: str,
+        search_service: Optional[GoogleSearchService],
+        num_results: int
+    ) -> Dict[str, Any]:
+        sources = []
+        if search_service is not None:
+            search = await asyncio.to_thread(
+                prioritized(RESEARCH, search_service.search), f"{topic} {hypothesis['question']}", num_results
+            )
+            if search.get("success"):
+                sources = search.get("results", [])
+            else:
+                logger.warning(f"Grounding search failed: {search.get('error')}")
+
+        source_text = "\n".join(
+            f"- {s.get('title')} ({s.get('link')}): {s.get('snippet')}" for s in sources
+        ) or "No web sources available."
+
+        analysis = await asyncio.to_thread(
+            prioritized(RESEARCH, self.router.generate),
+            model=model,
+            prompt=self.ANALYSIS_PROMPT.format(
+                topic=topic,
+                title=hypothesis["title"],
+                question=hypothesis["question"],
+                sources=source_text
+            ),
+            api_key=api_key
+        )
+        if not analysis.get("success"):
+            raise RuntimeError(analysis.get("error", "Analysis generation failed"))
+
+        return {
+            "hypothesis": hypothesis,
+            "sources": sources,
+            "analysis": analysis.get("content", ""),
+            "model": analysis.get("model", model),
+            "quills_deducted": analysis.get("quills_deducted", 0)
+        }
+
+    def _ingest(self, topic: str, run_id: str, findings: List[Dict[str, Any]], api_key: str) -> Dict[str, Any]:
+        records = []
+        for finding in findings:
+            sources = "\n".join(f"- {s.get('title')}: {s.get('link')}" for s in finding["sources"])
+            content = finding["analysis"] + (f"\n\nSources:\n{sources}" if sources else "")
+            records.append({
+                "content": content,
+                "source": f"research:{run_id}",
+                "title": f"{topic} - {finding['hypothesis']['title']}",
+                "doc_type": "research_finding",
+                "metadata": {
+                    "main_topic": topic,
+                    "subtopic": finding["hypothesis"]["title"],
+                    "research_id": run_id
+                }
+            })
+        return self.kb_service.add_documents(records, api_key=api_key)
+
+    # --- Orchestration ---
+
+    async def run(
+        self,
+        topic: str,
+        api_key: str,
+        run_id: Optional[str] = None,
+        model: str = "gemini-2.5-flash",
+        max_hypotheses: int = 5,
+        max_concurrency: int = 4,
+        search_api_key: Optional[str] = None,
+        search_engine_id: Optional[str] = None,
+        num_results: int = 5,
+        ingest: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Execute the pipeline, yielding progress events as they happen
+
+        Args:
+            topic: Research topic
+            api_key: Gemini API key
+            run_id: Existing run to resume, or None to start a new one
+            model: Gemini model for the survey and analyses
+            max_hypotheses: Maximum number of hypotheses to research
+            max_concurrency: Maximum number of hypotheses researched at once
+            search_api_key: Google Custom Search key (grounding is skipped without it)
+            search_engine_id: Google Custom Search engine ID (CX)
+            num_results: Search results per hypothesis
+            ingest: Whether to add the findings to the knowledge base
+
+        Yields:
+            Event dicts: {"event": "stage", "stage", "status", ...}, then a final
+            {"event": "done", ...} or {"event": "error", ...}
+        """
+        run_id = run_id or uuid.uuid4().hex
+        yield {"event": "run", "run_id": run_id, "topic": topic}
+
+        try:
+            # Stage 1: source survey
+            survey = self._load_stage(run_id, "survey")
+            if survey is not None:
+                yield {"event": "stage", "stage": "survey", "status": "cached"}
+            else:
+                yield {"event": "stage", "stage": "survey", "status": "started"}
+                survey = await self._survey(topic, model, api_key, max_hypotheses)
+                self._save_stage(run_id, "survey", survey)
+                yield {"event": "stage", "stage": "survey", "status": "completed",
+                       "hypotheses": survey["hypotheses"]}
+
+            # Stage 2: concurrent grounded research per hypothesis
+            search_service = None
+            if search_api_key and search_engine_id:
+                search_service = self.search_service_factory()
+                search_service.configure(search_api_key, search_engine_id)
+
+            hypotheses = survey["hypotheses"]
+            findings: List[Optional[Dict[str, Any]]] = [None] * len(hypotheses)
+            events: asyncio.Queue = asyncio.Queue()
+            semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+            async def research(index: int, hypothesis: Dict[str, str]):
+                stage = f"hypothesis-{index}"
+                cached = self._load_stage(run_id, stage)
+                if cached is not None:
+                    findings[index] = cached
+                    await events.put({"event": "stage", "stage": stage, "status": "cached"})
+                    return
+                async with semaphore:
+                    await events.put({"event": "stage", "stage": stage, "status": "started",
+                                      "hypothesis": hypothesis})
+                    try:
+                        finding = await self._research_hypothesis(
+                            topic, hypothesis, model, api_key, search_service, num_results
+                        )
+                    except Exception as e:
+                        logger.error(f"Research stage {stage} failed: {e}")
+                        await events.put({"event": "stage", "stage": stage, "status": "failed",
+                                          "error": str(e)})
+                        return
+                    self._save_stage(run_id, stage, finding)
+                    findings[index] = finding
+                    await events.put({"event": "stage", "stage": stage, "status": "completed",
+                                      "sources": len(finding["sources"])})
+
+            tasks = [asyncio.create_task(research(i, h)) for i, h in enumerate(hypotheses)]
+            done = asyncio.gather(*tasks, return_exceptions=True)
+            getter = None
+            try:
+                while not (done.done() and events.empty()):
+                    getter = asyncio.ensure_future(events.get())
+                    await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+                    if getter.done():
+                        yield getter.result()
+                    else:
+                        getter.cancel()
+            finally:
+                # If the consumer went away mid-stage, stop researching on its behalf
+                if getter is not None:
+                    getter.cancel()
+                for task in tasks:
+                    task.cancel()
+                await done
+
+            completed = [f for f in findings if f is not None]
+            failed = len(findings) - len(completed)
+
+            # Stage 3: batch ingestion into the knowledge base
+            ingest_result = None
+            if ingest and completed and not failed:
+                ingest_result = self._load_stage(run_id, "ingest")
+                if ingest_result is not None:
+                    yield {"event": "stage", "stage": "ingest", "status": "cached"}
+                else:
+                    yield {"event": "stage", "stage": "ingest", "status": "started"}
+                    ingest_result = await asyncio.to_thread(prioritized(RESEARCH, self._ingest), topic, run_id, completed, api_key)
+                    if not ingest_result.get("success"):
+                        raise RuntimeError(ingest_result.get("error", "Ingestion failed"))
+                    self._save_stage(run_id, "ingest", ingest_result)
+                    yield {"event": "stage", "stage": "ingest", "status": "completed",
+                           "documents": len(ingest_result.get("ids", []))}
+
+            yield {
+                "event": "done",
+                "run_id": run_id,
+                "success": failed == 0,
+                "summary": survey.get("summary", ""),
+                "findings": completed,
+                "failed": failed,
+                "ingested": ingest_result.get("ids", []) if ingest_result else [],
+                "resumable": failed > 0
+            }
+
+        except Exception as e:
+            logger.error(f"Research run {run_id} failed: {e}")
+            yield {"event": "error", "run_id": run_id, "error": str(e), "resumable": True}
@@ -0,0 +1,289 @@
+"""
+Upstream Scheduler for Deep Scribe
+Central admission control for every outbound Gemini / Google call
+
+Each call names an endpoint (e.g. "gemini.embed") and the API key it uses.
+It must take a token from two buckets: one for the key as a whole and one
+for the (key, endpoint) pair. Waiters are served by priority class, then in
+arrival order:
+
+    INTERACTIVE  chat, direct generation, queries
+    RESEARCH     research pipeline fan-out
+    BACKGROUND   KB ingestion, summaries
+
+Lower classes may not drain a bucket below a reserved headroom, so bulk
+ingestion can never use up the quota a chat message needs. Each class has a
+bounded queue; when it is full callers are rejected immediately (backpressure).
+
+With several worker processes (main.py --workers) only the knowledge base
+owner process holds buckets: the workers' schedulers delegate every acquire
+to it over IPC, so quotas and priority classes hold across all processes.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+INTERACTIVE = 0
+RESEARCH = 1
+BACKGROUND = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", RESEARCH: "research", BACKGROUND: "background"}
+
+# Requests per minute for each (key, endpoint) bucket
+ENDPOINT_LIMITS = {
+    "gemini.generate": 60,
+    "gemini.embed": 1500,
+    "google.search": 100,
+    "google.books": 100,
+}
+DEFAULT_ENDPOINT_LIMIT = 60
+# Requests per minute for each key across all endpoints
+KEY_LIMIT = 2000
+
+# Fraction of a bucket each class must leave untouched
+RESERVED_HEADROOM = {INTERACTIVE: 0.0, RESEARCH: 0.1, BACKGROUND: 0.25}
+MAX_QUEUE = {INTERACTIVE: 64, RESEARCH: 128, BACKGROUND: 256}
+MAX_WAIT = {INTERACTIVE: 30.0, RESEARCH: 120.0, BACKGROUND: 300.0}
+
+_current_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class SchedulerBusy(Exception):
+    """Raised when a priority class's queue is full or the wait exceeded its limit"""
+
+    code = 429
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+
+@contextlib.contextmanager
+def priority_scope(priority: int):
+    """Schedule upstream calls made inside the block at the given priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def prioritized(priority: int, fn: Callable) -> Callable:
+    """Wrap fn so upstream calls it makes are scheduled at the given priority"""
+    def wrapper(*args, **kwargs):
+        with priority_scope(priority):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 6.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, headroom: float) -> bool:
+        return self.tokens - 1 >= self.capacity * headroom - 1e-9
+
+    def time_until_available(self, headroom: float) -> float:
+        missing = self.capacity * headroom + 1 - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else 1.0
+
+
+class _ClassMetrics:
+    def __init__(self):
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_ewma = 0.0
+        self.wait_max = 0.0
+        self._recent_waits = deque(maxlen=200)
+
+    def record_wait(self, wait: float):
+        self.admitted += 1
+        self.wait_ewma = 0.2 * wait + 0.8 * self.wait_ewma
+        self.wait_max = max(self.wait_max, wait)
+        self._recent_waits.append(wait)
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self._recent_waits)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else 0.0
+        return {
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ewma_ms": round(self.wait_ewma * 1000, 1),
+            "wait_p95_ms": round(p95 * 1000, 1),
+            "wait_max_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class UpstreamScheduler:
+    """Priority-aware, quota-aware gate in front of all upstream calls"""
+
+    def __init__(
+        self,
+        endpoint_limits: Optional[Dict[str, float]] = None,
+        key_limit: float = KEY_LIMIT,
+        max_queue: Optional[Dict[int, int]] = None,
+        max_wait: Optional[Dict[int, float]] = None
+    ):
+        self.endpoint_limits = {**ENDPOINT_LIMITS, **(endpoint_limits or {})}
+        self.key_limit = key_limit
+        self.max_queue = {**MAX_QUEUE, **(max_queue or {})}
+        self.max_wait = {**MAX_WAIT, **(max_wait or {})}
+        # Scheduler in another process admitting on this one's behalf (see delegate_to)
+        self._remote = None
+        self._buckets: Dict[Tuple[str, ...], TokenBucket] = {}
+        self._waiters: Dict[int, Tuple[int, int, Tuple[Tuple[str, ...], ...]]] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._metrics = {priority: _ClassMetrics() for priority in PRIORITY_NAMES}
+
+    @staticmethod
+    def _key_id(api_key: Optional[str]) -> str:
+        return hashlib.sha256((api_key or "").encode()).hexdigest()[:8]
+
+    def _bucket_names(self, endpoint: str, api_key: Optional[str]) -> Tuple[Tuple[str, ...], ...]:
+        key_id = self._key_id(api_key)
+        return (("key", key_id), ("endpoint", key_id, endpoint))
+
+    def _bucket(self, name: Tuple[str, ...]) -> TokenBucket:
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            if name[0] == "key":
+                rate = self.key_limit
+            else:
+                base = name[2].split(":", 1)[0]
+                rate = self.endpoint_limits.get(base, DEFAULT_ENDPOINT_LIMIT)
+            bucket = self._buckets[name] = TokenBucket(rate)
+        return bucket
+
+    def delegate_to(self, remote):
+        """
+        Admit every call through another scheduler instead of local buckets
+
+        Args:
+            remote: Object with this class's acquire(endpoint, api_key,
+                priority, max_wait) and get_metrics(), usually
+                kb_ipc.RemoteScheduler for the owner process's scheduler
+        """
+        self._remote = remote
+
+    def _is_next(self, ticket: int) -> bool:
+        """
+        Whether higher-ranked waiters leave room for this one
+
+        Every shared bucket must keep one token per higher-ranked waiter, so
+        a waiter stalled on some other bucket does not block the rest of the
+        queue, yet it is never overtaken on the buckets it is waiting for.
+        """
+        priority, sequence, names = self._waiters[ticket]
+        ahead: Dict[Tuple[str, ...], int] = {}
+        for other, (other_priority, other_sequence, other_names) in self._waiters.items():
+            if other != ticket and (other_priority, other_sequence) < (priority, sequence):
+                for name in set(names) & set(other_names):
+                    ahead[name] = ahead.get(name, 0) + 1
+        return all(self._bucket(name).tokens - 1 >= count for name, count in ahead.items())
+
+    def acquire(self, endpoint: str, api_key: Optional[str], priority: Optional[int] = None,
+                max_wait: Optional[float] = None):
+        """
+        Block until the call may proceed
+
+        Raises:
+            SchedulerBusy: the priority class's queue is full, or the wait
+                exceeded max_wait
+        """
+        priority = current_priority() if priority is None else priority
+        max_wait = self.max_wait[priority] if max_wait is None else max_wait
+        if self._remote is not None:
+            self._remote.acquire(endpoint, api_key, priority=priority, max_wait=max_wait)
+            return
+        headroom = RESERVED_HEADROOM[priority]
+        metrics = self._metrics[priority]
+        start = time.monotonic()
+
+        with self._condition:
+            if metrics.queued >= self.max_queue[priority]:
+                metrics.rejected += 1
+                raise SchedulerBusy(f"Upstream queue full for {PRIORITY_NAMES[priority]} requests")
+
+            names = self._bucket_names(endpoint, api_key)
+            ticket = next(self._sequence)
+            self._waiters[ticket] = (priority, ticket, names)
+            metrics.queued += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    buckets = [self._bucket(name) for name in names]
+                    for bucket in buckets:
+                        bucket.refill(now)
+
+                    if self._is_next(ticket) and all(b.available(headroom) for b in buckets):
+                        for bucket in buckets:
+                            bucket.tokens -= 1
+                        metrics.record_wait(now - start)
+                        return
+
+                    remaining = start + max_wait - now
+                    if remaining <= 0:
+                        metrics.timed_out += 1
+                        retry_after = max(b.time_until_available(headroom) for b in buckets)
+                        raise SchedulerBusy(
+                            f"Timed out waiting for {endpoint} quota", retry_after=retry_after
+                        )
+                    refill_wait = max(b.time_until_available(headroom) for b in buckets)
+                    self._condition.wait(timeout=min(remaining, max(refill_wait, 0.005)))
+            finally:
+                del self._waiters[ticket]
+                metrics.queued -= 1
+                self._condition.notify_all()
+
+    def run(self, endpoint: str, api_key: Optional[str], fn: Callable, *args,
+            priority: Optional[int] = None, max_wait: Optional[float] = None, **kwargs):
+        """Acquire a slot for endpoint, then call fn(*args, **kwargs)"""
+        self.acquire(endpoint, api_key, priority=priority, max_wait=max_wait)
+        return fn(*args, **kwargs)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth, wait times and admission counters per priority class"""
+        if self._remote is not None:
+            return self._remote.get_metrics()
+        with self._condition:
+            now = time.monotonic()
+            buckets = {}
+            for name, bucket in self._buckets.items():
+                bucket.refill(now)
+                buckets[":".join(name)] = {
+                    "tokens": round(bucket.tokens, 2),
+                    "capacity": round(bucket.capacity, 2),
+                    "rate_per_minute": round(bucket.rate * 60, 2),
+                }
+            return {
+                "classes": {PRIORITY_NAMES[p]: m.to_dict() for p, m in self._metrics.items()},
+                "queue_depth": sum(m.queued for m in self._metrics.values()),
+                "buckets": buckets,
+            }
+
+
+# Global scheduler instance shared by every upstream client
+scheduler = UpstreamScheduler()
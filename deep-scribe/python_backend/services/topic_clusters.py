@@ -0,0 +1,421 @@
+"""
+Topic Clusters for the Deep Scribe Knowledge Base
+Incrementally maintained k-means over stored embeddings, served as a topic graph
+
+New documents are folded in with a mini-batch k-means step (spherical: all
+vectors are L2-normalised and compared by cosine similarity). Deletes only
+adjust sizes and term counts; the drift both introduce is corrected by a
+full streaming rebuild in a background thread, triggered by the number of
+changes or the time since the last rebuild. Changes only mark the small
+graph snapshot (nodes, edges, sizes, labels) stale; it is recomputed on the
+next read or save, so a burst of ingests pays for it once and
+/api/kb/topics never does any clustering work itself.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.logger import logger
+from utils.snapshots import SnapshotWriter
+
+STOPWORDS = frozenset("""
+about above after again against also although among because been before being below between
+both cannot could does doing down during each either every from further have having here
+however into itself just more most much must neither other ought over same should since some
+such than that their theirs them themselves then there these they this those through under
+until upon very were what when where whether which while whom whose will with within without
+would your yours sources source http https www
+""".split())
+
+
+def extract_terms(text: str, limit: int = 20) -> List[str]:
+    """Most frequent content words of a document"""
+    words = re.findall(r"[a-z][a-z\-]{3,}", (text or "").lower())
+    counts = Counter(word for word in words if word not in STOPWORDS)
+    return [term for term, _ in counts.most_common(limit)]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class TopicClusterer:
+    """Mini-batch k-means topic model kept in sync with the knowledge base"""
+
+    STATE_FILENAME = "topic_clusters.json"
+    CENTROIDS_FILENAME = "topic_clusters.npy"
+    MAX_CLUSTERS = 24
+    LABEL_TERMS = 3
+    EDGES_PER_NODE = 2
+    REBUILD_AFTER_CHANGES = 200
+    REBUILD_INTERVAL = 6 * 60 * 60
+    REBUILD_EPOCHS = 3
+    # Incremental state is written at most this often; a lost update is
+    # corrected by the next rebuild
+    SAVE_INTERVAL = 30.0
+
+    def __init__(self, persist_directory: str, record_source: Callable[..., Iterable[Dict[str, Any]]]):
+        """
+        Args:
+            persist_directory: Where centroids and the snapshot are stored
+            record_source: Callable yielding collection batches with ids,
+                embeddings and documents (KnowledgeBaseService.iter_records)
+        """
+        self.persist_directory = persist_directory
+        self.record_source = record_source
+        self._lock = threading.RLock()
+        self._rebuild_thread: Optional[threading.Thread] = None
+        # Changes made while a rebuild is streaming the collection, replayed after it
+        self._rebuild_log: Optional[List[tuple]] = None
+        # Bumped by reset(), so a rebuild that started before it is discarded
+        self._generation = 0
+        self._last_save = 0.0
+        self._writer = SnapshotWriter(self._write_state, name="topic-save")
+        self._reset_state()
+        self._load()
+
+    # --- State ---
+
+    def _reset_state(self):
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.term_counts: List[Counter] = []
+        # doc id -> [cluster, terms]
+        self.assignments: Dict[str, List[Any]] = {}
+        self.changes_since_rebuild = 0
+        self.last_rebuild = 0.0
+        self.snapshot: Dict[str, Any] = {"nodes": [], "edges": [], "documents": 0, "computed_at": None}
+        self._snapshot_stale = False
+
+    def _load(self):
+        state_path = os.path.join(self.persist_directory, self.STATE_FILENAME)
+        centroids_path = os.path.join(self.persist_directory, self.CENTROIDS_FILENAME)
+        if not (os.path.exists(state_path) and os.path.exists(centroids_path)):
+            return
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.centroids = np.load(centroids_path).astype(np.float32)
+            self.counts = np.asarray(state["counts"], dtype=np.int64)
+            self.term_counts = [Counter(terms) for terms in state["term_counts"]]
+            self.assignments = state["assignments"]
+            self.changes_since_rebuild = state.get("changes_since_rebuild", 0)
+            self.last_rebuild = state.get("last_rebuild", 0.0)
+            self.snapshot = state["snapshot"]
+        except Exception as e:
+            logger.warning(f"Discarding unreadable topic cluster state: {e}")
+            self._reset_state()
+
+    def _take_state(self):
+        """Copy the persisted state; call with the lock held"""
+        self._last_save = time.monotonic()
+        return self._writer.take({
+            "centroids": self.centroids.copy(),
+            "counts": self.counts.tolist(),
+            "term_counts": [dict(counter) for counter in self.term_counts],
+            # Assignment entries are replaced, never mutated, so a shallow copy is enough
+            "assignments": dict(self.assignments),
+            "changes_since_rebuild": self.changes_since_rebuild,
+            "last_rebuild": self.last_rebuild,
+            "snapshot": self._current_snapshot(),
+        })
+
+    def _take_state_if_due(self):
+        if time.monotonic() - self._last_save >= self.SAVE_INTERVAL:
+            return self._take_state()
+        return None
+
+    def _write_state(self, state: Dict[str, Any]):
+        state = dict(state)
+        centroids = state.pop("centroids")
+        state_path = os.path.join(self.persist_directory, self.STATE_FILENAME)
+        centroids_path = os.path.join(self.persist_directory, self.CENTROIDS_FILENAME)
+        with open(f"{centroids_path}.tmp", "wb") as f:
+            np.save(f, centroids)
+        with open(f"{state_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(f"{centroids_path}.tmp", centroids_path)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def flush(self):
+        """Persist any unsaved incremental changes"""
+        with self._lock:
+            taken = self._take_state()
+        self._writer.write(taken)
+
+    def _target_clusters(self, documents: int) -> int:
+        if documents < 2:
+            return documents
+        return int(min(self.MAX_CLUSTERS, max(2, round(math.sqrt(documents / 2)))))
+
+    # --- Incremental updates ---
+
+    def add(self, ids: List[str], embeddings: Iterable[Iterable[float]], documents: List[str]):
+        """Fold new documents into the clusters with one mini-batch k-means step"""
+        if not ids:
+            return
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self._rebuild_log is not None:
+                self._rebuild_log.append(("add", list(ids), vectors, list(documents)))
+            self._add_locked(ids, vectors, documents)
+            self._snapshot_stale = True
+            taken = self._take_state_if_due()
+        if taken is not None:
+            self._writer.write(taken, background=True)
+        self.maybe_rebuild()
+
+    def _add_locked(self, ids: List[str], vectors: np.ndarray, documents: List[str]):
+        if self.centroids.size and self.centroids.shape[1] != vectors.shape[1]:
+            self._reset_state()
+        for doc_id, vector, document in zip(ids, vectors, documents):
+            if doc_id in self.assignments:
+                self._forget(doc_id)
+            terms = extract_terms(document)
+            if len(self.counts) < self._target_clusters(len(self.assignments) + 1):
+                # Grow towards the target cluster count by seeding from new points
+                cluster = len(self.counts)
+                base = self.centroids if self.centroids.size else np.zeros((0, vectors.shape[1]), np.float32)
+                self.centroids = np.vstack([base, vector[None, :]])
+                self.counts = np.append(self.counts, 1)
+                self.term_counts.append(Counter())
+            else:
+                cluster = int(np.argmax(_normalize(self.centroids) @ vector))
+                self.counts[cluster] += 1
+                learning_rate = 1.0 / self.counts[cluster]
+                self.centroids[cluster] = (1 - learning_rate) * self.centroids[cluster] + learning_rate * vector
+            self.term_counts[cluster].update(terms)
+            self.assignments[doc_id] = [cluster, terms]
+        self.changes_since_rebuild += len(ids)
+
+    def _forget(self, doc_id: str):
+        cluster, terms = self.assignments.pop(doc_id)
+        if cluster < len(self.counts):
+            self.counts[cluster] = max(0, self.counts[cluster] - 1)
+            self.term_counts[cluster].subtract(terms)
+            self.term_counts[cluster] += Counter()  # drop non-positive counts
+
+    def remove(self, ids: Iterable[str]):
+        """Drop documents from cluster sizes and labels"""
+        ids = list(ids)
+        with self._lock:
+            if self._rebuild_log is not None:
+                self._rebuild_log.append(("remove", ids))
+            if not self._remove_locked(ids):
+                return
+            self._snapshot_stale = True
+            taken = self._take_state_if_due()
+        if taken is not None:
+            self._writer.write(taken, background=True)
+        self.maybe_rebuild()
+
+    def _remove_locked(self, ids: List[str]) -> int:
+        removed = [doc_id for doc_id in ids if doc_id in self.assignments]
+        for doc_id in removed:
+            self._forget(doc_id)
+        self.changes_since_rebuild += len(removed)
+        return len(removed)
+
+    def reset(self):
+        """Forget all clusters (the knowledge base was cleared)"""
+        with self._lock:
+            self._reset_state()
+            self._generation += 1
+            taken = self._take_state()
+        self._writer.write(taken)
+
+    # --- Full rebuild ---
+
+    def maybe_rebuild(self, force: bool = False) -> bool:
+        """Start a background rebuild if enough has changed; returns whether one started"""
+        with self._lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return False
+            due = (
+                self.changes_since_rebuild >= self.REBUILD_AFTER_CHANGES
+                or (self.changes_since_rebuild and self.last_rebuild
+                    and time.time() - self.last_rebuild > self.REBUILD_INTERVAL)
+            )
+            if not (force or due):
+                return False
+            self._rebuild_thread = threading.Thread(target=self.rebuild, name="topic-rebuild", daemon=True)
+            self._rebuild_thread.start()
+            return True
+
+    def rebuild(self):
+        """Recompute clusters from scratch by streaming the whole collection"""
+        try:
+            started = time.time()
+            with self._lock:
+                self._rebuild_log = []
+                generation = self._generation
+
+            # Seed from a bounded reservoir sample with k-means++
+            sample, seen = [], 0
+            rng = np.random.default_rng(0)
+            for batch in self.record_source():
+                for vector in _normalize(np.asarray(batch['embeddings'], dtype=np.float32)):
+                    seen += 1
+                    if len(sample) < 2000:
+                        sample.append(vector)
+                    elif rng.integers(seen) < 2000:
+                        sample[rng.integers(2000)] = vector
+            k = self._target_clusters(seen)
+            if k == 0:
+                with self._lock:
+                    self._rebuild_log = None
+                    if self._generation != generation:
+                        return
+                    self._reset_state()
+                    self.last_rebuild = started
+                    taken = self._take_state()
+                self._writer.write(taken)
+                return
+
+            sample = np.asarray(sample)
+            centroids = [sample[rng.integers(len(sample))]]
+            for _ in range(1, k):
+                distances = 1 - np.max(sample @ np.asarray(centroids).T, axis=1)
+                weights = np.clip(distances, 0, None) ** 2
+                if weights.sum() > 0:
+                    centroids.append(sample[rng.choice(len(sample), p=weights / weights.sum())])
+                else:
+                    centroids.append(sample[rng.integers(len(sample))])
+            centroids = np.asarray(centroids, dtype=np.float32)
+            counts = np.zeros(k, dtype=np.int64)
+
+            # Streaming mini-batch k-means epochs
+            for _ in range(self.REBUILD_EPOCHS):
+                for batch in self.record_source():
+                    vectors = _normalize(np.asarray(batch['embeddings'], dtype=np.float32))
+                    labels = np.argmax(vectors @ _normalize(centroids).T, axis=1)
+                    for cluster in np.unique(labels):
+                        members = vectors[labels == cluster]
+                        counts[cluster] += len(members)
+                        learning_rate = len(members) / counts[cluster]
+                        centroids[cluster] = (1 - learning_rate) * centroids[cluster] + learning_rate * members.mean(axis=0)
+
+            # Final assignment pass for sizes and labels
+            counts = np.zeros(k, dtype=np.int64)
+            term_counts = [Counter() for _ in range(k)]
+            assignments = {}
+            for batch in self.record_source():
+                vectors = _normalize(np.asarray(batch['embeddings'], dtype=np.float32))
+                labels = np.argmax(vectors @ _normalize(centroids).T, axis=1)
+                for doc_id, label, document in zip(batch['ids'], labels, batch['documents']):
+                    terms = extract_terms(document)
+                    counts[label] += 1
+                    term_counts[label].update(terms)
+                    assignments[doc_id] = [int(label), terms]
+
+            with self._lock:
+                if self._generation != generation:
+                    # The knowledge base was cleared while this rebuild was running
+                    self._rebuild_log = None
+                    logger.info("Discarded topic cluster rebuild superseded by a reset")
+                    return
+                self.centroids = centroids
+                self.counts = counts
+                self.term_counts = term_counts
+                self.assignments = assignments
+                self.changes_since_rebuild = 0
+                self.last_rebuild = started
+                for entry in self._rebuild_log:
+                    if entry[0] == "add":
+                        self._add_locked(*entry[1:])
+                    else:
+                        self._remove_locked(entry[1])
+                self._rebuild_log = None
+                self._snapshot_stale = True
+                taken = self._take_state()
+            self._writer.write(taken)
+            logger.info(f"Rebuilt {k} topic clusters over {seen} documents in {time.time() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Topic cluster rebuild failed: {e}")
+            with self._lock:
+                self._rebuild_log = None
+
+    def wait_for_rebuild(self, timeout: Optional[float] = None):
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # --- Snapshot ---
+
+    def _labels(self) -> List[List[str]]:
+        clusters_with_term = Counter()
+        for counter in self.term_counts:
+            clusters_with_term.update(counter.keys())
+        total = max(1, len(self.term_counts))
+        labels = []
+        for counter in self.term_counts:
+            scored = sorted(
+                counter.items(),
+                key=lambda item: (-item[1] * math.log(1 + total / clusters_with_term[item[0]]), item[0])
+            )
+            labels.append([term for term, _ in scored[:self.LABEL_TERMS * 2]])
+        return labels
+
+    def _refresh_snapshot(self):
+        live = [i for i in range(len(self.counts)) if self.counts[i] > 0]
+        labels = self._labels()
+        nodes = [
+            {
+                "id": f"topic-{i}",
+                "label": " / ".join(term.capitalize() for term in labels[i][:self.LABEL_TERMS]) or f"Topic {i + 1}",
+                "terms": labels[i],
+                "size": int(self.counts[i]),
+            }
+            for i in live
+        ]
+
+        edges = []
+        if len(live) > 1:
+            unit = _normalize(self.centroids[live])
+            similarity = unit @ unit.T
+            np.fill_diagonal(similarity, -np.inf)
+            pairs = set()
+            for row in range(len(live)):
+                for col in np.argsort(-similarity[row])[:self.EDGES_PER_NODE]:
+                    pairs.add((min(row, col), max(row, col)))
+            edges = [
+                {
+                    "source": f"topic-{live[a]}",
+                    "target": f"topic-{live[b]}",
+                    "weight": round(float(similarity[a, b]), 4),
+                }
+                for a, b in sorted(pairs)
+            ]
+
+        self.snapshot = {
+            "nodes": nodes,
+            "edges": edges,
+            "documents": len(self.assignments),
+            "computed_at": time.time(),
+        }
+
+    def _current_snapshot(self) -> Dict[str, Any]:
+        """The snapshot, recomputed first if changes made it stale; call with the lock held"""
+        if self._snapshot_stale:
+            self._refresh_snapshot()
+            self._snapshot_stale = False
+        return self.snapshot
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """The precomputed topic graph"""
+        with self._lock:
+            return {
+                **self._current_snapshot(),
+                "pending_changes": self.changes_since_rebuild,
+                "last_rebuild": self.last_rebuild or None,
+                "rebuilding": self._rebuild_thread is not None and self._rebuild_thread.is_alive(),
+            }
@@ -3,6 +3,9 @@ from main import app
 from fastapi.testclient import TestClient
 import os
 import shutil
+import hashlib
+import math
+from knowledge_base import KnowledgeBaseService
 
 # Use a test-specific directory for ChromaDB
 TEST_KB_DIR = "./test_kb_data"
@@ -29,3 +32,65 @@ def client():
 @pytest.fixture
 def mock_gemini_api_key():
     return "test-api-key"
+
+
+def fake_embedding(text: str, dims: int = 64):
+    """Deterministic bag-of-words embedding so tests never call Gemini"""
+    vector = [0.0] * dims
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dims] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+@pytest.fixture
+def kb_service(tmp_path, monkeypatch):
+    """A KnowledgeBaseService on a temporary directory with fake embeddings"""
+    service = KnowledgeBaseService(persist_directory=str(tmp_path / "kb"))
+    service.embedding_calls = []
+
+    def embed(text, api_key=None):
+        service.embedding_calls.append(text)
+        return fake_embedding(text)
+
+    def embed_batch(texts, api_key=None):
+        service.embedding_calls.append(texts)
+        return [fake_embedding(text) for text in texts]
+
+    monkeypatch.setattr(service, "_generate_embedding", embed)
+    monkeypatch.setattr(service, "_generate_embeddings", embed_batch)
+    monkeypatch.setattr(service, "_generate_query_embedding", embed)
+    return service
+
+@pytest.fixture(scope="session")
+def fake_upstream_server():
+    """benchmarks/fake_upstream.py served on a local port for the whole session"""
+    import socket
+    import threading
+    import time
+    import uvicorn
+    from benchmarks.fake_upstream import create_app
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    fake_app = create_app(seed=0)
+    server = uvicorn.Server(uvicorn.Config(fake_app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield fake_app, f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join(5)
+
+@pytest.fixture
+def fake_upstream(fake_upstream_server, monkeypatch):
+    """Point Gemini, Custom Search and Books at the fake upstream with fresh fault profiles"""
+    from benchmarks.fake_upstream import ENDPOINTS, FaultProfile
+
+    fake_app, url = fake_upstream_server
+    fake_app.state.profiles = {name: FaultProfile() for name in ENDPOINTS}
+    fake_app.state.stats.clear()
+    monkeypatch.setenv("DEEP_SCRIBE_GEMINI_ENDPOINT", url)
+    monkeypatch.setenv("DEEP_SCRIBE_GOOGLE_API_BASE", url)
+    return fake_app
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import main
+from services.chat_sessions import ChatSessionStore
+
+
+class RecordingRouter:
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, model, prompt, api_key, **kwargs):
+        self.prompts.append((model, prompt))
+        if model == ChatSessionStore.SUMMARY_MODEL:
+            return {"success": True, "content": "They discussed solar panels."}
+        return {"success": True, "model": model, "content": f"Answer {len(self.prompts)} " + "x" * 500}
+
+
+@pytest.fixture
+def chat_env(kb_service, monkeypatch):
+    router = RecordingRouter()
+    store = ChatSessionStore(router)
+    monkeypatch.setattr(main, "kb_service", kb_service)
+    monkeypatch.setattr(main, "router", router)
+    monkeypatch.setattr(main, "chat_sessions", store)
+    kb_service.add_research_findings("Energy", "Solar", "solar panels convert sunlight into power", "r1")
+    return router, store
+
+
+def chat(client, session_id, message):
+    return client.post("/api/kb/chat", json={
+        "message": message, "session_id": session_id, "api_key": "key"
+    }).json()
+
+
+class TestChatSessions:
+
+    def test_follow_up_reuses_context(self, client, chat_env):
+        session_id = client.post("/api/kb/chat/session").json()["session_id"]
+
+        first = chat(client, session_id, "how do solar panels work")
+        second = chat(client, session_id, "solar panels work how exactly")
+        other = chat(client, session_id, "best pasta recipe")
+
+        assert first["context_reused"] is False
+        assert second["context_reused"] is True
+        assert other["context_reused"] is False
+        assert "User: how do solar panels work" in chat_env[0].prompts[-1][1]
+
+    def test_prompt_size_stays_bounded(self, client, chat_env):
+        router, store = chat_env
+        session_id = client.post("/api/kb/chat/session").json()["session_id"]
+
+        sizes = []
+        for turn in range(12):
+            chat(client, session_id, f"question {turn} about solar panels")
+            sizes.append(len(router.prompts[-1][1]) if router.prompts[-1][0] != store.SUMMARY_MODEL
+                         else len(router.prompts[-2][1]))
+            deadline = time.monotonic() + 2
+            while store.get(session_id).summarizing and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        session = store.get(session_id)
+        assert session.summary == "They discussed solar panels."
+        assert len(session.turns) <= store.MAX_VERBATIM_TURNS + 2
+        assert max(sizes[6:]) - min(sizes[6:]) < 200
+
+    def test_expired_session(self, client, chat_env):
+        _, store = chat_env
+        store.ttl = 0
+        session_id = client.post("/api/kb/chat/session").json()["session_id"]
+        time.sleep(0.01)
+        result = chat(client, session_id, "hello")
+        assert result["success"] is False
+
+    def test_stateless_chat_still_works(self, client, chat_env):
+        result = client.post("/api/kb/chat", json={"message": "solar", "api_key": "key"}).json()
+        assert result["success"] is True and result["session_id"] is None
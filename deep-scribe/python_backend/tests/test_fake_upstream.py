@@ -0,0 +1,76 @@
+import pytest
+
+from benchmarks.fake_upstream import FaultProfile, parse_latency
+from knowledge_base import KnowledgeBaseService
+from services.scheduler import UpstreamScheduler
+
+
+class TestFakeUpstream:
+
+    def test_latency_specs(self):
+        import random
+
+        rng = random.Random(0)
+        assert parse_latency("fixed:250")(rng) == 0.25
+        assert all(0.01 <= parse_latency("uniform:10:20")(rng) <= 0.02 for _ in range(50))
+        assert parse_latency("lognormal:100:0")(rng) == pytest.approx(0.1)
+        with pytest.raises(ValueError):
+            parse_latency("gamma:1")
+
+    def test_tools_endpoints_end_to_end(self, client, fake_upstream):
+        search = client.post("/api/tools/search", json={
+            "query": "grid inertia", "num_results": 3, "api_key": "k", "search_engine_id": "cx"}).json()
+        books = client.post("/api/tools/books", json={"query": "grid inertia", "api_key": "k"}).json()
+
+        assert search["success"] is True and len(search["results"]) == 3
+        assert books["success"] is True and books["results"][0]["title"].startswith("Grid Inertia")
+        assert fake_upstream.state.stats["search.requests"] == 1
+
+    def test_injected_errors_reach_the_caller(self, client, fake_upstream):
+        fake_upstream.state.profiles["search"] = FaultProfile(rate_limit_rate=1.0)
+        fake_upstream.state.profiles["books"] = FaultProfile(error_rate=1.0)
+
+        search = client.post("/api/tools/search", json={
+            "query": "q", "api_key": "k", "search_engine_id": "cx"}).json()
+        books = client.post("/api/tools/books", json={"query": "q", "api_key": "k"}).json()
+
+        assert search == {**search, "success": False, "error": "API Error: 429"}
+        assert books["success"] is False and books["error"] in ("API Error: 500", "API Error: 503")
+
+    def test_generate_end_to_end(self, client, fake_upstream, monkeypatch):
+        import main
+        from router import GeminiRouter
+
+        monkeypatch.setattr(main, "router", GeminiRouter(scheduler=UpstreamScheduler(key_limit=10_000)))
+        result = client.post("/api/generate", json={
+            "model": "gemini-2.5-flash", "prompt": "Summarise grid inertia", "api_key": "k"}).json()
+
+        assert result["success"] is True
+        assert result["content"].startswith("[gemini-2.5-flash] Fake response")
+
+    def test_kb_embeddings_end_to_end(self, client, fake_upstream, tmp_path, monkeypatch):
+        import main
+
+        monkeypatch.setattr(main, "kb_service", KnowledgeBaseService(persist_directory=str(tmp_path / "kb")))
+        for content in ("solar panels on the roof", "pasta with tomato sauce"):
+            added = client.post("/api/kb/add", json={
+                "content": content, "source": "s", "title": content, "api_key": "k"}).json()
+            assert added["success"] is True
+
+        result = client.post("/api/kb/query", json={"query": "solar roof panels", "api_key": "k"}).json()
+        assert result["results"][0]["content"] == "solar panels on the roof"
+        assert fake_upstream.state.stats["embed.requests"] == 3
+
+    def test_concurrent_requests_keep_their_own_keys(self, client, fake_upstream, tmp_path, monkeypatch):
+        import main
+        from concurrent.futures import ThreadPoolExecutor
+
+        monkeypatch.setattr(main, "kb_service", KnowledgeBaseService(persist_directory=str(tmp_path / "kb")))
+
+        def add(i):
+            return client.post("/api/kb/add", json={
+                "content": f"note {i}", "source": "s", "title": f"t{i}", "api_key": f"key-{i % 2}"}).json()
+
+        with ThreadPoolExecutor(8) as pool:
+            assert all(result["success"] for result in pool.map(add, range(16)))
+        assert fake_upstream.state.stats["key.key-0"] == fake_upstream.state.stats["key.key-1"] == 8
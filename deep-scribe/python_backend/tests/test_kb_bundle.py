@@ -0,0 +1,91 @@
+import io
+
+from services.kb_bundle import export_bundle, import_bundle
+
+
+class TestKnowledgeBaseBundle:
+
+    def _populate(self, kb_service, count):
+        for i in range(count):
+            kb_service.add_research_findings("Topic", f"Sub {i}", f"finding number {i} about solar", "r1")
+
+    def test_round_trip_without_embedding_calls(self, kb_service, tmp_path):
+        from knowledge_base import KnowledgeBaseService
+
+        self._populate(kb_service, 7)
+        bundle = b"".join(export_bundle(kb_service, batch_size=3))
+
+        target = KnowledgeBaseService(persist_directory=str(tmp_path / "restored"))
+        result = import_bundle(target, io.BytesIO(bundle))
+
+        assert result == {"success": True, "imported": 7, "batches": 3}
+        assert target.collection.count() == 7
+        assert target.index.count() == 7
+
+        original = kb_service.collection.get(include=["embeddings", "metadatas"])
+        restored = target.collection.get(ids=original["ids"], include=["embeddings", "metadatas"])
+        by_id = dict(zip(restored["ids"], restored["embeddings"]))
+        for doc_id, vector in zip(original["ids"], original["embeddings"]):
+            assert list(by_id[doc_id]) == list(vector)
+
+    def test_export_streams_one_batch_at_a_time(self, kb_service):
+        self._populate(kb_service, 5)
+        chunks = list(export_bundle(kb_service, batch_size=2))
+        # manifest, three batches, end-of-archive marker
+        assert len(chunks) == 5
+
+    def test_rejects_foreign_archive(self, kb_service):
+        result = import_bundle(kb_service, io.BytesIO(b"not a tar file"))
+        assert result["success"] is False
+
+    def test_export_and_import_endpoints(self, client, tmp_path, kb_service, monkeypatch):
+        import main
+
+        self._populate(kb_service, 3)
+        monkeypatch.setattr(main, "kb_service", kb_service)
+
+        exported = client.get("/api/kb/export")
+        assert exported.status_code == 200
+
+        response = client.post("/api/kb/import?replace=true", content=exported.content)
+        assert response.json() == {"success": True, "imported": 3, "batches": 1}
+        assert kb_service.collection.count() == 3
+
+    def test_truncated_replace_import_keeps_existing_records(self, client, kb_service, monkeypatch):
+        import main
+
+        self._populate(kb_service, 4)
+        monkeypatch.setattr(main, "kb_service", kb_service)
+        bundle = b"".join(export_bundle(kb_service, batch_size=2))
+
+        response = client.post("/api/kb/import?replace=true", content=bundle[:len(bundle) // 2 + 100])
+        assert response.json()["success"] is False
+        assert kb_service.collection.count() == 4
+
+    def test_malformed_record_and_dimension_mismatch(self, kb_service):
+        import json
+        import tarfile
+
+        def bundle(records, dimension):
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w") as archive:
+                manifest = {"format": "deep-scribe-kb", "version": 1, "dimension": dimension,
+                            "embedding_model": kb_service.EMBEDDING_MODEL, "dtype": "<f4"}
+                for name, payload in (
+                    ("manifest.json", json.dumps(manifest).encode()),
+                    ("records-00000.jsonl", "".join(json.dumps(r) + "\n" for r in records).encode()),
+                    ("vectors-00000.f32", bytes(4 * dimension * len(records))),
+                ):
+                    info = tarfile.TarInfo(name)
+                    info.size = len(payload)
+                    archive.addfile(info, io.BytesIO(payload))
+            buffer.seek(0)
+            return buffer
+
+        self._populate(kb_service, 2)
+        result = import_bundle(kb_service, bundle([{"document": "no id", "metadata": {}}], 768))
+        assert result["success"] is False and "Malformed record" in result["error"]
+
+        result = import_bundle(kb_service, bundle([{"id": "x", "document": "d", "metadata": {}}], 3))
+        assert result["success"] is False and "dimensions" in result["error"]
+        assert kb_service.collection.count() == 2
@@ -0,0 +1,248 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from services.chat_sessions import ChatSessionStore
+from services.kb_bundle import export_bundle, import_bundle
+from services.kb_ipc import (
+    KnowledgeBaseClient, KnowledgeBaseServer, RemoteChatSessionStore, RemoteKnowledgeBase, RemoteScheduler, pack,
+    recv_message
+)
+from services.scheduler import BACKGROUND, INTERACTIVE, UpstreamScheduler
+from tests.conftest import fake_embedding
+from tests.test_scheduler import drain
+
+
+class EchoRouter:
+    def generate(self, model, prompt, api_key, **kwargs):
+        return {"success": True, "content": "Summary of the earlier turns"}
+
+
+@pytest.fixture
+def kb_server(kb_service):
+    server = KnowledgeBaseServer(kb_service, ChatSessionStore(EchoRouter()))
+    server.start()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def remote_kb(kb_server, monkeypatch):
+    remote = RemoteKnowledgeBase(kb_server.address, kb_server.token)
+    monkeypatch.setattr(remote, "embed_query", lambda text, api_key=None: fake_embedding(text))
+    return remote
+
+
+class TestKnowledgeBaseIPC:
+
+    def test_float32_arrays_travel_as_raw_bytes(self):
+        import socket
+
+        vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+        left, right = socket.socketpair()
+        message = {"embeddings": vectors, "ids": ["a", "b"]}
+        left.sendall(pack(message))
+        received = recv_message(right)
+
+        assert np.array_equal(received["embeddings"], vectors)
+        assert len(pack(message)) < len(pack({"embeddings": vectors.tolist(), "ids": ["a", "b"]})) + 8
+        left.close()
+        right.close()
+
+    def test_rejects_bad_token(self, kb_server):
+        client = KnowledgeBaseClient(kb_server.address, "wrong")
+        with pytest.raises(ConnectionError):
+            client.call("get_stats")
+
+    def test_reads_and_writes(self, remote_kb, kb_service):
+        added = remote_kb.add_document("solar panels on the roof", source="s", title="Solar")
+        remote_kb.add_document("pasta with tomato sauce", source="p", title="Pasta")
+
+        assert added["success"] and added["updated"]
+        assert remote_kb.add_document("solar panels on the roof", source="s", title="Solar")["updated"] is False
+        assert remote_kb.get_stats()["total_documents"] == 2
+
+        result = remote_kb.query("solar roof")
+        assert result["results"][0]["id"] == added["id"]
+        assert remote_kb.get_related(added["id"])["results"][0]["metadata"]["title"] == "Pasta"
+        assert remote_kb.get_all_documents(where={"title": "Pasta"})["count"] == 1
+        # The owner never embeds queries; workers send the vector
+        assert "solar roof" not in kb_service.embedding_calls
+
+        assert remote_kb.delete_document(added["id"])["success"]
+        assert remote_kb.get_stats()["total_documents"] == 1
+
+    def test_concurrent_adds_are_batched(self, remote_kb, kb_service, kb_server):
+        release = threading.Event()
+        original_upsert = kb_service.index.upsert
+        original_add_documents = kb_service.add_documents
+        batches = []
+
+        def slow_first_write(entries):
+            release.wait(5)
+            return original_upsert(entries)
+
+        def add_documents(records, api_key=None):
+            batches.append(len(records))
+            return original_add_documents(records, api_key)
+
+        kb_service.index.upsert = slow_first_write
+        kb_service.add_documents = add_documents
+
+        results = [None] * 9
+        threads = [
+            threading.Thread(target=lambda i=i: results.__setitem__(
+                i, remote_kb.add_document(f"note number {i}", source=f"s{i}", title=f"T{i}")))
+            for i in range(9)
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        release.set()
+        for thread in threads:
+            thread.join(10)
+
+        assert all(r["success"] and r["updated"] for r in results)
+        assert len({r["id"] for r in results}) == 9
+        # The first add ran alone while the other eight queued up behind it
+        assert batches == [8]
+        # Each add was embedded before it was queued, never by the writer
+        assert sorted(kb_service.embedding_calls) == sorted([f"note number {i}"] for i in range(9))
+
+    def test_slow_embedding_does_not_block_other_writes(self, remote_kb, kb_service):
+        release = threading.Event()
+        original = kb_service._generate_embeddings
+
+        def slow_for_draft(texts, api_key=None):
+            if any("draft" in text for text in texts):
+                release.wait(5)
+            return original(texts, api_key)
+
+        kb_service._generate_embeddings = slow_for_draft
+        slow = threading.Thread(target=lambda: remote_kb.upsert_document("d1", "a long draft", source="d", title="D"))
+        slow.start()
+        time.sleep(0.05)
+
+        assert remote_kb.add_document("a quick note", source="q", title="Quick")["success"]
+        assert slow.is_alive()
+        release.set()
+        slow.join(5)
+        assert remote_kb.get_stats()["total_documents"] == 2
+
+    def test_interactive_wins_across_workers(self, kb_service):
+        owner = UpstreamScheduler(endpoint_limits={"gemini.generate": 600})
+        server = KnowledgeBaseServer(kb_service, scheduler=owner)
+        server.start()
+        try:
+            workers = []
+            for _ in range(2):
+                worker = UpstreamScheduler()
+                worker.delegate_to(RemoteScheduler(KnowledgeBaseClient(server.address, server.token)))
+                workers.append(worker)
+            # Quota used up through one worker is gone for the other too
+            assert drain(workers[0], "gemini.generate", "k") > 0
+            assert drain(workers[1], "gemini.generate", "k") == 0
+
+            order = []
+
+            def waiter(worker, priority, label):
+                worker.acquire("gemini.generate", "k", priority=priority, max_wait=5)
+                order.append(label)
+
+            threads = [threading.Thread(target=waiter, args=(workers[0], BACKGROUND, "background"))]
+            threads[0].start()
+            time.sleep(0.05)
+            threads.append(threading.Thread(target=waiter, args=(workers[1], INTERACTIVE, "interactive")))
+            threads[1].start()
+            for thread in threads:
+                thread.join(10)
+
+            assert order == ["interactive", "background"]
+            assert workers[1].get_metrics()["classes"]["background"]["admitted"] >= 1
+        finally:
+            server.close()
+
+    def test_bundle_round_trip_through_proxy(self, remote_kb):
+        remote_kb.add_documents([{"content": f"note {i}", "source": str(i), "title": str(i)} for i in range(5)])
+        bundle = b"".join(export_bundle(remote_kb, batch_size=2))
+
+        assert remote_kb.clear_all()["success"]
+        assert import_bundle(remote_kb, io.BytesIO(bundle))["imported"] == 5
+        assert remote_kb.get_stats()["total_documents"] == 5
+
+    def test_remote_chat_sessions(self, kb_server):
+        client = KnowledgeBaseClient(kb_server.address, kb_server.token)
+        store = RemoteChatSessionStore(client)
+        session = store.create()
+
+        session.remember_context([1.0, 0.0], None, {"success": True, "results": []})
+        for i in range(4):
+            store.get(session.id).add_exchange(f"question {i}", f"answer {i}")
+        store.schedule_summary(store.get(session.id), "test-api-key")
+
+        for _ in range(100):
+            current = store.get(session.id)
+            if current.summary:
+                break
+            time.sleep(0.02)
+        assert current.summary == "Summary of the earlier turns"
+        assert len(current.turns) == ChatSessionStore.MAX_VERBATIM_TURNS
+        assert current.reusable_context([1.0, 0.1], None, 0.75) == {"success": True, "results": []}
+        assert store.delete(session.id) and store.get(session.id) is None
+
+    def test_chat_answer_survives_ipc_failure(self, client, remote_kb, monkeypatch):
+        import main
+        from services.kb_ipc import RemoteChatSession
+
+        monkeypatch.setattr(main, "kb_service", remote_kb)
+        monkeypatch.setattr(main, "chat_sessions", RemoteChatSessionStore(remote_kb.client))
+        monkeypatch.setattr(main, "router", EchoRouter())
+        remote_kb.add_document("solar panels on the roof", source="s", title="Solar")
+        session_id = client.post("/api/kb/chat/session").json()["session_id"]
+
+        def lost(*args, **kwargs):
+            raise ConnectionError("Knowledge base server closed the connection")
+
+        monkeypatch.setattr(RemoteChatSession, "add_exchange", lost)
+        result = client.post("/api/kb/chat", json={
+            "message": "solar?", "session_id": session_id, "api_key": "k"}).json()
+        assert result["success"] is True and result["response"] == "Summary of the earlier turns"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a Unix socket and fork-safe spawn")
+def test_multi_worker_server_end_to_end(fake_upstream, tmp_path):
+    import httpx
+    from benchmarks.load_generator import _free_port, _wait_until_up
+
+    port = _free_port()
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--port", str(port), "--workers", "2"],
+        cwd=backend_dir, env={**os.environ, "HOME": str(tmp_path)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        _wait_until_up(url, process, timeout=120)
+        with httpx.Client(base_url=url, timeout=30) as client:
+            for content in ("solar panels on the roof", "pasta with tomato sauce"):
+                assert client.post("/api/kb/add", json={
+                    "content": content, "source": "s", "title": content, "api_key": "k"}).json()["success"]
+            # Several requests so both workers answer some of them
+            for _ in range(6):
+                result = client.post("/api/kb/query", json={"query": "solar roof", "api_key": "k"}).json()
+                assert result["results"][0]["content"] == "solar panels on the roof"
+            session = client.post("/api/kb/chat/session").json()["session_id"]
+            for _ in range(3):
+                chat = client.post("/api/kb/chat", json={
+                    "message": "what about solar?", "session_id": session, "api_key": "k"}).json()
+                assert chat["success"] is True
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
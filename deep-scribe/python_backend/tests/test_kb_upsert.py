@@ -0,0 +1,68 @@
+class TestDocumentUpsert:
+
+    PARAGRAPHS = [
+        f"Paragraph {i}: " + " ".join(f"word{i}x{j}" for j in range(40))
+        for i in range(6)
+    ]
+
+    def _upsert(self, kb_service, paragraphs):
+        return kb_service.upsert_document(
+            doc_id="draft-1",
+            content="\n\n".join(paragraphs),
+            source="draft:1",
+            title="My Draft"
+        )
+
+    def test_create_then_single_paragraph_edit(self, kb_service):
+        created = self._upsert(kb_service, self.PARAGRAPHS)
+        assert created["success"] is True
+        assert created["chunks"] == created["embedded"] == 6
+
+        edited = list(self.PARAGRAPHS)
+        edited[3] = edited[3] + " plus an edited sentence"
+        kb_service.embedding_calls.clear()
+        result = self._upsert(kb_service, edited)
+
+        assert result["embedded"] == 1
+        assert result["deleted"] == 1
+        assert result["unchanged"] == 5
+        assert len(kb_service.embedding_calls) == 1
+        assert kb_service.collection.count() == 6
+
+    def test_unchanged_resave_embeds_nothing(self, kb_service):
+        self._upsert(kb_service, self.PARAGRAPHS)
+        kb_service.embedding_calls.clear()
+        result = self._upsert(kb_service, self.PARAGRAPHS)
+        assert result["embedded"] == 0 and result["updated"] is False
+        assert kb_service.embedding_calls == []
+
+    def test_metadata_updated_in_place_and_delete(self, kb_service):
+        self._upsert(kb_service, self.PARAGRAPHS)
+        kb_service.upsert_document(
+            doc_id="draft-1",
+            content="\n\n".join(self.PARAGRAPHS),
+            source="draft:1",
+            title="Renamed Draft"
+        )
+        listing = kb_service.get_all_documents(where={"doc_id": "draft-1"})
+        assert {doc["metadata"]["title"] for doc in listing["documents"]} == {"Renamed Draft"}
+
+        kb_service.delete_document("draft-1")
+        assert kb_service.collection.count() == 0
+        assert kb_service.index.count() == 0
+
+    def test_inserting_short_paragraph_keeps_later_chunks(self, kb_service):
+        # Short paragraphs are merged into chunks; the merge must not cascade
+        short = [f"Short note {i} about topic {i * 7}." for i in range(40)]
+        created = self._upsert(kb_service, short)
+        original_ids = kb_service.index.resolve({"doc_id": "draft-1"})
+        assert 1 < created["chunks"] < len(short)
+
+        inserted = short[:2] + ["A freshly inserted remark."] + short[2:]
+        result = self._upsert(kb_service, inserted)
+
+        assert result["embedded"] == 1
+        assert result["deleted"] == 1
+        assert result["unchanged"] == created["chunks"] - 1
+        current_ids = kb_service.index.resolve({"doc_id": "draft-1"})
+        assert len(set(original_ids) & set(current_ids)) == created["chunks"] - 1
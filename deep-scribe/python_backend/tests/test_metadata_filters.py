@@ -0,0 +1,92 @@
+import pytest
+from services.metadata_index import MetadataIndex, FilterError
+
+
+class TestMetadataIndex:
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        index = MetadataIndex(str(tmp_path / "index.sqlite3"))
+        index.upsert([
+            ("a", {"doc_type": "research_finding", "research_id": "r1", "ingested_at": 100.0}),
+            ("b", {"doc_type": "research_report", "research_id": "r1", "ingested_at": 200.0}),
+            ("c", {"doc_type": "note", "research_id": "r2", "ingested_at": 300.0}),
+        ])
+        return index
+
+    def test_compound_filter(self, index):
+        where = {"$and": [
+            {"research_id": {"$in": ["r1", "r2"]}},
+            {"ingested_at": {"$gte": 150}},
+            {"ingested_at": {"$lt": 300}}
+        ]}
+        assert index.resolve(where) == ["b"]
+
+    def test_or_and_nin(self, index):
+        assert index.resolve({"$or": [{"doc_type": "note"}, {"ingested_at": {"$lte": 100}}]}) == ["c", "a"]
+        assert sorted(index.resolve({"research_id": {"$nin": ["r1"]}})) == ["c"]
+
+    def test_unindexed_fields_are_not_resolvable(self, index):
+        assert index.can_resolve({"research_id": "r1"})
+        assert not index.can_resolve({"$and": [{"research_id": "r1"}, {"subtopic": "x"}]})
+
+    def test_malformed_filter(self, index):
+        with pytest.raises(FilterError):
+            index.compile({"research_id": {"$regex": "r.*"}})
+
+    def test_multi_key_filter_is_rejected(self, index):
+        # Chroma rejects these, so the prefilter path must too
+        with pytest.raises(FilterError):
+            index.compile({"research_id": "r1", "doc_type": "note"})
+        with pytest.raises(FilterError):
+            index.compile({"$or": [{"research_id": "r1", "doc_type": "note"}, {"doc_type": "x"}]})
+
+    def test_multi_operator_condition_is_rejected(self, index):
+        with pytest.raises(FilterError, match="exactly one operator"):
+            index.compile({"ingested_at": {"$gte": 150, "$lt": 300}})
+
+
+class TestKnowledgeBaseFiltering:
+
+    def test_ingested_at_is_recorded(self, kb_service):
+        result = kb_service.add_document("alpha beta", source="s", title="t")
+        doc = kb_service.collection.get(ids=[result["id"]])
+        assert isinstance(doc["metadatas"][0]["ingested_at"], float)
+
+    def test_prefiltered_query_scores_only_candidates(self, kb_service):
+        kb_service.add_research_findings("Topic", "One", "solar panels efficiency", "r1")
+        kb_service.add_research_findings("Topic", "Two", "solar panels cost", "r2")
+        kb_service.add_research_report("Topic", "wind turbines report", "r1")
+
+        result = kb_service.query(
+            "solar panels",
+            n_results=5,
+            where={"$and": [{"research_id": "r1"}, {"doc_type": {"$in": ["research_finding"]}}]}
+        )
+        assert result["success"] is True
+        assert [doc["metadata"]["subtopic"] for doc in result["results"]] == ["One"]
+
+        # A filter that matches nothing never spends an embedding call
+        calls = len(kb_service.embedding_calls)
+        empty = kb_service.query("solar", where={"research_id": "missing"})
+        assert empty["results"] == [] and len(kb_service.embedding_calls) == calls
+
+    def test_prefilter_matches_chroma_distances(self, kb_service):
+        kb_service.add_research_findings("Topic", "One", "solar panels efficiency", "r1")
+        kb_service.add_research_findings("Topic", "Two", "solar panels cost", "r1")
+
+        exact = kb_service.query("solar efficiency", where={"research_id": "r1"})
+        kb_service.PREFILTER_MAX_CANDIDATES = 0
+        ann = kb_service.query("solar efficiency", where={"research_id": "r1"})
+        assert [d["id"] for d in exact["results"]] == [d["id"] for d in ann["results"]]
+        assert exact["results"][0]["distance"] == pytest.approx(ann["results"][0]["distance"], abs=1e-5)
+
+    def test_filtered_listing_and_delete(self, kb_service):
+        first = kb_service.add_research_findings("Topic", "One", "solar", "r1")
+        kb_service.add_research_findings("Topic", "Two", "wind", "r2")
+
+        listing = kb_service.get_all_documents(where={"research_id": "r1"})
+        assert [doc["id"] for doc in listing["documents"]] == [first["id"]]
+
+        kb_service.delete_document(first["id"])
+        assert kb_service.get_all_documents(where={"research_id": "r1"})["documents"] == []
@@ -0,0 +1,128 @@
+import numpy as np
+
+from services.related_notes import RelatedNotesGraph
+
+SOLAR = "solar panels photovoltaic sunlight energy rooftop"
+PASTA = "pasta recipe tomato basil garlic noodles"
+
+
+def brute_force(vectors, k):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarity = unit @ unit.T
+    np.fill_diagonal(similarity, -np.inf)
+    return [set(np.argsort(-row)[:k].tolist()) for row in similarity]
+
+
+class TestRelatedNotesGraph:
+
+    def test_incremental_matches_brute_force(self, tmp_path, monkeypatch):
+        rng = np.random.default_rng(1)
+        vectors = rng.normal(size=(60, 8)).astype(np.float32)
+        monkeypatch.setattr(RelatedNotesGraph, "BATCH_ROWS", 7)
+        graph = RelatedNotesGraph(str(tmp_path), record_source=lambda: [])
+        ids = [f"d{i}" for i in range(60)]
+        for start in range(0, 60, 13):
+            graph.add(ids[start:start + 13], vectors[start:start + 13])
+
+        expected = brute_force(vectors, graph.NEIGHBORS)
+        for i in range(60):
+            found = {int(doc_id[1:]) for doc_id, _, _ in graph.related(f"d{i}", graph.NEIGHBORS)}
+            assert found == expected[i]
+
+    def test_remove_repairs_neighbors_and_persists(self, tmp_path):
+        rng = np.random.default_rng(2)
+        vectors = rng.normal(size=(30, 8)).astype(np.float32)
+        graph = RelatedNotesGraph(str(tmp_path), record_source=lambda: [])
+        graph.add([f"d{i}" for i in range(30)], vectors)
+        removed = [f"d{i}" for i in range(0, 30, 3)]
+        graph.remove(removed)
+        graph.add(["e0"], vectors[:1] * 2)
+        graph.flush()
+
+        keep = [i for i in range(30) if i % 3]
+        remaining = np.vstack([vectors[keep], vectors[:1] * 2])
+        names = [f"d{i}" for i in keep] + ["e0"]
+        expected = brute_force(remaining, graph.NEIGHBORS)
+
+        reloaded = RelatedNotesGraph(str(tmp_path), record_source=lambda: [])
+        assert reloaded.count() == len(names)
+        for row, name in enumerate(names):
+            found = {doc_id for doc_id, _, _ in reloaded.related(name, graph.NEIGHBORS)}
+            assert found == {names[j] for j in expected[row]}
+        assert reloaded.related("d0") is None
+
+    def test_kb_related_needs_no_embedding_calls(self, kb_service):
+        kb_service.add_documents([
+            {"content": f"{SOLAR} note{i}" if i % 2 else f"{PASTA} note{i}", "source": f"s{i}", "title": f"T{i}"}
+            for i in range(8)
+        ])
+        solar_id = kb_service.add_document(f"{SOLAR} rooftop", source="x", title="Solar")["id"]
+        calls = len(kb_service.embedding_calls)
+
+        result = kb_service.get_related(solar_id, n_results=3)
+
+        assert len(kb_service.embedding_calls) == calls
+        assert result["success"] and result["count"] == 3
+        assert all("photovoltaic" in r["content"] for r in result["results"])
+        assert solar_id not in [r["id"] for r in result["results"]]
+
+    def test_upserted_document_excludes_own_chunks(self, kb_service):
+        paragraph = (SOLAR + " ") * 12
+        kb_service.upsert_document("draft-1", f"{paragraph}\n\n{paragraph} grid", source="d", title="Draft")
+        kb_service.add_document(PASTA, source="p", title="Pasta")
+        kb_service.add_document(SOLAR, source="s", title="Solar")
+
+        result = kb_service.get_related("draft-1")
+        assert [r["metadata"]["title"] for r in result["results"]] == ["Solar", "Pasta"]
+
+        kb_service.delete_document("draft-1")
+        assert kb_service.get_related("draft-1")["success"] is False
+
+    def test_rebuild_from_collection(self, kb_service):
+        kb_service.add_documents([{"content": f"{SOLAR} {i}", "source": str(i), "title": "t"} for i in range(5)])
+        kb_service.related.reset()
+        kb_service.related.maybe_rebuild()
+        kb_service.related.wait_for_rebuild(5)
+        assert kb_service.related.count() == 5
+
+    def test_related_endpoint(self, client, kb_service, monkeypatch):
+        import main
+
+        monkeypatch.setattr(main, "kb_service", kb_service)
+        first = kb_service.add_document(SOLAR, source="a", title="A")["id"]
+        kb_service.add_document(f"{SOLAR} grid", source="b", title="B")
+
+        response = client.get(f"/api/kb/document/{first}/related").json()
+        assert response["results"][0]["metadata"]["title"] == "B"
+        assert client.get("/api/kb/document/missing/related").json()["success"] is False
+        # The graph only keeps NEIGHBORS neighbours per note
+        assert client.get(f"/api/kb/document/{first}/related?n_results=50").status_code == 422
+
+    def test_lookups_keep_working_during_rebuild(self, tmp_path):
+        import threading
+
+        rng = np.random.default_rng(3)
+        vectors = rng.normal(size=(20, 8)).astype(np.float32)
+        ids = [f"d{i}" for i in range(20)]
+        streaming, release = threading.Event(), threading.Event()
+
+        def blocking_source():
+            streaming.set()
+            release.wait(5)
+            yield {"ids": ids, "embeddings": vectors, "metadatas": [{}] * 20}
+
+        graph = RelatedNotesGraph(str(tmp_path), record_source=blocking_source)
+        graph.add(ids, vectors)
+        before = graph.related("d0", 3)
+        graph.maybe_rebuild()
+        assert streaming.wait(5)
+
+        assert graph.related("d0", 3) == before
+        graph.remove(["d1"])
+        graph.add(["e0"], vectors[:1])
+        release.set()
+        graph.wait_for_rebuild(5)
+
+        assert graph.count() == 20
+        assert graph.related("d1") is None
+        assert graph.related("d0", 1)[0][0] == "e0"
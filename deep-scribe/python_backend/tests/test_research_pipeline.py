@@ -0,0 +1,117 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from services.research_pipeline import ResearchPipeline
+
+
+class FakeRouter:
+    """Answers the survey with JSON and every analysis with plain text"""
+
+    def __init__(self, hypotheses=3, delay=0.05, fail_on=None):
+        self.hypotheses = hypotheses
+        self.delay = delay
+        self.fail_on = fail_on
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate(self, model, prompt, api_key):
+        self.calls.append(prompt)
+        if "preliminary survey" in prompt:
+            return {"success": True, "model": model, "content": "```json\n" + json.dumps({
+                "summary": "Overview",
+                "hypotheses": [{"title": f"H{i}", "question": f"Question {i}?"} for i in range(self.hypotheses)]
+            }) + "\n```"}
+
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if self.fail_on and self.fail_on in prompt:
+            return {"success": False, "error": "boom"}
+        question = prompt.split("## Hypothesis\n")[1].splitlines()[0]
+        return {"success": True, "model": model, "content": f"Analysis of {question}", "quills_deducted": 1}
+
+
+class FakeSearch:
+    def configure(self, api_key, cx):
+        pass
+
+    def search(self, query, num_results=5):
+        return {"success": True, "results": [{"title": "Source", "link": "http://x", "snippet": query}]}
+
+
+def collect(pipeline, **kwargs):
+    async def run():
+        return [event async for event in pipeline.run(**kwargs)]
+    return asyncio.run(run())
+
+
+class TestResearchPipeline:
+
+    def test_full_run_with_bounded_concurrency(self, kb_service, tmp_path):
+        router = FakeRouter(hypotheses=5)
+        pipeline = ResearchPipeline(router, kb_service, str(tmp_path), search_service_factory=FakeSearch)
+
+        events = collect(pipeline, topic="Solar", api_key="k", max_concurrency=2,
+                         search_api_key="s", search_engine_id="cx")
+
+        done = events[-1]
+        assert done["event"] == "done" and done["success"] is True
+        assert len(done["findings"]) == 5
+        assert done["findings"][0]["sources"][0]["title"] == "Source"
+        assert router.max_active == 2
+        # Findings are ingested with one batched embedding call
+        assert len(done["ingested"]) == 5
+        assert len(kb_service.embedding_calls) == 1
+
+    def test_failed_stage_resumes_without_repeating_work(self, kb_service, tmp_path):
+        router = FakeRouter(hypotheses=3, fail_on="Question 1?")
+        pipeline = ResearchPipeline(router, kb_service, str(tmp_path))
+
+        first = collect(pipeline, topic="Solar", api_key="k", run_id="run1")
+        assert first[-1]["success"] is False and first[-1]["resumable"] is True
+        assert kb_service.collection.count() == 0
+
+        router.fail_on = None
+        router.calls.clear()
+        second = collect(pipeline, topic="Solar", api_key="k", run_id="run1")
+
+        statuses = {e["stage"]: e["status"] for e in second if e["event"] == "stage"}
+        assert statuses["survey"] == "cached"
+        assert statuses["hypothesis-0"] == "cached"
+        assert statuses["hypothesis-1"] == "completed"
+        assert len(router.calls) == 1
+        assert second[-1]["success"] is True
+        assert kb_service.collection.count() == 3
+
+    def test_invalid_run_id(self, kb_service, tmp_path):
+        pipeline = ResearchPipeline(FakeRouter(), kb_service, str(tmp_path))
+        events = collect(pipeline, topic="Solar", api_key="k", run_id="../escape")
+        assert events[-1]["event"] == "error"
+
+    def test_closing_the_stream_stops_research(self, kb_service, tmp_path):
+        router = FakeRouter(hypotheses=4, delay=0.1)
+        pipeline = ResearchPipeline(router, kb_service, str(tmp_path))
+
+        async def run():
+            stream = pipeline.run(topic="Solar", api_key="k", max_concurrency=1)
+            async for event in stream:
+                if event.get("stage") == "hypothesis-0":
+                    break
+            await stream.aclose()
+            calls = len(router.calls)
+            await asyncio.sleep(0.5)
+            return calls
+
+        calls = asyncio.run(run())
+        # Nothing beyond the survey and an analysis already in flight ran
+        assert calls == len(router.calls) <= 2
+        assert kb_service.collection.count() == 0
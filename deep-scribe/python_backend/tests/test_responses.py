@@ -0,0 +1,52 @@
+import msgpack
+import pytest
+
+import main
+
+
+@pytest.fixture
+def populated_kb(kb_service, monkeypatch):
+    monkeypatch.setattr(main, "kb_service", kb_service)
+    kb_service.add_documents([
+        {"content": f"note {i} " + "lorem ipsum " * 100, "source": "s", "title": f"Note {i}"}
+        for i in range(20)
+    ])
+    return kb_service
+
+
+class TestResponseEncoding:
+
+    def test_listing_is_compressed_above_threshold(self, client, populated_kb):
+        response = client.get("/api/kb/documents", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["count"] == 20
+
+        raw = client.get("/api/kb/documents", headers={"Accept-Encoding": "br"})
+        assert raw.headers["content-encoding"] == "br"
+
+    def test_refused_codings_are_skipped(self, client, populated_kb):
+        response = client.get("/api/kb/documents", headers={"Accept-Encoding": "br;q=0, gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+
+        weighted = client.get("/api/kb/documents", headers={"Accept-Encoding": "gzip;q=0.5, br;q=0.8"})
+        assert weighted.headers["content-encoding"] == "br"
+
+        wildcard = client.get("/api/kb/documents", headers={"Accept-Encoding": "*;q=0"})
+        assert "content-encoding" not in wildcard.headers
+
+    def test_small_bodies_are_not_compressed(self, client):
+        response = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+        assert "content-encoding" not in response.headers
+
+    def test_msgpack_negotiated_by_accept(self, client, populated_kb):
+        response = client.get(
+            "/api/kb/documents",
+            headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"}
+        )
+        assert response.headers["content-type"] == "application/msgpack"
+        data = msgpack.unpackb(response.content)
+        assert data["count"] == 20 and data["documents"][0]["metadata"]["source"] == "s"
+
+    def test_streams_pass_through_uncompressed(self, client, populated_kb):
+        response = client.get("/api/kb/export", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from router import GeminiRouter
+from services.scheduler import UpstreamScheduler
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class ScriptedRouter(GeminiRouter):
+    """Router whose upstream calls follow a per-model script"""
+
+    def __init__(self, behaviour, **kwargs):
+        kwargs.setdefault("scheduler", UpstreamScheduler(endpoint_limits={"gemini.generate": 1e6}))
+        super().__init__(**kwargs)
+        self.behaviour = behaviour
+        self.calls = []
+        self._calls_lock = threading.Lock()
+
+    def _call(self, model, prompt, api_key, timeout):
+        with self._calls_lock:
+            self.calls.append(model)
+            call_number = self.calls.count(model)
+        action = self.behaviour[model]
+        if callable(action):
+            return action(call_number)
+        if isinstance(action, Exception):
+            raise action
+        time.sleep(action)
+        return f"answer from {model}"
+
+
+class TestGeminiRouter:
+
+    def test_success_records_model_and_cost(self):
+        router = ScriptedRouter({"gemini-2.5-pro": 0})
+        result = router.generate("gemini-2.5-pro", "hi", "key")
+        assert result["success"] is True
+        assert result["model"] == "gemini-2.5-pro"
+        assert result["quills_deducted"] == 15
+        assert result["fallback_used"] is False
+
+    def test_timeout_falls_back_within_deadline(self):
+        router = ScriptedRouter({"gemini-2.5-pro": 5, "gemini-2.5-flash": 0})
+        router.FALLBACK_RESERVE = 0.5
+        start = time.monotonic()
+        result = router.generate("gemini-2.5-pro", "hi", "key", deadline=1.0)
+
+        assert time.monotonic() - start < 1.5
+        assert result["success"] is True
+        assert result["model"] == "gemini-2.5-flash"
+        assert result["requested_model"] == "gemini-2.5-pro"
+        assert result["quills_deducted"] == 1
+
+    def test_rate_limit_falls_back_and_cools_down(self):
+        router = ScriptedRouter({"gemini-2.5-flash": RateLimited("429 quota"), "gemini-2.5-flash-lite": 0})
+        first = router.generate("gemini-2.5-flash", "hi", "key")
+        assert first["model"] == "gemini-2.5-flash-lite"
+
+        second = router.generate("gemini-2.5-flash", "hi", "key")
+        assert second["attempts"][0] == {"model": "gemini-2.5-flash", "skipped": "rate limited"}
+        assert router.calls.count("gemini-2.5-flash") == 1
+
+    def test_non_retryable_error_is_returned(self):
+        router = ScriptedRouter({"gemini-2.5-flash": ValueError("bad prompt")})
+        result = router.generate("gemini-2.5-flash", "hi", "key")
+        assert result["success"] is False and result["error"] == "bad prompt"
+
+    def test_hedged_request_after_p95(self):
+        # First call of each batch stalls, the hedge answers quickly
+        router = ScriptedRouter(
+            {"gemini-2.5-flash": lambda n: time.sleep(2 if n == router.HEDGE_MIN_SAMPLES + 1 else 0.01) or "ok"},
+            hedge=True
+        )
+        for _ in range(router.HEDGE_MIN_SAMPLES):
+            router.generate("gemini-2.5-flash", "hi", "key", fallback=False)
+
+        start = time.monotonic()
+        result = router.generate("gemini-2.5-flash", "hi", "key", fallback=False)
+        assert result["success"] is True and result["hedged"] is True
+        assert time.monotonic() - start < 1.0
+        assert router.get_stats()["gemini-2.5-flash"]["requests"] == router.HEDGE_MIN_SAMPLES + 1
+
+    def test_errors_are_classified_by_status_code(self):
+        from google.api_core import exceptions
+
+        assert GeminiRouter._is_rate_limit(exceptions.ResourceExhausted("quota"))
+        assert GeminiRouter._is_retryable(exceptions.ServiceUnavailable("down"))
+        # Numbers in the message text are not status codes
+        assert not GeminiRouter._is_retryable(ValueError("prompt exceeds 5000 tokens on port 4290"))
+        assert not GeminiRouter._is_rate_limit(exceptions.InvalidArgument("429 is not a valid temperature"))
+
+    def test_timeout_adds_no_latency_sample(self):
+        router = ScriptedRouter({"gemini-2.5-flash": 1})
+        router.generate("gemini-2.5-flash", "hi", "key", deadline=0.2, fallback=False)
+        stats = router.get_stats()["gemini-2.5-flash"]
+        assert stats["timeouts"] == 1 and stats["latency_ewma_ms"] is None
+
+    def test_slow_model_is_retried_once_its_latency_decays(self):
+        router = ScriptedRouter({"gemini-2.5-pro": 0, "gemini-2.5-flash": 0})
+        stats = router._stats("gemini-2.5-pro")
+        stats.record(30.0)
+
+        skipped = router.generate("gemini-2.5-pro", "hi", "key", deadline=10)
+        assert skipped["attempts"][0] == {"model": "gemini-2.5-pro", "skipped": "too slow for deadline"}
+
+        stats.sampled_at -= 3 * stats.LATENCY_HALF_LIFE
+        retried = router.generate("gemini-2.5-pro", "hi", "key", deadline=10)
+        assert retried["model"] == "gemini-2.5-pro"
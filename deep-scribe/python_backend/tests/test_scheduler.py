@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from services.scheduler import (
+    UpstreamScheduler, SchedulerBusy, INTERACTIVE, RESEARCH, BACKGROUND, priority_scope
+)
+
+
+def drain(scheduler, endpoint, key, priority=INTERACTIVE):
+    """Use up every token the given class may take right now"""
+    taken = 0
+    while True:
+        try:
+            scheduler.acquire(endpoint, key, priority=priority, max_wait=0)
+        except SchedulerBusy:
+            return taken
+        taken += 1
+
+
+class TestUpstreamScheduler:
+
+    def test_background_leaves_headroom_for_interactive(self):
+        scheduler = UpstreamScheduler(endpoint_limits={"gemini.embed": 60})
+        background = drain(scheduler, "gemini.embed", "k", BACKGROUND)
+        interactive = drain(scheduler, "gemini.embed", "k", INTERACTIVE)
+        assert background > 0 and interactive > 0
+
+    def test_delegated_scheduler_shares_the_remote_buckets(self):
+        owner = UpstreamScheduler(endpoint_limits={"google.search": 120})
+        worker = UpstreamScheduler(endpoint_limits={"google.search": 120})
+        worker.delegate_to(owner)
+        full = drain(UpstreamScheduler(endpoint_limits={"google.search": 120}), "google.search", "k")
+
+        assert drain(worker, "google.search", "k") == full
+        assert drain(owner, "google.search", "k") == 0
+        assert worker.get_metrics()["classes"] == owner.get_metrics()["classes"]
+
+    def test_buckets_are_per_key_and_endpoint(self):
+        scheduler = UpstreamScheduler(endpoint_limits={"google.search": 60})
+        drain(scheduler, "google.search", "k1")
+        scheduler.acquire("google.search", "k2", max_wait=0)
+        scheduler.acquire("google.books", "k1", max_wait=0)
+
+    def test_priority_order_when_waiting(self):
+        scheduler = UpstreamScheduler(endpoint_limits={"gemini.generate": 600})
+        drain(scheduler, "gemini.generate", "k")
+        order = []
+
+        def waiter(priority, label):
+            scheduler.acquire("gemini.generate", "k", priority=priority, max_wait=5)
+            order.append(label)
+
+        threads = [threading.Thread(target=waiter, args=(BACKGROUND, "background"))]
+        threads[0].start()
+        time.sleep(0.02)
+        threads.append(threading.Thread(target=waiter, args=(RESEARCH, "research")))
+        threads[1].start()
+        time.sleep(0.02)
+        threads.append(threading.Thread(target=waiter, args=(INTERACTIVE, "interactive")))
+        threads[2].start()
+        for thread in threads:
+            thread.join()
+
+        assert order == ["interactive", "research", "background"]
+
+    def test_bounded_queue_rejects_with_backpressure(self):
+        scheduler = UpstreamScheduler(endpoint_limits={"gemini.generate": 6}, max_queue={BACKGROUND: 1})
+        drain(scheduler, "gemini.generate", "k", INTERACTIVE)
+
+        blocked = threading.Thread(
+            target=lambda: pytest.raises(SchedulerBusy, scheduler.acquire,
+                                         "gemini.generate", "k", priority=BACKGROUND, max_wait=0.3)
+        )
+        blocked.start()
+        time.sleep(0.05)
+        with pytest.raises(SchedulerBusy):
+            scheduler.acquire("gemini.generate", "k", priority=BACKGROUND, max_wait=1)
+        blocked.join()
+
+        metrics = scheduler.get_metrics()["classes"]["background"]
+        assert metrics["rejected"] == 1 and metrics["timed_out"] == 1 and metrics["queue_depth"] == 0
+
+    def test_priority_scope_sets_default_class(self):
+        scheduler = UpstreamScheduler()
+        with priority_scope(RESEARCH):
+            scheduler.acquire("google.books", "k")
+        classes = scheduler.get_metrics()["classes"]
+        assert classes["research"]["admitted"] == 1 and classes["interactive"]["admitted"] == 0
@@ -0,0 +1,102 @@
+import time
+
+from services.topic_clusters import TopicClusterer, extract_terms
+
+SOLAR = "solar panels photovoltaic sunlight energy rooftop solar"
+PASTA = "pasta recipe tomato basil garlic noodles pasta"
+
+
+def populate(kb_service, count=20):
+    kb_service.add_documents([
+        {"content": f"{SOLAR} note{i}" if i % 2 else f"{PASTA} note{i}", "source": f"s{i}", "title": f"T{i}"}
+        for i in range(count)
+    ])
+
+
+class TestTopicClusters:
+
+    def test_extract_terms_skips_stopwords(self):
+        assert extract_terms("The solar panels and the solar grid would work") == ["solar", "panels", "grid", "work"]
+
+    def test_incremental_snapshot(self, kb_service):
+        populate(kb_service)
+        topics = kb_service.get_topics()
+
+        assert topics["success"] is True
+        assert topics["documents"] == 20
+        assert sum(node["size"] for node in topics["nodes"]) == 20
+        assert all(edge["source"] != edge["target"] for edge in topics["edges"])
+
+    def test_snapshot_recomputed_once_per_read(self, kb_service, monkeypatch):
+        refreshes = []
+        original = kb_service.topics._refresh_snapshot
+        monkeypatch.setattr(kb_service.topics, "_refresh_snapshot", lambda: refreshes.append(1) or original())
+        # Keep the periodic save (which also refreshes) out of the way
+        kb_service.topics._last_save = time.monotonic()
+
+        for i in range(5):
+            kb_service.add_document(f"{SOLAR} note{i}", source=f"s{i}", title=f"T{i}")
+        assert refreshes == []
+
+        assert kb_service.get_topics()["documents"] == 5
+        kb_service.get_topics()
+        assert len(refreshes) == 1
+
+    def test_rebuild_separates_topics_and_persists(self, kb_service):
+        populate(kb_service)
+        assert kb_service.topics.maybe_rebuild(force=True)
+        kb_service.topics.wait_for_rebuild(5)
+
+        topics = kb_service.get_topics()
+        terms = [set(node["terms"]) for node in topics["nodes"]]
+        assert any("solar" in t and "pasta" not in t for t in terms)
+        assert any("pasta" in t and "solar" not in t for t in terms)
+        assert all(node["label"] for node in topics["nodes"])
+        assert topics["pending_changes"] == 0
+
+        reloaded = TopicClusterer(kb_service.persist_directory, kb_service.iter_records)
+        assert reloaded.get_snapshot()["nodes"] == topics["nodes"]
+
+    def test_delete_and_clear_update_sizes(self, kb_service):
+        result = kb_service.add_document(SOLAR, source="s", title="Solar")
+        populate(kb_service, 4)
+        kb_service.delete_document(result["id"])
+        assert kb_service.get_topics()["documents"] == 4
+
+        kb_service.clear_all()
+        assert kb_service.get_topics()["nodes"] == []
+
+    def test_topics_endpoint(self, client, kb_service, monkeypatch):
+        import main
+
+        monkeypatch.setattr(main, "kb_service", kb_service)
+        populate(kb_service, 6)
+        start = time.perf_counter()
+        response = client.get("/api/kb/topics").json()
+        assert time.perf_counter() - start < 0.5
+        assert response["documents"] == 6 and response["nodes"]
+
+    def test_reset_during_rebuild_discards_its_result(self, kb_service):
+        import threading
+
+        populate(kb_service)
+        streaming, release = threading.Event(), threading.Event()
+
+        # The rebuild keeps streaming records that clear_all has since removed
+        batches = list(kb_service.iter_records())
+
+        def blocking_source(**kwargs):
+            for batch in batches:
+                streaming.set()
+                release.wait(5)
+                yield batch
+
+        kb_service.topics.record_source = blocking_source
+        assert kb_service.topics.maybe_rebuild(force=True)
+        assert streaming.wait(5)
+        kb_service.clear_all()
+        release.set()
+        kb_service.topics.wait_for_rebuild(5)
+
+        topics = kb_service.get_topics()
+        assert topics["nodes"] == [] and topics["documents"] == 0
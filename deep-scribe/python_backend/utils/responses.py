@@ -0,0 +1,172 @@
+"""
+Response encoding for the Deep Scribe backend.
+
+- FastJSONResponse renders with orjson (falls back to the stdlib encoder)
+- encode_response picks JSON or MessagePack from the request's Accept header
+  and skips FastAPI's jsonable_encoder pass, which dominates the cost of
+  large KB payloads
+- CompressionMiddleware brotli/gzip-compresses buffered bodies above a size
+  threshold; streamed responses (exports, progress events) pass through
+"""
+
+import gzip
+import json
+from typing import Any, Dict
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional encoding
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def _default(value: Any):
+    """Fallback for values neither encoder handles natively (numpy scalars/arrays)"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Type is not serializable: {type(value).__name__}")
+
+
+def dumps_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+class MsgpackResponse(Response):
+    media_type = "application/msgpack"
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def encode_response(request: Request, content: Any) -> Response:
+    """Encode an endpoint result as MessagePack or JSON according to Accept"""
+    if wants_msgpack(request):
+        return MsgpackResponse(content)
+    return FastJSONResponse(content)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing complete response bodies above minimum_size.
+
+    Brotli is preferred when the client accepts it and the module is
+    installed, gzip otherwise. Responses sent in several chunks are streams
+    and are passed through untouched so progress events are not buffered.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @staticmethod
+    def _parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+        """Map each coding in an Accept-Encoding header to its q-value"""
+        weights = {}
+        for part in accept_encoding.lower().split(","):
+            coding, *params = [token.strip() for token in part.split(";")]
+            if not coding:
+                continue
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip() == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            weights[coding] = q
+        return weights
+
+    def _choose_encoding(self, accept_encoding: str):
+        weights = self._parse_accept_encoding(accept_encoding)
+        wildcard = weights.get("*", 0.0)
+        candidates = ("br", "gzip") if brotli is not None else ("gzip",)
+        # Highest q wins; ties go to the earlier (better) coding. Codings with
+        # q=0 are refused, and "*" covers codings the header does not name
+        best, best_q = None, 0.0
+        for coding in candidates:
+            q = weights.get(coding, wildcard)
+            if q > best_q:
+                best, best_q = coding, q
+        # Stay uncompressed when the client explicitly ranks identity higher
+        if weights.get("identity", 0.0) > best_q:
+            return None
+        return best
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            if (message.get("more_body", False) or len(body) < self.minimum_size
+                    or "content-encoding" in headers):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self._compress(body, encoding)
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
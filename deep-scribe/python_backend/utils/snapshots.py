@@ -0,0 +1,53 @@
+"""
+Off-lock persistence for derived knowledge base state.
+
+Owners (topic clusters, related notes graph) copy their state while holding
+their own lock, then hand the copy to a SnapshotWriter, which serialises it
+outside that lock - on a background thread for request-path saves. Copies
+are numbered when taken, so an older copy never overwrites a newer one when
+two writes race.
+"""
+
+import threading
+from typing import Any, Callable, Tuple
+
+from utils.logger import logger
+
+
+class SnapshotWriter:
+    """Writes numbered state copies, newest wins"""
+
+    def __init__(self, write: Callable[[Any], None], name: str):
+        """
+        Args:
+            write: Serialises one state copy to disk (should replace files atomically)
+            name: Thread name for background writes
+        """
+        self._write = write
+        self.name = name
+        self._taken = 0
+        self._written = 0
+        self._write_lock = threading.Lock()
+
+    def take(self, state: Any) -> Tuple[int, Any]:
+        """Number a state copy; call while holding the owner's lock"""
+        self._taken += 1
+        return self._taken, state
+
+    def write(self, taken: Tuple[int, Any], background: bool = False):
+        """Persist a copy from take(); call without holding the owner's lock"""
+        if background:
+            threading.Thread(target=self._run, args=(taken,), name=self.name, daemon=True).start()
+        else:
+            self._run(taken)
+
+    def _run(self, taken: Tuple[int, Any]):
+        version, state = taken
+        with self._write_lock:
+            if version <= self._written:
+                return
+            try:
+                self._write(state)
+                self._written = version
+            except Exception as e:
+                logger.error(f"Failed to persist {self.name} state: {e}")
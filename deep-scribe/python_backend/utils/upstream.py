@@ -0,0 +1,47 @@
+"""
+Upstream endpoints for the Deep Scribe backend.
+
+Everything talks to Google's production APIs unless these environment
+variables (or .env entries) say otherwise, e.g. to run against the local
+stand-in in benchmarks/fake_upstream.py:
+
+    DEEP_SCRIBE_GEMINI_ENDPOINT=http://127.0.0.1:8765   # generate_content / embed_content
+    DEEP_SCRIBE_GOOGLE_API_BASE=http://127.0.0.1:8765   # Custom Search / Books
+
+Values are read on every call, so they may be set after import (load_dotenv
+runs after the services are imported).
+"""
+
+import functools
+import os
+
+import google.ai.generativelanguage as glm
+
+GEMINI_ENDPOINT_ENV = "DEEP_SCRIBE_GEMINI_ENDPOINT"
+GOOGLE_API_BASE_ENV = "DEEP_SCRIBE_GOOGLE_API_BASE"
+DEFAULT_GOOGLE_API_BASE = "https://www.googleapis.com"
+
+
+def generative_client(api_key: str) -> glm.GenerativeServiceClient:
+    """
+    Gemini client bound to one API key, pointed at DEEP_SCRIBE_GEMINI_ENDPOINT when it is set
+
+    Used instead of genai.configure, whose configuration is process-global:
+    concurrent requests with different keys would otherwise race on it.
+    """
+    return _generative_client(api_key, os.getenv(GEMINI_ENDPOINT_ENV))
+
+
+@functools.lru_cache(maxsize=64)
+def _generative_client(api_key: str, endpoint: str) -> glm.GenerativeServiceClient:
+    if endpoint:
+        # The gRPC transport cannot reach a plain-HTTP stand-in
+        return glm.GenerativeServiceClient(
+            client_options={"api_key": api_key, "api_endpoint": endpoint}, transport="rest"
+        )
+    return glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+
+def google_api_url(path: str) -> str:
+    """Absolute URL of a googleapis.com REST path"""
+    return os.getenv(GOOGLE_API_BASE_ENV, DEFAULT_GOOGLE_API_BASE).rstrip("/") + path